@@ -0,0 +1,45 @@
+"""Add append-only xp_events ledger
+
+Revision ID: 002_xp_events
+Revises: 001_initial
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '002_xp_events'
+down_revision: Union[str, None] = '001_initial'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # ==========================================================================
+    # XP EVENTS TABLE (append-only ledger, aggregated in batches)
+    # ==========================================================================
+    op.create_table('xp_events',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('action', sa.String(length=30), nullable=False),
+        sa.Column('xp', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('comments_delta', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('likes_delta', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.Column('aggregated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_xp_events_pending', 'xp_events', ['id'], unique=False,
+                    postgresql_where=sa.text('aggregated_at IS NULL'))
+    op.create_index('ix_xp_events_pending_user', 'xp_events', ['user_id'], unique=False,
+                    postgresql_where=sa.text('aggregated_at IS NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_xp_events_pending_user', table_name='xp_events')
+    op.drop_index('ix_xp_events_pending', table_name='xp_events')
+    op.drop_table('xp_events')
@@ -0,0 +1,46 @@
+"""Add email_outbox table (transactional outbox for emails)
+
+Revision ID: 004_email_outbox
+Revises: 003_refresh_tokens
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '004_email_outbox'
+down_revision: Union[str, None] = '003_refresh_tokens'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # ==========================================================================
+    # EMAIL OUTBOX TABLE (committed with the triggering change, sent async)
+    # ==========================================================================
+    op.create_table('email_outbox',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('kind', sa.String(length=30), nullable=False),
+        sa.Column('recipient', sa.String(length=255), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.Column('next_attempt_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_email_outbox_user_id'), 'email_outbox', ['user_id'], unique=False)
+    op.create_index('ix_email_outbox_pending', 'email_outbox', ['next_attempt_at'], unique=False,
+                    postgresql_where=sa.text('sent_at IS NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_email_outbox_pending', table_name='email_outbox')
+    op.drop_index(op.f('ix_email_outbox_user_id'), table_name='email_outbox')
+    op.drop_table('email_outbox')
@@ -0,0 +1,43 @@
+"""Add users.deletion_requested_at (background account deletion, indexes built CONCURRENTLY)
+
+Revision ID: 005_account_deletion
+Revises: 004_email_outbox
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '005_account_deletion'
+down_revision: Union[str, None] = '004_email_outbox'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # ==========================================================================
+    # PENDING ACCOUNT DELETIONS (purged in batches by a background task)
+    # ==========================================================================
+    # Kolumna bez domyślnej wartości - tylko zmiana katalogu, bez przepisywania tabeli
+    op.add_column('users', sa.Column('deletion_requested_at', sa.DateTime(), nullable=True))
+
+    # Indeksy CONCURRENTLY - bez blokowania zapisów do users i comments na czas budowy
+    with op.get_context().autocommit_block():
+        op.create_index('ix_users_deletion_pending', 'users', ['deletion_requested_at'], unique=False,
+                        postgresql_where=sa.text('deletion_requested_at IS NOT NULL'),
+                        postgresql_concurrently=True, if_not_exists=True)
+        # Batched purge selects a user's comments by user_id
+        op.create_index(op.f('ix_comments_user_id'), 'comments', ['user_id'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_comments_user_id'), table_name='comments',
+                      postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_users_deletion_pending', table_name='users',
+                      postgresql_concurrently=True, if_exists=True)
+    op.drop_column('users', 'deletion_requested_at')
@@ -0,0 +1,45 @@
+"""Deduplicate votes per poll (one vote per user, anonymous votes one per IP)
+
+Revision ID: 006_poll_votes
+Revises: 005_account_deletion
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '006_poll_votes'
+down_revision: Union[str, None] = '005_account_deletion'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # ==========================================================================
+    # VOTES - unique targets for INSERT ... ON CONFLICT DO NOTHING
+    # ==========================================================================
+    # Zostaw najstarszy głos, jeśli w tabeli są już duplikaty
+    op.execute("""
+        DELETE FROM votes v USING votes d
+        WHERE v.poll_name = d.poll_name AND v.user_id = d.user_id AND v.id > d.id
+    """)
+    op.execute("""
+        DELETE FROM votes v USING votes d
+        WHERE v.user_id IS NULL AND d.user_id IS NULL
+          AND v.poll_name = d.poll_name AND v.ip_address = d.ip_address AND v.id > d.id
+    """)
+    op.create_index('uq_votes_poll_user', 'votes', ['poll_name', 'user_id'], unique=True,
+                    postgresql_where=sa.text('user_id IS NOT NULL'))
+    op.create_index('uq_votes_poll_ip', 'votes', ['poll_name', 'ip_address'], unique=True,
+                    postgresql_where=sa.text('user_id IS NULL'))
+    # Przeliczanie wyników (GROUP BY poll_name, option) jako index-only scan
+    op.create_index('ix_votes_poll_option', 'votes', ['poll_name', 'option'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_votes_poll_option', table_name='votes')
+    op.drop_index('uq_votes_poll_ip', table_name='votes')
+    op.drop_index('uq_votes_poll_user', table_name='votes')
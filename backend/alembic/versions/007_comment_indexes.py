@@ -0,0 +1,52 @@
+"""Composite and partial indexes for comment reads (built CONCURRENTLY)
+
+Revision ID: 007_comment_indexes
+Revises: 006_poll_votes
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '007_comment_indexes'
+down_revision: Union[str, None] = '006_poll_votes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # ==========================================================================
+    # COMMENTS - CREATE INDEX CONCURRENTLY nie blokuje zapisów, ale nie może
+    # działać w transakcji; if_not_exists pozwala powtórzyć przerwaną migrację
+    # (nieudany build zostawia indeks INVALID - usuń go i uruchom ponownie)
+    # ==========================================================================
+    with op.get_context().autocommit_block():
+        # GET /comments/{slug}: post_slug = ? AND parent_id IS NULL ORDER BY created_at
+        op.create_index('ix_comments_slug_parent_created', 'comments',
+                        ['post_slug', 'parent_id', 'created_at', 'id'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+        # GET /comments/{id}/replies i ON DELETE CASCADE po parent_id
+        op.create_index('ix_comments_parent_created', 'comments', ['parent_id', 'created_at'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+        # Liczniki (stats, lista postów): tylko nieusunięte, bez odczytu tabeli
+        op.create_index('ix_comments_live_slug_parent', 'comments', ['post_slug', 'parent_id'], unique=False,
+                        postgresql_include=['id'], postgresql_where=sa.text('is_deleted = false'),
+                        postgresql_concurrently=True, if_not_exists=True)
+        # Prefiks ix_comments_slug_parent_created - zbędny
+        op.drop_index('ix_comments_post_slug', table_name='comments',
+                      postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_comments_post_slug', 'comments', ['post_slug'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('ix_comments_live_slug_parent', table_name='comments',
+                      postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_comments_parent_created', table_name='comments',
+                      postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_comments_slug_parent_created', table_name='comments',
+                      postgresql_concurrently=True, if_exists=True)
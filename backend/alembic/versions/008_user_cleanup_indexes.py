@@ -0,0 +1,47 @@
+"""Partial indexes for the users cleanup tasks (built CONCURRENTLY)
+
+Revision ID: 008_user_cleanup_indexes
+Revises: 007_comment_indexes
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '008_user_cleanup_indexes'
+down_revision: Union[str, None] = '007_comment_indexes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # ==========================================================================
+    # USERS - jeden mały indeks częściowy na predykat z tasks.py; zawiera tylko
+    # kandydatów do sprzątania, więc nie rośnie razem z liczbą kont
+    # ==========================================================================
+    with op.get_context().autocommit_block():
+        # cleanup_expired_accounts
+        op.create_index('ix_users_unverified_expires', 'users', ['account_expires_at'], unique=False,
+                        postgresql_where=sa.text('email_verified = false AND account_expires_at IS NOT NULL'),
+                        postgresql_concurrently=True, if_not_exists=True)
+        # cleanup_expired_verification_codes
+        op.create_index('ix_users_verification_expires', 'users', ['verification_expires_at'], unique=False,
+                        postgresql_where=sa.text('verification_expires_at IS NOT NULL'),
+                        postgresql_concurrently=True, if_not_exists=True)
+        # cleanup_expired_password_resets
+        op.create_index('ix_users_password_reset_expires', 'users', ['password_reset_expires_at'], unique=False,
+                        postgresql_where=sa.text('password_reset_expires_at IS NOT NULL'),
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_users_password_reset_expires', table_name='users',
+                      postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_users_verification_expires', table_name='users',
+                      postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_users_unverified_expires', table_name='users',
+                      postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,207 @@
+"""
+Background, batched account deletion
+
+/profile/delete-account only marks the account (deletion_requested_at), blocks
+its sessions and API keys and returns. purge_pending_accounts then removes the
+user's data table by table in batches of ACCOUNT_DELETION_BATCH_SIZE rows, one
+short transaction per batch, so a prolific user never holds locks on the
+comment tables for long. Likes and reply subtrees under the user's comments
+are removed leaves first before the comments themselves, so ON DELETE CASCADE
+never widens a batch. The users row goes last. Every batch is idempotent -
+a crash (or a second worker) simply continues where the last commit stopped.
+"""
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from . import api_key_cache
+from .comment_snapshots import comment_snapshot_writer
+from .comment_stats import invalidate as invalidate_comment_stats
+from .models import User
+from .refresh_tokens import revoke_user_tokens
+
+ACCOUNT_DELETION_BATCH_SIZE = int(os.getenv("ACCOUNT_DELETION_BATCH_SIZE", "500"))
+ACCOUNT_DELETION_INTERVAL = float(os.getenv("ACCOUNT_DELETION_INTERVAL", "30"))
+# Limit partii na jedno uruchomienie - reszta w kolejnym cyklu
+ACCOUNT_DELETION_MAX_BATCHES = int(os.getenv("ACCOUNT_DELETION_MAX_BATCHES", "200"))
+
+# Komentarze użytkownika z całymi poddrzewami odpowiedzi (także cudzymi) -
+# comments.parent_id i comment_likes.comment_id mają ON DELETE CASCADE
+_THREADS_CTE = """
+    WITH RECURSIVE thread AS (
+        SELECT id FROM comments WHERE user_id = :user_id
+        UNION
+        SELECT c.id FROM comments c JOIN thread t ON c.parent_id = t.id
+    )
+"""
+
+# (tabela, SQL) w kolejności usuwania; głosy (zanonimizowane) i posty zostają, tracą tylko autora.
+# Polubienia i odpowiedzi znikają w osobnych partiach przed komentarzami, od liści -
+# kaskada nie ma czego usuwać, więc każda instrukcja dotyka najwyżej batch_size wierszy
+_PURGE_STEPS = (
+    ("comment_likes", text("""
+        DELETE FROM comment_likes
+        WHERE id IN (SELECT id FROM comment_likes WHERE user_id = :user_id LIMIT :batch_size)
+    """)),
+    ("thread_likes", text(_THREADS_CTE + """
+        DELETE FROM comment_likes
+        WHERE id IN (
+            SELECT cl.id FROM comment_likes cl JOIN thread t ON cl.comment_id = t.id
+            LIMIT :batch_size
+        )
+    """)),
+    ("comments", text(_THREADS_CTE + """
+        DELETE FROM comments
+        WHERE id IN (
+            SELECT t.id FROM thread t
+            WHERE NOT EXISTS (SELECT 1 FROM comments child WHERE child.parent_id = t.id)
+            ORDER BY t.id DESC
+            LIMIT :batch_size
+        )
+        RETURNING post_slug
+    """)),
+    ("api_keys", text("""
+        DELETE FROM api_keys
+        WHERE id IN (SELECT id FROM api_keys WHERE user_id = :user_id LIMIT :batch_size)
+    """)),
+    ("xp_events", text("""
+        DELETE FROM xp_events
+        WHERE id IN (SELECT id FROM xp_events WHERE user_id = :user_id LIMIT :batch_size)
+    """)),
+    ("votes", text("""
+        UPDATE votes SET user_id = NULL, ip_address = NULL
+        WHERE id IN (SELECT id FROM votes WHERE user_id = :user_id LIMIT :batch_size)
+    """)),
+    ("blog_posts", text("""
+        UPDATE blog_posts SET author_id = NULL
+        WHERE id IN (SELECT id FROM blog_posts WHERE author_id = :user_id LIMIT :batch_size)
+    """)),
+)
+
+# refresh_tokens i email_outbox znikają przez ON DELETE CASCADE (kilka wierszy)
+_DELETE_USER_SQL = text("DELETE FROM users WHERE id = :user_id AND deletion_requested_at IS NOT NULL")
+
+_REMAINING_SQL = {
+    "comment_likes": "SELECT count(*) FROM comment_likes WHERE user_id = :user_id",
+    "thread_likes": _THREADS_CTE + "SELECT count(*) FROM comment_likes cl JOIN thread t ON cl.comment_id = t.id",
+    "comments": _THREADS_CTE + "SELECT count(*) FROM thread",
+    "api_keys": "SELECT count(*) FROM api_keys WHERE user_id = :user_id",
+    "xp_events": "SELECT count(*) FROM xp_events WHERE user_id = :user_id",
+    "votes": "SELECT count(*) FROM votes WHERE user_id = :user_id",
+    "blog_posts": "SELECT count(*) FROM blog_posts WHERE author_id = :user_id",
+}
+
+_stats = {
+    "accounts_deleted": 0,
+    "rows_deleted": 0,
+    "batches": 0,
+    "errors": 0,
+    "last_run_at": None,
+    "last_run_ms": 0.0,
+}
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def request_account_deletion(db: Session, user: User) -> None:
+    """Mark an account for deletion and cut off its sessions and API keys (commits)"""
+    user.deletion_requested_at = _utcnow()
+    user.is_active = False
+    db.execute(text("UPDATE api_keys SET is_active = false WHERE user_id = :user_id"), {"user_id": user.id})
+    revoke_user_tokens(db, user.id)
+    db.commit()
+    api_key_cache.invalidate()  # Klucze konta nie mogą zostać w cache
+
+
+def _purge_account(db: Session, user_id: int, batch_size: int, max_batches: int) -> Optional[int]:
+    """Run up to max_batches non-empty batches for one account; returns batches used, None when the account is gone"""
+    batches = 0
+    for table, sql in _PURGE_STEPS:
+        while True:
+            if batches >= max_batches:
+                return batches
+            result = db.execute(sql, {"user_id": user_id, "batch_size": batch_size})
+            affected = result.rowcount
+            slugs = {row.post_slug for row in result} if table == "comments" else ()
+            db.commit()
+            if affected:
+                # Puste sprawdzenia (już wyczyszczone tabele) nie zużywają budżetu
+                batches += 1
+                _stats["batches"] += 1
+                _stats["rows_deleted"] += affected
+            for slug in slugs:
+                invalidate_comment_stats(slug)
+                comment_snapshot_writer.schedule(slug)
+            # Liście odsłaniają kolejne poziomy - krok kończy dopiero pusta partia
+            if not affected:
+                break
+
+    db.execute(_DELETE_USER_SQL, {"user_id": user_id})
+    db.commit()
+    _stats["accounts_deleted"] += 1
+    print(f"🗑️ KONTO USUNIĘTE: ID={user_id} (purge zakończony)")
+    return None
+
+
+def purge_pending_accounts(db: Session, batch_size: int = ACCOUNT_DELETION_BATCH_SIZE,
+                           max_batches: int = ACCOUNT_DELETION_MAX_BATCHES) -> int:
+    """Purge accounts marked for deletion, oldest first, within a batch budget; returns accounts deleted"""
+    started = time.perf_counter()
+    pending = db.query(User.id).filter(
+        User.deletion_requested_at.isnot(None)
+    ).order_by(User.deletion_requested_at).limit(100).all()
+    db.rollback()
+
+    deleted = 0
+    budget = max_batches
+    for (user_id,) in pending:
+        if budget <= 0:
+            break
+        try:
+            used = _purge_account(db, user_id, batch_size, budget)
+        except Exception as e:
+            db.rollback()
+            _stats["errors"] += 1
+            print(f"❌ Account purge for user {user_id} failed: {e}")
+            continue
+        if used is None:
+            deleted += 1
+        else:
+            budget -= used
+
+    _stats["last_run_at"] = datetime.now(timezone.utc).isoformat()
+    _stats["last_run_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return deleted
+
+
+def pending_deletions(db: Session, limit: int = 50) -> List[Dict]:
+    """Accounts waiting for purge with rows left per table (admin progress view)"""
+    users = db.query(User.id, User.username, User.deletion_requested_at).filter(
+        User.deletion_requested_at.isnot(None)
+    ).order_by(User.deletion_requested_at).limit(limit).all()
+    return [
+        {
+            "id": user.id,
+            "username": user.username,
+            "deletion_requested_at": user.deletion_requested_at.isoformat(),
+            "remaining": {
+                table: db.execute(text(sql), {"user_id": user.id}).scalar()
+                for table, sql in _REMAINING_SQL.items()
+            },
+        }
+        for user in users
+    ]
+
+
+def stats() -> dict:
+    return {
+        "batch_size": ACCOUNT_DELETION_BATCH_SIZE,
+        "max_batches": ACCOUNT_DELETION_MAX_BATCHES,
+        **_stats,
+    }
@@ -0,0 +1,122 @@
+"""
+Streaming admin exports (NDJSON / CSV) over server-side cursors
+
+Rows are read with stream_results (a named PostgreSQL cursor) in batches of
+EXPORT_BATCH_SIZE and written out batch by batch, so memory stays constant
+regardless of table size. Rows are ordered by id; an interrupted export is
+resumed with after_id=<last id received>.
+
+The cursor keeps one connection (read replica, or the primary pool when no
+replica is configured) checked out for the whole download. Each FETCH is
+capped by EXPORT_STATEMENT_TIMEOUT_MS and a client that stops reading for
+EXPORT_IDLE_TIMEOUT_MS has its transaction killed by PostgreSQL, which ends
+the download early - resume it with after_id.
+
+CSV cells starting with =, +, -, @ (or tab / CR) get a leading ' so
+spreadsheets do not evaluate them as formulas.
+"""
+import csv
+import io
+import os
+from datetime import datetime
+from typing import Iterator, Optional
+
+import orjson
+from sqlalchemy import select, text
+
+from .database import read_engine
+from .models import Comment, CommentLike, User
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+EXPORT_STATEMENT_TIMEOUT_MS = int(os.getenv("EXPORT_STATEMENT_TIMEOUT_MS", "30000"))
+EXPORT_IDLE_TIMEOUT_MS = int(os.getenv("EXPORT_IDLE_TIMEOUT_MS", "60000"))
+
+# Początki komórek, które arkusze kalkulacyjne traktują jak formułę
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+# Eksportowane kolumny - bez haseł, tokenów i adresów IP
+EXPORT_DATASETS = {
+    "users": (User, (
+        User.id, User.username, User.email, User.full_name, User.is_active, User.email_verified,
+        User.role_id, User.rank_id, User.reputation_score, User.total_comments,
+        User.total_likes_received, User.last_login, User.created_at,
+    )),
+    "comments": (Comment, (
+        Comment.id, Comment.post_slug, Comment.user_id, Comment.parent_id, Comment.content,
+        Comment.is_deleted, Comment.created_at, Comment.updated_at,
+    )),
+    "likes": (CommentLike, (
+        CommentLike.id, CommentLike.comment_id, CommentLike.user_id, CommentLike.is_like,
+        CommentLike.created_at, CommentLike.updated_at,
+    )),
+}
+
+# Filtry dostępne dla danego zbioru (poza after_id / since / until)
+DATASET_FILTERS = {
+    "users": {"is_active", "email_verified"},
+    "comments": {"post_slug", "user_id", "is_deleted"},
+    "likes": {"user_id", "comment_id"},
+}
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def build_export_query(dataset: str, after_id: Optional[int] = None, since: Optional[datetime] = None,
+                       until: Optional[datetime] = None, limit: Optional[int] = None, **filters):
+    """SELECT for a dataset, keyset-paginated by id; raises ValueError for unsupported filters"""
+    model, columns = EXPORT_DATASETS[dataset]
+    unsupported = {name for name, value in filters.items() if value is not None} - DATASET_FILTERS[dataset]
+    if unsupported:
+        raise ValueError(f"Unsupported filters for {dataset}: {', '.join(sorted(unsupported))}")
+
+    query = select(*columns).order_by(model.id)
+    if after_id is not None:
+        query = query.where(model.id > after_id)
+    if since is not None:
+        query = query.where(model.created_at >= since)
+    if until is not None:
+        query = query.where(model.created_at < until)
+    for name, value in filters.items():
+        if value is not None:
+            query = query.where(getattr(model, name) == value)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return "" if value is None else value
+
+
+def stream_export(query, fmt: str, engine=None, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """Encoded chunks (one per fetched batch) of a query streamed from a server-side cursor
+
+    Synchronous generator - StreamingResponse iterates it in a worker thread.
+    """
+    engine = engine or read_engine
+    with engine.connect() as conn:
+        # Limity obowiązują tylko w transakcji eksportu (SET LOCAL)
+        conn.execute(text(f"SET LOCAL statement_timeout = {int(EXPORT_STATEMENT_TIMEOUT_MS)}"))
+        conn.execute(text(f"SET LOCAL idle_in_transaction_session_timeout = {int(EXPORT_IDLE_TIMEOUT_MS)}"))
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(query)
+        keys = list(result.keys())
+
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(keys)
+            for rows in result.partitions():
+                writer.writerows([_csv_value(value) for value in row] for row in rows)
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue().encode()
+            return
+
+        for rows in result.partitions():
+            yield b"".join(orjson.dumps(dict(zip(keys, row))) + b"\n" for row in rows)
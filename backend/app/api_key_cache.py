@@ -0,0 +1,121 @@
+"""
+Verified API key cache and buffered last_used updates
+
+Keys are looked up by hash once and kept for API_KEY_CACHE_TTL seconds;
+delete/toggle endpoints invalidate them immediately. last_used timestamps are
+collected in memory and written with one bulk UPDATE every
+API_KEY_LAST_USED_FLUSH_INTERVAL seconds.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .models import APIKey
+from .permissions import has_permission, registry as permission_registry
+
+API_KEY_CACHE_TTL = float(os.getenv("API_KEY_CACHE_TTL", "60"))
+API_KEY_LAST_USED_FLUSH_INTERVAL = float(os.getenv("API_KEY_LAST_USED_FLUSH_INTERVAL", "60"))
+
+
+class CachedAPIKey(NamedTuple):
+    """Read-only copy of an active APIKey row"""
+    id: int
+    user_id: int
+    permission_mask: int
+    expires_at: Optional[datetime]
+
+    def has_permission(self, permission: str) -> bool:
+        return has_permission(self.permission_mask, permission)
+
+    def is_expired(self, now: datetime) -> bool:
+        if self.expires_at is None:
+            return False
+        expires_at = self.expires_at
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        return expires_at <= now
+
+
+_cache: Dict[str, Tuple[CachedAPIKey, float]] = {}  # key_hash -> (key, loaded_at)
+_last_used: Dict[int, datetime] = {}                 # key id -> newest use
+_lock = threading.Lock()
+
+# Jeden UPDATE dla całej paczki; GREATEST nie cofa last_used zapisanego przez inny proces
+_FLUSH_LAST_USED_SQL = text("""
+    UPDATE api_keys AS k
+    SET last_used = GREATEST(k.last_used, v.used_at)
+    FROM unnest(CAST(:ids AS integer[]), CAST(:used_at AS timestamptz[])) AS v(id, used_at)
+    WHERE k.id = v.id
+""")
+
+
+def lookup(db: Session, key_hash: str) -> Optional[CachedAPIKey]:
+    """Active, non-expired key for a hash (cached for API_KEY_CACHE_TTL)"""
+    now = datetime.now(timezone.utc)
+    with _lock:
+        entry = _cache.get(key_hash)
+    if entry is not None and time.monotonic() - entry[1] < API_KEY_CACHE_TTL:
+        key = entry[0]
+    else:
+        row = db.query(APIKey.id, APIKey.user_id, APIKey.permissions, APIKey.expires_at).filter(
+            APIKey.key_hash == key_hash,
+            APIKey.is_active == True
+        ).first()
+        if row is None:
+            with _lock:
+                _cache.pop(key_hash, None)
+            return None
+        key = CachedAPIKey(row.id, row.user_id, permission_registry.compile(row.permissions), row.expires_at)
+        with _lock:
+            _cache[key_hash] = (key, time.monotonic())
+
+    if key.is_expired(now):
+        return None
+
+    with _lock:
+        _last_used[key.id] = now
+    return key
+
+
+def invalidate(key_hash: Optional[str] = None) -> None:
+    """Drop one key (or all keys) from the cache"""
+    with _lock:
+        if key_hash is None:
+            _cache.clear()
+        else:
+            _cache.pop(key_hash, None)
+
+
+def flush_last_used(db: Session) -> int:
+    """Write buffered last_used timestamps in one UPDATE; returns number of keys"""
+    with _lock:
+        if not _last_used:
+            return 0
+        pending = dict(_last_used)
+        _last_used.clear()
+
+    try:
+        db.execute(_FLUSH_LAST_USED_SQL, {
+            "ids": list(pending.keys()),
+            "used_at": list(pending.values()),
+        })
+        db.commit()
+    except Exception:
+        db.rollback()
+        # Przywróć niezapisane znaczniki (nowsze wygrywają)
+        with _lock:
+            for key_id, used_at in pending.items():
+                if key_id not in _last_used or _last_used[key_id] < used_at:
+                    _last_used[key_id] = used_at
+        raise
+    return len(pending)
+
+
+def stats() -> dict:
+    with _lock:
+        return {"cached_keys": len(_cache), "pending_last_used": len(_last_used)}
@@ -0,0 +1,242 @@
+"""
+Live comment events - PostgreSQL LISTEN/NOTIFY fanned out to SSE subscribers
+
+Write endpoints call notify_comment_event() before commit: pg_notify is
+transactional, so the event is delivered only if the change commits. Each
+process keeps a single LISTEN connection (opened on the first subscriber) and
+pushes events into bounded per-client queues. A client whose queue is full is
+evicted instead of buffering without limit; it reconnects and re-fetches.
+"""
+import asyncio
+import json
+import os
+from typing import Dict, Optional, Set
+
+import psycopg2
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from .database import DATABASE_URL
+
+COMMENT_EVENTS_CHANNEL = "comment_events"
+
+# LISTEN wymaga sesyjnego połączenia - przy PgBouncerze (transaction pooling) wskaż bazę bezpośrednio
+COMMENT_EVENTS_DATABASE_URL = os.getenv("COMMENT_EVENTS_DATABASE_URL", DATABASE_URL)
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "100"))
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+SSE_MAX_CLIENTS = int(os.getenv("SSE_MAX_CLIENTS", "1000"))
+SSE_RECONNECT_SECONDS = 5
+
+# Limit payloadu NOTIFY to 8000 bajtów - treść komentarza pomijamy jeśli się nie mieści
+_NOTIFY_MAX_BYTES = 7900
+
+_EVICTED = object()
+
+
+def notify_comment_event(db: Session, post_slug: str, event: str, comment_id: int, **data) -> None:
+    """Queue a NOTIFY in the current transaction (sent to listeners on commit)"""
+    payload = {"slug": post_slug, "event": event, "comment_id": comment_id, **data}
+    message = json.dumps(payload, ensure_ascii=False, default=str)
+    if len(message.encode()) > _NOTIFY_MAX_BYTES and "content" in payload:
+        payload.pop("content")
+        payload["truncated"] = True
+        message = json.dumps(payload, ensure_ascii=False, default=str)
+    db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": COMMENT_EVENTS_CHANNEL, "payload": message})
+
+
+class Subscription:
+    """One SSE client - bounded queue of ready-to-send SSE frames"""
+
+    def __init__(self, slug: str, maxsize: int = SSE_QUEUE_SIZE):
+        self.slug = slug
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.evicted = False
+
+    def push(self, message: str) -> bool:
+        """Non-blocking enqueue; False when the client is too slow"""
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def evict(self) -> None:
+        # Zrzuć zaległe zdarzenia i obudź generator sentinelem
+        self.evicted = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(_EVICTED)
+
+
+def _close_connected(future: asyncio.Future) -> None:
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+class CommentEventHub:
+    """Per-process LISTEN connection and slug -> subscribers fan-out"""
+
+    def __init__(self, database_url: Optional[str] = COMMENT_EVENTS_DATABASE_URL):
+        self.database_url = database_url
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._conn = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listen_task: Optional[asyncio.Task] = None
+        self.delivered = 0
+        self.evictions = 0
+        self.reconnects = 0
+
+    @property
+    def client_count(self) -> int:
+        return sum(len(subs) for subs in self._subscribers.values())
+
+    # --- subscribers -------------------------------------------------------
+
+    def subscribe(self, slug: str) -> Subscription:
+        subscription = Subscription(slug)
+        self._subscribers.setdefault(slug, set()).add(subscription)
+        if self._conn is None and self._listen_task is None:
+            self._start_listening()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subs = self._subscribers.get(subscription.slug)
+        if subs is not None:
+            subs.discard(subscription)
+            if not subs:
+                del self._subscribers[subscription.slug]
+
+    def dispatch(self, raw_payload: str) -> int:
+        """Fan out one NOTIFY payload to the slug's subscribers; returns number delivered"""
+        try:
+            payload = json.loads(raw_payload)
+            slug, event = payload["slug"], payload["event"]
+        except (ValueError, KeyError, TypeError):
+            return 0
+
+        # Ramka SSE budowana raz dla wszystkich klientów
+        frame = f"event: {event}\ndata: {raw_payload}\n\n"
+        delivered = 0
+        for subscription in list(self._subscribers.get(slug, ())):
+            if subscription.push(frame):
+                delivered += 1
+            else:
+                self.evictions += 1
+                self.unsubscribe(subscription)
+                subscription.evict()
+        self.delivered += delivered
+        return delivered
+
+    # --- LISTEN connection -------------------------------------------------
+
+    def _connect(self):
+        url = make_url(self.database_url).set(drivername="postgresql")
+        conn = psycopg2.connect(url.render_as_string(hide_password=False))
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {COMMENT_EVENTS_CHANNEL}")
+        return conn
+
+    def _start_listening(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._listen_task = self._loop.create_task(self._listen())
+
+    async def _listen(self, delay: float = 0) -> None:
+        """Open the LISTEN connection in a worker thread, then watch its socket on the loop"""
+        if delay:
+            await asyncio.sleep(delay)
+            self.reconnects += 1
+            if not self._subscribers:
+                self._listen_task = None
+                return
+
+        # psycopg2.connect blokuje - wolna/niedostępna baza nie może zatrzymać pętli zdarzeń
+        connecting = self._loop.run_in_executor(None, self._connect)
+        try:
+            conn = await asyncio.shield(connecting)
+        except asyncio.CancelledError:
+            # close() w trakcie łączenia - połączenie otwarte w wątku nie może wyciec
+            connecting.add_done_callback(_close_connected)
+            raise
+        except psycopg2.Error as e:
+            print(f"❌ Comment events LISTEN connection failed: {e}")
+            self._schedule_reconnect()
+            return
+
+        self._listen_task = None
+        self._conn = conn
+        self._loop.add_reader(self._conn.fileno(), self._on_readable)
+        print(f"📡 Listening for comment events on '{COMMENT_EVENTS_CHANNEL}'")
+
+    def _on_readable(self) -> None:
+        try:
+            self._conn.poll()
+        except psycopg2.Error as e:
+            print(f"🔌 Comment events connection lost: {e}")
+            self._close_connection()
+            self._schedule_reconnect()
+            return
+        while self._conn.notifies:
+            self.dispatch(self._conn.notifies.pop(0).payload)
+
+    def _schedule_reconnect(self) -> None:
+        self._listen_task = self._loop.create_task(self._listen(SSE_RECONNECT_SECONDS))
+
+    def _close_connection(self) -> None:
+        if self._conn is None:
+            return
+        try:
+            self._loop.remove_reader(self._conn.fileno())
+        except Exception:
+            pass
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+
+    def close(self) -> None:
+        """Stop listening and disconnect all clients (shutdown)"""
+        if self._listen_task is not None:
+            self._listen_task.cancel()
+            self._listen_task = None
+        self._close_connection()
+        for subs in list(self._subscribers.values()):
+            for subscription in list(subs):
+                subscription.evict()
+        self._subscribers.clear()
+
+    def stats(self) -> dict:
+        return {
+            "listening": self._conn is not None,
+            "clients": self.client_count,
+            "slugs": len(self._subscribers),
+            "delivered": self.delivered,
+            "evictions": self.evictions,
+            "reconnects": self.reconnects,
+        }
+
+
+comment_event_hub = CommentEventHub()
+
+
+async def stream_events(subscription: Subscription, is_disconnected, heartbeat: float = SSE_HEARTBEAT_SECONDS):
+    """SSE body for one client: events as they arrive, comment heartbeats when idle"""
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    break
+                yield ": ping\n\n"
+                continue
+            if message is _EVICTED:
+                # Klient nie nadążał - EventSource połączy się ponownie
+                yield "event: evicted\ndata: {}\n\n"
+                break
+            yield message
+    finally:
+        comment_event_hub.unsubscribe(subscription)
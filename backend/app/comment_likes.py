@@ -0,0 +1,174 @@
+"""
+Single-statement like/dislike toggle for comments
+
+The whole toggle (validation, delete/update/insert of the CommentLike row and
+the XP event for the comment author) runs as one CTE-based statement, so it
+costs one round trip and cannot race with concurrent toggles on
+uq_comment_user_like.
+"""
+from typing import NamedTuple, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from .rank_utils import XP_ACTIONS, apply_rank_upgrade
+
+# Ile razy powtórzyć instrukcję po deadlocku / błędzie serializacji
+LIKE_TOGGLE_RETRIES = 3
+
+# Kody PostgreSQL: serialization_failure, deadlock_detected
+_RETRYABLE_PGCODES = {"40001", "40P01"}
+
+# Toggle:
+#   brak wiersza            -> INSERT                (added)
+#   ten sam typ reakcji     -> DELETE                (removed)
+#   inny typ reakcji        -> ON CONFLICT DO UPDATE (updated)
+# Stan "prev" pochodzi ze snapshotu instrukcji; DELETE ponownie sprawdza
+# is_like, a ON CONFLICT rozstrzyga równoległe INSERT-y - wynik jest zawsze
+# spójny z unikalnym indeksem, a powtórzony duplikat żądania nie tworzy
+# drugiego wiersza.
+_TOGGLE_LIKE_SQL = """
+    WITH target AS (
+        SELECT id, user_id AS author_id
+        FROM comments
+        WHERE id = :comment_id AND is_deleted = false
+    ), prev AS (
+        SELECT is_like
+        FROM comment_likes
+        WHERE comment_id = :comment_id AND user_id = :user_id
+    ), removed AS (
+        DELETE FROM comment_likes
+        WHERE comment_id = :comment_id
+          AND user_id = :user_id
+          AND is_like = :is_like
+          AND EXISTS (SELECT 1 FROM target WHERE author_id <> :user_id)
+        RETURNING is_like
+    ), upserted AS (
+        INSERT INTO comment_likes (comment_id, user_id, is_like, created_at, updated_at)
+        SELECT target.id, :user_id, :is_like, now(), now()
+        FROM target
+        WHERE target.author_id <> :user_id
+          AND NOT EXISTS (SELECT 1 FROM prev WHERE prev.is_like = :is_like)
+        ON CONFLICT (comment_id, user_id) DO UPDATE
+            SET is_like = EXCLUDED.is_like, updated_at = now()
+            WHERE comment_likes.is_like IS DISTINCT FROM EXCLUDED.is_like
+        RETURNING is_like, (xmax = 0) AS inserted
+    ){xp_cte}
+    SELECT
+        (SELECT author_id FROM target) AS author_id,
+        (SELECT is_like FROM prev) AS prev_like,
+        (SELECT is_like FROM removed) AS removed_like,
+        (SELECT is_like FROM upserted) AS new_like,
+        (SELECT inserted FROM upserted) AS inserted{xp_select}
+"""
+
+# XP dla autora komentarza gdy otrzymał lajka (dodany lub zmieniony z dislike)
+_XP_CTE = """, xp_event AS (
+        INSERT INTO xp_events (user_id, action, xp, comments_delta, likes_delta)
+        SELECT target.author_id, 'like_received', :xp, :comments_delta, :likes_delta
+        FROM target, upserted
+        WHERE upserted.is_like
+        RETURNING user_id, xp
+    )"""
+
+# Efektywne XP autora (CTE nie widzi własnego INSERT-a, więc dodajemy xp jawnie)
+_XP_SELECT = """,
+        (SELECT xp FROM xp_event) AS xp_awarded,
+        (SELECT COALESCE(u.reputation_score, 0)
+                + COALESCE((SELECT SUM(e.xp) FROM xp_events e
+                            WHERE e.user_id = u.id AND e.aggregated_at IS NULL), 0)
+                + (SELECT xp FROM xp_event)
+         FROM users u WHERE u.id = (SELECT user_id FROM xp_event)) AS author_xp,
+        (SELECT u.rank_id FROM users u WHERE u.id = (SELECT user_id FROM xp_event)) AS author_rank_id"""
+
+TOGGLE_LIKE_STMT = text(_TOGGLE_LIKE_SQL.format(xp_cte=_XP_CTE, xp_select=_XP_SELECT))
+
+# Wariant bez XP - liczniki autora zapisuje like_buffer w paczkach
+TOGGLE_LIKE_NO_XP_STMT = text(_TOGGLE_LIKE_SQL.format(xp_cte="", xp_select=""))
+
+
+class LikeToggleResult(NamedTuple):
+    """Outcome of a like/dislike toggle"""
+    found: bool                      # komentarz istnieje i nie jest usunięty
+    author_id: Optional[int]
+    self_like: bool                  # próba polubienia własnego komentarza
+    action: str                      # added / removed / updated / unchanged
+    user_like_status: Optional[bool]  # stan po operacji: None / True / False
+    likes_delta: int
+    dislikes_delta: int
+    like_received: bool              # autor otrzymał lajka (dodany lub zmieniony z dislike)
+    xp_awarded: int
+    rank_check: Optional[dict]
+
+
+def _count(value: Optional[bool], is_like: bool) -> int:
+    return 1 if value is is_like else 0
+
+
+def _result_from_row(row, user_id: int, is_like: bool) -> LikeToggleResult:
+    if row.author_id is None:
+        return LikeToggleResult(False, None, False, "unchanged", None, 0, 0, False, 0, None)
+    if row.author_id == user_id:
+        return LikeToggleResult(True, row.author_id, True, "unchanged", row.prev_like, 0, 0, False, 0, None)
+
+    if row.removed_like is not None:
+        action, before, after = "removed", row.removed_like, None
+    elif row.new_like is not None:
+        if row.inserted:
+            action, before, after = "added", None, row.new_like
+        else:
+            action, before, after = "updated", not row.new_like, row.new_like
+    else:
+        # Równoległe żądanie zdążyło ustawić docelowy stan - nic do zrobienia
+        action = "unchanged"
+        before = after = None if row.prev_like is is_like else is_like
+
+    return LikeToggleResult(
+        found=True,
+        author_id=row.author_id,
+        self_like=False,
+        action=action,
+        user_like_status=after,
+        likes_delta=_count(after, True) - _count(before, True),
+        dislikes_delta=_count(after, False) - _count(before, False),
+        like_received=row.new_like is True,
+        xp_awarded=getattr(row, "xp_awarded", None) or 0,
+        rank_check=None,
+    )
+
+
+def toggle_comment_like(db: Session, comment_id: int, user_id: int, is_like: bool, record_xp: bool = True) -> LikeToggleResult:
+    """Toggle a like/dislike in one statement and commit
+
+    record_xp=False skips the author's XP event (caller buffers it instead).
+    """
+    stmt = TOGGLE_LIKE_STMT if record_xp else TOGGLE_LIKE_NO_XP_STMT
+    xp, comments_delta, likes_delta = XP_ACTIONS["like_received"]
+    params = {
+        "comment_id": comment_id,
+        "user_id": user_id,
+        "is_like": is_like,
+        "xp": xp,
+        "comments_delta": comments_delta,
+        "likes_delta": likes_delta,
+    }
+
+    for attempt in range(LIKE_TOGGLE_RETRIES):
+        try:
+            row = db.execute(stmt, params).one()
+            result = _result_from_row(row, user_id, is_like)
+
+            # Awans rangi autora - zapis tylko gdy ranga faktycznie rośnie
+            if result.xp_awarded:
+                result = result._replace(
+                    rank_check=apply_rank_upgrade(row.author_id, row.author_xp, row.author_rank_id, db)
+                )
+
+            db.commit()
+            return result
+        except OperationalError as e:
+            db.rollback()
+            # Instrukcja jest atomowa - po wycofaniu można ją bezpiecznie powtórzyć
+            if getattr(e.orig, "pgcode", None) not in _RETRYABLE_PGCODES or attempt == LIKE_TOGGLE_RETRIES - 1:
+                raise
@@ -0,0 +1,146 @@
+"""
+Static JSON snapshots of comment threads for CDN / nginx serving
+
+The first page of a post's comments as an anonymous reader sees it (the
+default GET /api/comments/{slug}) is written to COMMENT_SNAPSHOT_DIR as
+{slug}.json plus precompressed .json.gz / .json.br siblings. Writes to a slug
+schedule a rewrite; the writer debounces bursts and renders in a worker
+thread. Files are replaced atomically, so readers never see a partial file.
+
+Disabled unless COMMENT_SNAPSHOT_DIR is set. Served by
+GET /api/comments/snapshots/{slug}.json with public Cache-Control, so a CDN
+(or nginx with gzip_static/brotli_static on the same directory) can answer
+anonymous reads without touching the API or the database.
+"""
+import asyncio
+import os
+import re
+import tempfile
+import threading
+from typing import Iterable, Optional, Set
+
+from fastapi.responses import ORJSONResponse
+
+from .compression import SUPPORTED_ENCODINGS, compress
+from .database import SessionLocal
+
+COMMENT_SNAPSHOT_DIR = os.getenv("COMMENT_SNAPSHOT_DIR", "")
+COMMENT_SNAPSHOT_DEBOUNCE = float(os.getenv("COMMENT_SNAPSHOT_DEBOUNCE", "1"))
+COMMENT_SNAPSHOT_MAX_AGE = int(os.getenv("COMMENT_SNAPSHOT_MAX_AGE", "60"))
+
+# Tylko bezpieczne nazwy plików - inne slugi obsługuje zwykłe API
+_SAFE_SLUG = re.compile(r"^[A-Za-z0-9_-]{1,200}$")
+
+_SUFFIXES = {None: ".json", "gzip": ".json.gz", "br": ".json.br"}
+
+
+def snapshot_path(directory: str, slug: str, encoding: Optional[str] = None) -> Optional[str]:
+    """File path for a slug's snapshot (None for slugs that are not safe file names)"""
+    if not _SAFE_SLUG.match(slug):
+        return None
+    return os.path.join(directory, slug + _SUFFIXES[encoding])
+
+
+# Blokady per slug (paskowane) - flush w tle i generowanie przy braku pliku nie piszą naraz
+_SLUG_LOCK_STRIPES = 64
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    # Unikalny plik tymczasowy na każdy zapis - współbieżne zapisy nie obcinają sobie plików
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)  # mkstemp tworzy 0600 - nginx musi móc czytać
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class CommentSnapshotWriter:
+    """Debounced writer of per-slug comment snapshots"""
+
+    def __init__(self, directory: str = COMMENT_SNAPSHOT_DIR, debounce: float = COMMENT_SNAPSHOT_DEBOUNCE):
+        self.directory = directory
+        self.debounce = debounce
+        self._pending: Set[str] = set()
+        self._lock = threading.Lock()
+        self._slug_locks = [threading.Lock() for _ in range(_SLUG_LOCK_STRIPES)]
+        self.written = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def schedule(self, slug: str) -> None:
+        """Mark a slug for rewrite (called after a committed write)"""
+        if self.enabled and _SAFE_SLUG.match(slug):
+            with self._lock:
+                self._pending.add(slug)
+
+    def render(self, db, slug: str) -> bytes:
+        """Body identical to an anonymous GET /api/comments/{slug}"""
+        from .routers.comments import load_post_comments
+        return ORJSONResponse(load_post_comments(db, slug)).body
+
+    def write(self, slug: str, db=None) -> bytes:
+        """Render and atomically replace all encodings of one snapshot; returns the JSON body"""
+        # Render pod blokadą slugu - późniejszy zapis zawsze widzi nowsze dane
+        with self._slug_locks[hash(slug) % _SLUG_LOCK_STRIPES]:
+            own_session = db is None
+            db = db or SessionLocal()
+            try:
+                body = self.render(db, slug)
+            finally:
+                if own_session:
+                    db.close()
+
+            os.makedirs(self.directory, exist_ok=True)
+            _atomic_write(snapshot_path(self.directory, slug), body)
+            for encoding in SUPPORTED_ENCODINGS:
+                _atomic_write(snapshot_path(self.directory, slug, encoding), compress(body, encoding))
+        with self._lock:
+            self.written += 1
+        return body
+
+    def write_many(self, slugs: Iterable[str]) -> int:
+        written = 0
+        for slug in slugs:
+            try:
+                self.write(slug)
+                written += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"❌ Comment snapshot for '{slug}' failed: {e}")
+        return written
+
+    def flush(self) -> int:
+        with self._lock:
+            slugs, self._pending = self._pending, set()
+        return self.write_many(slugs) if slugs else 0
+
+    async def run(self) -> None:
+        """Background loop - rewrites pending slugs every `debounce` seconds"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.debounce)
+            if self._pending:
+                # Render + kompresja poza pętlą zdarzeń
+                await loop.run_in_executor(None, self.flush)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "directory": self.directory,
+            "pending": len(self._pending),
+            "written": self.written,
+            "errors": self.errors,
+        }
+
+
+comment_snapshot_writer = CommentSnapshotWriter()
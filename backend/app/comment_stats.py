@@ -0,0 +1,86 @@
+"""
+Comment counts per post - one grouped query for many slugs plus a short TTL cache
+
+Post cards and the blog index need counts for many posts at once; cached
+counters are invalidated by this process's create/delete endpoints and expire
+after COMMENT_STATS_CACHE_TTL seconds (changes made by other workers). Slugs
+come from clients, so the cache is a bounded LRU (COMMENT_STATS_CACHE_SIZE) and
+slugs without comments are never cached.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .models import Comment
+
+COMMENT_STATS_CACHE_TTL = float(os.getenv("COMMENT_STATS_CACHE_TTL", "30"))
+COMMENT_STATS_CACHE_SIZE = int(os.getenv("COMMENT_STATS_CACHE_SIZE", "4096"))
+
+_cache: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()  # slug -> (stats, loaded_at), LRU
+_lock = threading.Lock()
+
+
+def _stats(slug: str, total_comments: int, total_replies: int) -> dict:
+    return {
+        "post_slug": slug,
+        "total_comments": total_comments,
+        "total_replies": total_replies,
+        "total_interactions": total_comments,
+    }
+
+
+def get_comment_stats(db: Session, slugs: Iterable[str]) -> Dict[str, dict]:
+    """Counts for every slug (zeros for posts without comments) - at most one query"""
+    slugs = list(dict.fromkeys(slugs))
+    now = time.monotonic()
+    result, missing = {}, []
+    with _lock:
+        for slug in slugs:
+            entry = _cache.get(slug)
+            if entry is not None and now - entry[1] < COMMENT_STATS_CACHE_TTL:
+                _cache.move_to_end(slug)
+                result[slug] = entry[0]
+            else:
+                if entry is not None:
+                    del _cache[slug]  # przeterminowany wpis nie zostaje w pamięci
+                missing.append(slug)
+
+    if missing:
+        # ⚡ Jedno zapytanie GROUP BY zamiast dwóch COUNT na każdy slug
+        rows = db.query(
+            Comment.post_slug,
+            func.count(Comment.id),
+            func.count(Comment.parent_id),
+        ).filter(
+            Comment.post_slug.in_(missing),
+            Comment.is_deleted == False
+        ).group_by(Comment.post_slug).all()
+
+        counts = {slug: (total, replies) for slug, total, replies in rows}
+        loaded = {slug: _stats(slug, *counts.get(slug, (0, 0))) for slug in missing}
+        with _lock:
+            # Tylko slugi z komentarzami - dowolne slugi od klientów nie zapełnią cache
+            for slug in missing:
+                if slug in counts:
+                    _cache[slug] = (loaded[slug], now)
+                    _cache.move_to_end(slug)
+            while len(_cache) > COMMENT_STATS_CACHE_SIZE:
+                _cache.popitem(last=False)
+        result.update(loaded)
+
+    return {slug: result[slug] for slug in slugs}
+
+
+def invalidate(slug: str) -> None:
+    with _lock:
+        _cache.pop(slug, None)
+
+
+def clear() -> None:
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,255 @@
+"""
+Response compression (brotli / gzip) with a precompressed payload cache
+
+Responses are compressed when the client accepts it and the body is at least
+COMPRESSION_MIN_SIZE bytes. Endpoints serving shared payloads (comment threads,
+post lists) mark responses with PRECOMPRESS_CACHE_HEADER - their compressed
+bytes are kept in an LRU keyed by body digest, so identical payloads are
+compressed once and reused. Brotli is optional (pip install brotli).
+"""
+import gzip
+import hashlib
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+COMPRESSION_CACHE_MAX_BYTES = int(os.getenv("COMPRESSION_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+
+# Nagłówek-znacznik ustawiany przez endpointy; middleware go usuwa przed wysłaniem
+PRECOMPRESS_CACHE_HEADER = {"x-precompress-cache": "1"}
+
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+# Typy, których kompresja nic nie daje (SSE - ramki muszą dochodzić od razu)
+_SKIP_CONTENT_TYPES = ("image/", "video/", "audio/", "application/zip", "application/gzip", "text/event-stream")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best supported encoding from an Accept-Encoding header (br > gzip)"""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip()] = q
+
+    for encoding in SUPPORTED_ENCODINGS:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress a complete body"""
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class _StreamCompressor:
+    """Incremental compressor for streaming responses - every chunk is flushed"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)  # 31 = gzip container
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class PrecompressedCache:
+    """LRU of compressed bodies keyed by (body digest, encoding), bounded by total bytes"""
+
+    def __init__(self, max_bytes: int = COMPRESSION_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[bytes, str], bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compress(self, body: bytes, encoding: str) -> bytes:
+        key = (hashlib.blake2b(body, digest_size=16).digest(), encoding)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        compressed = compress(body, encoding)
+        if len(compressed) > self.max_bytes:
+            return compressed
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = compressed
+                self._size += len(compressed)
+                while self._size > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._size -= len(evicted)
+        return compressed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+precompressed_cache = PrecompressedCache()
+
+
+class CompressionMiddleware:
+    """Pure ASGI brotli/gzip middleware (streaming responses are compressed chunk by chunk)"""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE, cache: PrecompressedCache = precompressed_cache):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = cache
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+            if encoding:
+                responder = _CompressionResponder(self.app, encoding, self.minimum_size, self.cache)
+                await responder(scope, receive, send)
+                return
+
+            # Bez kompresji - tylko usuń nagłówek-znacznik
+            async def send_without_marker(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    del MutableHeaders(raw=message["headers"])["x-precompress-cache"]
+                await send(message)
+
+            await self.app(scope, receive, send_without_marker)
+            return
+        await self.app(scope, receive, send)
+
+
+class _CompressionResponder:
+    def __init__(self, app: ASGIApp, encoding: str, minimum_size: int, cache: PrecompressedCache):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.cache = cache
+        self.send: Send = None
+        self.initial_message: Message = {}
+        self.started = False
+        self.passthrough = False
+        self.use_cache = False
+        self.known_length = False
+        self.buffer = []
+        self.compressor: Optional[_StreamCompressor] = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            # Nagłówki wysyłamy dopiero gdy wiadomo czy body będzie kompresowane
+            self.initial_message = message
+            headers = MutableHeaders(raw=message["headers"])
+            self.use_cache = "x-precompress-cache" in headers
+            if self.use_cache:
+                del headers["x-precompress-cache"]
+            content_type = headers.get("content-type", "")
+            length = headers.get("content-length")
+            self.known_length = length is not None
+            self.passthrough = (
+                "content-encoding" in headers
+                or content_type.startswith(_SKIP_CONTENT_TYPES)
+                or (self.known_length and int(length) < self.minimum_size)
+            )
+            return
+
+        if message_type != "http.response.body":
+            await self.send(message)
+            return
+
+        if self.passthrough:
+            if not self.started:
+                self.started = True
+                await self.send(self.initial_message)
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.known_length or (not self.started and not more_body):
+            # Body o znanym rozmiarze (także pocięty przez BaseHTTPMiddleware) - kompresja w całości
+            self.buffer.append(body)
+            if not more_body:
+                await self._send_whole(b"".join(self.buffer))
+            return
+
+        headers = MutableHeaders(raw=self.initial_message["headers"])
+        if not self.started:
+            # Streaming (NDJSON/CSV eksport itp.) - kompresja przyrostowa
+            self.started = True
+            self.compressor = _StreamCompressor(self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            await self.send(self.initial_message)
+
+        data = self.compressor.chunk(body) if body else b""
+        if not more_body:
+            data += self.compressor.finish()
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    async def _send_whole(self, body: bytes) -> None:
+        self.started = True
+        headers = MutableHeaders(raw=self.initial_message["headers"])
+        if len(body) >= self.minimum_size:
+            if self.use_cache:
+                body = self.cache.get_or_compress(body, self.encoding)
+            else:
+                body = compress(body, self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            headers["Content-Length"] = str(len(body))
+        headers.add_vary_header("Accept-Encoding")
+        await self.send(self.initial_message)
+        await self.send({"type": "http.response.body", "body": body, "more_body": False})
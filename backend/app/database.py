@@ -1,9 +1,16 @@
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from fastapi import Request
 import os
+import time
 from dotenv import load_dotenv
 
+from .pool_metrics import (
+    InstrumentedNullPool, InstrumentedQueuePool, instrument_engine, pool_class_for,
+    pool_metrics, read_pool_metrics
+)
+
 load_dotenv()  # Load environment variables from .env file
 
 # Database URL from environment
@@ -25,33 +32,83 @@ print(f"🔗 Connecting to database: {DATABASE_URL.split('@')[0]}@****")  # Hide
 # PostgreSQL configuration with environment-aware settings
 ENVIRONMENT = os.getenv("ENVIRONMENT", "production")
 
-# Pool settings based on environment
+# Pool profiles - DB_POOL_PROFILE wybiera zestaw, pojedyncze DB_POOL_* nadpisują wartości
 # t3.micro (1GB RAM) needs smaller pool to save memory
-if ENVIRONMENT == "development":
-    POOL_SIZE = 5
-    MAX_OVERFLOW = 10
+POOL_PROFILES = {
+    "small": {"pool_size": 5, "max_overflow": 10, "pool_timeout": 30, "pool_recycle": 3600},
+    "medium": {"pool_size": 10, "max_overflow": 20, "pool_timeout": 30, "pool_recycle": 3600},
+    "large": {"pool_size": 20, "max_overflow": 30, "pool_timeout": 30, "pool_recycle": 1800},
+    # Transaction pooling behind PgBouncer - pooling is done by PgBouncer
+    "pgbouncer": {},
+}
+
+DB_POOL_PROFILE = os.getenv("DB_POOL_PROFILE", "small").lower()
+if DB_POOL_PROFILE not in POOL_PROFILES:
+    raise ValueError(f"DB_POOL_PROFILE must be one of: {', '.join(POOL_PROFILES)}")
+
+POOL_SETTINGS = dict(POOL_PROFILES[DB_POOL_PROFILE])
+for key in ("pool_size", "max_overflow", "pool_timeout", "pool_recycle"):
+    override = os.getenv(f"DB_{key.upper()}")
+    if override and DB_POOL_PROFILE != "pgbouncer":
+        POOL_SETTINGS[key] = int(override)
+
+# pre_ping dodaje round trip przy każdym checkout - domyślnie wyłączony,
+# po błędzie rozłączenia SQLAlchemy unieważnia całą pulę (licznik i log:
+# pool_metrics.instrument_engine); żądanie, które trafiło na błąd, dostaje 5xx
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"
+
+if DB_POOL_PROFILE == "pgbouncer":
+    # NullPool: połączenie do PgBouncera otwierane na transakcję/sesję.
+    # psycopg2 nie używa server-side prepared statements, więc tryb
+    # transaction pooling nie wymaga dodatkowych opcji sterownika.
+    POOL_SETTINGS["poolclass"] = InstrumentedNullPool
 else:
-    # Production on t3.micro - keep pool small
-    POOL_SIZE = 5  # Reduced from 20 for t3.micro
-    MAX_OVERFLOW = 10  # Reduced from 30
+    POOL_SETTINGS["poolclass"] = InstrumentedQueuePool
+
+print(f"🏊 DB pool profile: {DB_POOL_PROFILE} "
+      f"({', '.join(f'{k}={v}' for k, v in POOL_SETTINGS.items() if k != 'poolclass') or 'NullPool'}, "
+      f"pre_ping={DB_POOL_PRE_PING})")
 
 engine = create_engine(
     DATABASE_URL, 
     echo=ENVIRONMENT == "development",  # SQL logging only in dev
-    pool_size=POOL_SIZE,
-    max_overflow=MAX_OVERFLOW,
-    pool_timeout=30,
-    pool_recycle=3600,  # Recycle connections every hour
-    pool_pre_ping=True  # Validate connections before use
+    pool_pre_ping=DB_POOL_PRE_PING,
+    **POOL_SETTINGS
 )
+instrument_engine(engine)
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Optional read replica for read-heavy GET endpoints (get_read_db)
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+# Po zapisie klient czyta z primary przez tyle sekund (opóźnienie replikacji)
+READ_AFTER_WRITE_SECONDS = int(os.getenv("READ_AFTER_WRITE_SECONDS", "5"))
+READ_PRIMARY_COOKIE = "read_primary_until"
+
+if DATABASE_READ_URL:
+    print(f"📖 Read replica: {DATABASE_READ_URL.split('@')[0]}@**** "
+          f"(primary for {READ_AFTER_WRITE_SECONDS}s after a write)")
+    _replica_engine = create_engine(
+        DATABASE_READ_URL,
+        echo=ENVIRONMENT == "development",
+        pool_pre_ping=DB_POOL_PRE_PING,
+        **{**POOL_SETTINGS, "poolclass": pool_class_for(POOL_SETTINGS["poolclass"], read_pool_metrics)}
+    )
+    instrument_engine(_replica_engine, read_pool_metrics)
+    # Zapis przez replikę = błąd, nie cicha niespójność
+    read_engine = _replica_engine.execution_options(postgresql_readonly=True)
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+else:
+    read_engine = engine
+    ReadSessionLocal = SessionLocal
+
 # Create Base class
 Base = declarative_base()
 
 # Dependency to get database session
+# Session jest leniwa: połączenie z puli pobiera dopiero pierwsze zapytanie i oddaje
+# commit/rollback/close - żądania anonimowe i odrzucone przez auth nie zajmują puli
 def get_db():
     db = SessionLocal()
     try:
@@ -60,6 +117,34 @@ def get_db():
         db.close()
 
 
+def wrote_recently(request: Request) -> bool:
+    """Did this client write within READ_AFTER_WRITE_SECONDS (read-your-writes)"""
+    until = request.cookies.get(READ_PRIMARY_COOKIE)
+    try:
+        return until is not None and float(until) > time.time()
+    except ValueError:
+        return False
+
+
+# Dependency for read-only endpoints - replica unless the client just wrote
+def get_read_db(request: Request):
+    if ReadSessionLocal is SessionLocal or wrote_recently(request):
+        db = SessionLocal()
+    else:
+        db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_pool_stats() -> dict:
+    """Connection pool metrics for the primary and read replica engines"""
+    stats = {"profile": DB_POOL_PROFILE, **pool_metrics.snapshot(engine.pool)}
+    if read_engine is not engine:
+        stats["read_replica"] = read_pool_metrics.snapshot(read_engine.pool)
+    return stats
+
 
 def init_roles_and_ranks():
     """Initialize default roles and ranks in the system"""
@@ -184,6 +269,10 @@ def init_roles_and_ranks():
         
         db.commit()
         
+        # Snapshot ról i rang w pamięci musi zobaczyć nowe wiersze
+        from app.role_cache import invalidate
+        invalidate()
+        
     except Exception as e:
         print(f"❌ Error during roles and ranks initialization: {e}")
         db.rollback()
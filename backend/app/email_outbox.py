@@ -0,0 +1,157 @@
+"""
+Transactional email outbox
+
+Endpoints add an EmailOutbox row in the same transaction as the change that
+needs the email (registration) and return without waiting for the provider.
+dispatch_pending claims due rows with FOR UPDATE SKIP LOCKED (safe with several
+workers), sends them and retries failures with exponential backoff. Rows that
+run out of attempts stay undelivered - the user can request a new code via
+/auth/resend-verification. The payload (verification code in plaintext) is
+cleared once a row is sent, gives up or is superseded by a newer code, and
+purge_finished deletes sent/dead rows after EMAIL_OUTBOX_RETENTION_HOURS.
+"""
+import os
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .email_service import EmailService
+from .models import EmailOutbox
+
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", "20"))
+EMAIL_OUTBOX_INTERVAL = float(os.getenv("EMAIL_OUTBOX_INTERVAL", "10"))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "5"))
+EMAIL_OUTBOX_RETENTION_HOURS = float(os.getenv("EMAIL_OUTBOX_RETENTION_HOURS", "24"))
+EMAIL_OUTBOX_PURGE_BATCH = 1000
+
+# Dzierżawa - jeśli worker padnie w trakcie wysyłki, wiersz wróci po tym czasie
+EMAIL_OUTBOX_LEASE_SECONDS = 120
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = 30
+
+_CLAIM_SQL = text("""
+    UPDATE email_outbox
+    SET attempts = attempts + 1,
+        next_attempt_at = now() + make_interval(secs => :lease)
+    WHERE id IN (
+        SELECT id FROM email_outbox
+        WHERE sent_at IS NULL
+          AND next_attempt_at <= now()
+          AND attempts < :max_attempts
+        ORDER BY next_attempt_at
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, kind, recipient, payload, attempts
+""")
+
+# Po wysyłce payload (kod weryfikacyjny) jest czyszczony
+_MARK_SENT_SQL = text("""
+    UPDATE email_outbox
+    SET sent_at = now(), payload = CAST('{}' AS json), last_error = NULL
+    WHERE id = :id
+""")
+
+# Ostatnia nieudana próba - kod nie może zostać w tabeli
+_MARK_FAILED_SQL = text("""
+    UPDATE email_outbox
+    SET last_error = :error,
+        next_attempt_at = now() + make_interval(secs => :delay),
+        payload = CASE WHEN attempts >= :max_attempts THEN CAST('{}' AS json) ELSE payload END
+    WHERE id = :id
+""")
+
+# Nowy kod unieważnia stary - starsze niewysłane wiadomości już nie wychodzą
+_SUPERSEDE_SQL = text("""
+    UPDATE email_outbox
+    SET payload = CAST('{}' AS json),
+        attempts = GREATEST(attempts, :max_attempts),
+        last_error = 'superseded'
+    WHERE user_id = :user_id AND kind = :kind AND sent_at IS NULL
+""")
+
+# Wysłane i martwe (bez prób) wiersze po okresie retencji
+_PURGE_SQL = text("""
+    DELETE FROM email_outbox
+    WHERE id IN (
+        SELECT id FROM email_outbox
+        WHERE (sent_at IS NOT NULL OR attempts >= :max_attempts)
+          AND created_at < now() - make_interval(secs => :retention)
+        LIMIT :batch_size
+    )
+""")
+
+
+def enqueue_verification_email(db: Session, user_id: Optional[int], email: str, code: str,
+                               username: str, language: str) -> EmailOutbox:
+    """Add a verification email to the outbox (caller commits with its own changes)
+
+    Older pending verification emails of the same user are superseded first.
+    """
+    if user_id is not None:
+        db.execute(_SUPERSEDE_SQL, {
+            "user_id": user_id, "kind": "verification", "max_attempts": EMAIL_OUTBOX_MAX_ATTEMPTS,
+        })
+    message = EmailOutbox(
+        kind="verification",
+        recipient=email,
+        user_id=user_id,
+        payload={"code": code, "username": username, "language": language},
+    )
+    db.add(message)
+    return message
+
+
+async def _deliver(kind: str, recipient: str, payload: dict) -> dict:
+    if kind == "verification":
+        return await EmailService.send_verification_email(
+            recipient, payload["code"], payload["username"], payload.get("language", "pl")
+        )
+    return {"success": False, "message": f"Unknown outbox kind: {kind}"}
+
+
+async def dispatch_pending(db: Session, batch_size: int = EMAIL_OUTBOX_BATCH_SIZE) -> dict:
+    """Send due outbox rows; returns counts of sent and failed messages"""
+    rows = db.execute(_CLAIM_SQL, {
+        "lease": EMAIL_OUTBOX_LEASE_SECONDS,
+        "max_attempts": EMAIL_OUTBOX_MAX_ATTEMPTS,
+        "batch_size": batch_size,
+    }).all()
+    db.commit()  # dzierżawa widoczna dla innych workerów zanim zaczniemy wysyłać
+
+    sent = failed = 0
+    for row in rows:
+        try:
+            result = await _deliver(row.kind, row.recipient, row.payload or {})
+        except Exception as e:
+            result = {"success": False, "message": str(e)}
+
+        if result.get("success", False):
+            db.execute(_MARK_SENT_SQL, {"id": row.id})
+            sent += 1
+        else:
+            delay = EMAIL_OUTBOX_RETRY_BASE_SECONDS * 2 ** (row.attempts - 1)
+            db.execute(_MARK_FAILED_SQL, {
+                "id": row.id, "error": result.get("message"), "delay": delay,
+                "max_attempts": EMAIL_OUTBOX_MAX_ATTEMPTS,
+            })
+            failed += 1
+        db.commit()
+
+    return {"sent": sent, "failed": failed}
+
+
+def purge_finished(db: Session, batch_size: int = EMAIL_OUTBOX_PURGE_BATCH) -> int:
+    """Delete sent and dead rows older than the retention period in batches; returns number deleted"""
+    total = 0
+    while True:
+        deleted = db.execute(_PURGE_SQL, {
+            "max_attempts": EMAIL_OUTBOX_MAX_ATTEMPTS,
+            "retention": EMAIL_OUTBOX_RETENTION_HOURS * 3600,
+            "batch_size": batch_size,
+        }).rowcount
+        db.commit()
+        total += deleted
+        if deleted < batch_size:
+            break
+    return total
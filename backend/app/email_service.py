@@ -1,11 +1,13 @@
 """
 Email service using Resend for sending emails with multi-language support
 """
+import html
 import os
 import resend
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
 from datetime import datetime, timezone
+from .email_templates import SafeHTML, compile_templates, render as render_email
 
 # Configure Resend
 resend.api_key = os.getenv("RESEND_API_KEY")
@@ -89,6 +91,9 @@ EMAIL_TRANSLATIONS = {
     }
 }
 
+# Szablony kompilowane raz przy imporcie - (email_type, language) -> EmailTemplate
+EMAIL_TEMPLATES = compile_templates(EMAIL_TRANSLATIONS)
+
 def get_translation(language: str, email_type: str, key: str) -> str:
     """Get translation for a specific key"""
     lang = language if language in EMAIL_TRANSLATIONS else "en"  # Default to English
@@ -182,124 +187,23 @@ class EmailService:
         
         print(f"🔄 Starting send_verification_email for {email}")
         
-        # Get translations
-        t = EMAIL_TRANSLATIONS.get(language, EMAIL_TRANSLATIONS["en"])["verification"]
-        
-        print(f"📝 Got translations for language: {language}")
-        
         # Create verification link with code for auto-verification
         frontend_url = os.getenv("FRONTEND_URL", "http://localhost:4321")
         verification_link = f"{frontend_url}/{language}/verify-email?email={email}&code={verification_code}"
         
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <title>{t["subject"]}</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: #2563eb; color: white; padding: 20px; text-align: center; }}
-                .content {{ padding: 20px; background: #f9f9f9; }}
-                .code {{ 
-                    font-size: 24px; 
-                    font-weight: bold; 
-                    background: #e5e7eb; 
-                    padding: 15px; 
-                    text-align: center; 
-                    margin: 20px 0; 
-                    border-radius: 5px;
-                    letter-spacing: 2px;
-                }}
-                .button {{
-                    display: inline-block;
-                    background: #2563eb;
-                    color: white !important;
-                    padding: 12px 30px;
-                    text-decoration: none;
-                    border-radius: 5px;
-                    margin: 20px 0;
-                    font-weight: bold;
-                    text-shadow: none;
-                    font-size: 16px;
-                    border: 2px solid #2563eb;
-                }}
-                .button:hover {{
-                    background: #1d4ed8;
-                    color: white !important;
-                    border-color: #1d4ed8;
-                }}
-                .link {{
-                    color: #2563eb;
-                    word-break: break-all;
-                    font-size: 14px;
-                    background: #f3f4f6;
-                    padding: 10px;
-                    border-radius: 5px;
-                    margin: 10px 0;
-                }}
-                .footer {{ padding: 20px; text-align: center; color: #666; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>Portfolio KGR33N</h1>
-                    <p>{t["header"]}</p>
-                </div>
-                <div class="content">
-                    <h2>{t["greeting"].format(username=username)}</h2>
-                    <p>{t["message"]}</p>
-                    <div class="code">{verification_code}</div>
-                    <p>{t["code_validity"]}</p>
-                    
-                    <hr style="margin: 30px 0; border: none; border-top: 1px solid #ddd;">
-                    
-                    <p>{t["verification_link"]}</p>
-                    <div style="text-align: center;">
-                        <a href="{verification_link}" class="button">{t["button_text"]}</a>
-                    </div>
-                    
-                    <p>{t["manual_link"]}</p>
-                    <div class="link">{verification_link}</div>
-                    
-                    <hr style="margin: 30px 0; border: none; border-top: 1px solid #ddd;">
-                    
-                    <p>{t["ignore_message"]}</p>
-                </div>
-                <div class="footer">{t["footer"].format(year=datetime.now(timezone.utc).year)}</div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        text_content = f"""
-        Portfolio KGR33N - {t["header"]}
-        
-        {t["greeting"].format(username=username)}
-        
-        {t["message"]}
-        
-        {verification_code}
-        
-        {t["code_validity"]}
-        
-        {t["verification_link"]}
-        {verification_link}
-        
-        {t["ignore_message"]}
-        
-        {t["footer"].format(year=datetime.now(timezone.utc).year)}
-        """
+        rendered = render_email(
+            EMAIL_TEMPLATES, "verification", language,
+            username=username, code=verification_code, link=verification_link,
+            year=datetime.now(timezone.utc).year
+        )
         
         print(f"📧 Creating EmailMessage for {email}")
         
         message = EmailMessage(
             to=[email],
-            subject=t["subject"],
-            html=html_content,
-            text=text_content
+            subject=rendered.subject,
+            html=rendered.html,
+            text=rendered.text
         )
         
         print(f"📤 Calling send_email...")
@@ -317,92 +221,20 @@ class EmailService:
     ) -> dict:
         """Send password reset email in specified language"""
         
-        # Get translations
-        t = EMAIL_TRANSLATIONS.get(language, EMAIL_TRANSLATIONS["en"])["password_reset"]
         print(f"🔄 Starting send_password_reset_email for {email} in {language}")
         # Include language in URL path (consistent with verification)
         reset_url = f"{os.getenv('FRONTEND_URL', 'http://localhost:4321')}/{language}/reset-password?token={reset_token}&email={email}"
         
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <title>{t["subject"]}</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: #dc2626; color: white; padding: 20px; text-align: center; }}
-                .content {{ padding: 20px; background: #f9f9f9; }}
-                .button {{ 
-                    display: inline-block; 
-                    background: #2563eb; 
-                    color: white !important; 
-                    padding: 12px 30px; 
-                    text-decoration: none; 
-                    border-radius: 5px; 
-                    margin: 20px 0;
-                    font-weight: bold;
-                    text-shadow: none;
-                    font-size: 16px;
-                    border: 2px solid #2563eb;
-                }}
-                .button:hover {{ 
-                    background: #1d4ed8; 
-                    color: white !important;
-                    border-color: #1d4ed8;
-                }}
-                .footer {{ padding: 20px; text-align: center; color: #666; }}
-                .warning {{ background: #fef3c7; padding: 15px; border-radius: 5px; margin: 15px 0; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>Portfolio KGR33N</h1>
-                    <p>{t["header"]}</p>
-                </div>
-                <div class="content">
-                    <h2>{t["greeting"].format(username=username)}</h2>
-                    <p>{t["message"]}</p>
-                    <p>{t["instructions"]}</p>
-                    <p style="text-align: center;">
-                        <a href="{reset_url}" class="button">{t["button_text"]}</a>
-                    </p>
-                    <div class="warning">
-                        <strong>{t["warning_title"]}:</strong> {t["link_validity"]} {t["ignore_message"]}
-                    </div>
-                    <p>{t["manual_copy"]}:</p>
-                    <p style="word-break: break-all; color: #666;">{reset_url}</p>
-                </div>
-                <div class="footer">
-                    <p>{t["footer"].format(year=datetime.now(timezone.utc).year)}</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        text_content = f"""
-        Portfolio KGR33N - {t["header"]}
-        
-        {t["greeting"].format(username=username)}
-        
-        {t["message"]}
-        
-        {t["instructions"]}
-        {reset_url}
-        
-        {t["warning_title"]}: {t["link_validity"]} {t["ignore_message"]}
-        
-        {t["footer"].format(year=datetime.now(timezone.utc).year)}
-        """
+        rendered = render_email(
+            EMAIL_TEMPLATES, "password_reset", language,
+            username=username, link=reset_url, year=datetime.now(timezone.utc).year
+        )
         
         message = EmailMessage(
             to=[email],
-            subject=t["subject"],
-            html=html_content,
-            text=text_content
+            subject=rendered.subject,
+            html=rendered.html,
+            text=rendered.text
         )
         
         return await EmailService.send_email(message)
@@ -417,64 +249,20 @@ class EmailService:
     ) -> dict:
         """Send contact form email in specified language"""
         
-        # Get translations
-        t = EMAIL_TRANSLATIONS.get(language, EMAIL_TRANSLATIONS["en"])["contact_form"]
-        
         admin_email = os.getenv("ADMIN_EMAIL", FROM_EMAIL)
         
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <title>{t["header"]}</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: #059669; color: white; padding: 20px; text-align: center; }}
-                .content {{ padding: 20px; background: #f9f9f9; }}
-                .field {{ margin: 15px 0; }}
-                .label {{ font-weight: bold; color: #374151; }}
-                .value {{ background: white; padding: 10px; border-radius: 3px; margin-top: 5px; }}
-                .message-content {{ background: white; padding: 15px; border-radius: 5px; border-left: 4px solid #059669; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>Portfolio KGR33N</h1>
-                    <p>{t["header"]}</p>
-                </div>
-                <div class="content">
-                    <div class="field">
-                        <div class="label">{t["field_name"]}</div>
-                        <div class="value">{name}</div>
-                    </div>
-                    <div class="field">
-                        <div class="label">{t["field_email"]}</div>
-                        <div class="value">{email}</div>
-                    </div>
-                    <div class="field">
-                        <div class="label">{t["field_subject"]}</div>
-                        <div class="value">{subject}</div>
-                    </div>
-                    <div class="field">
-                        <div class="label">{t["field_message"]}</div>
-                        <div class="message-content">{message.replace(chr(10), '<br>')}</div>
-                    </div>
-                    <p style="color: #666; font-size: 14px; margin-top: 30px;">
-                        {t["sent_at"]}: {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')}
-                    </p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        # Treść od użytkownika jest escapowana; nowe linie -> <br>
+        rendered = render_email(
+            EMAIL_TEMPLATES, "contact_form", language,
+            name=name, email=email, subject=subject,
+            message=SafeHTML(html.escape(message).replace("\n", "<br>")),
+            sent_at=datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        )
         
         message_obj = EmailMessage(
             to=[admin_email],
-            subject=t["subject"].format(subject=subject),
-            html=html_content,
+            subject=rendered.subject,
+            html=rendered.html,
             reply_to=email
         )
         
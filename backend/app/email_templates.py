@@ -0,0 +1,326 @@
+"""
+Precompiled email templates
+
+Each (email_type, language) pair is compiled once: translations are inlined
+and the result is a format string holding only the variable slots (username,
+code, link, year ...). render() escapes every value for HTML unless it is
+wrapped in SafeHTML; plain-text and subject templates are not escaped.
+
+Sources use {t.key} for translations and {name} for per-email variables;
+literal braces (CSS) are doubled as in f-strings.
+"""
+import html
+from string import Formatter
+from typing import Dict, NamedTuple, Optional, Tuple
+
+_formatter = Formatter()
+
+
+class SafeHTML(str):
+    """Already escaped HTML fragment - inserted into HTML templates as is"""
+
+
+def _escape_literal(text: str) -> str:
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+class CompiledTemplate:
+    """Format string with translations inlined; only variable slots remain"""
+    __slots__ = ("source", "slots", "escape")
+
+    def __init__(self, source: str, translations: Dict[str, str], escape: bool):
+        # 1. przebieg: wstaw tłumaczenia (mogą zawierać własne sloty, np. {username})
+        inlined = []
+        for literal, field, spec, conversion in _formatter.parse(source):
+            inlined.append(_escape_literal(literal))
+            if field is None:
+                continue
+            if field.startswith("t."):
+                inlined.append(translations.get(field[2:], ""))
+            else:
+                inlined.append("{" + field + "}")
+        self.source = "".join(inlined)
+        # 2. przebieg: zostają tylko sloty zmiennych
+        self.slots = tuple(sorted({field for _, field, _, _ in _formatter.parse(self.source) if field}))
+        self.escape = escape
+
+    def render(self, values: Dict[str, object]) -> str:
+        if self.escape:
+            values = {
+                name: value if isinstance(value, SafeHTML) else html.escape(str(value))
+                for name, value in values.items()
+            }
+        return self.source.format_map(values)
+
+
+class EmailTemplate(NamedTuple):
+    subject: CompiledTemplate
+    html: CompiledTemplate
+    text: Optional[CompiledTemplate]
+
+
+class RenderedEmail(NamedTuple):
+    subject: str
+    html: str
+    text: Optional[str]
+
+
+def compile_templates(translations: Dict[str, Dict[str, Dict[str, str]]]) -> Dict[Tuple[str, str], EmailTemplate]:
+    """Compile every (email_type, language) pair"""
+    compiled = {}
+    for language, types in translations.items():
+        for email_type, (html_source, text_source) in TEMPLATE_SOURCES.items():
+            t = types.get(email_type, {})
+            compiled[(email_type, language)] = EmailTemplate(
+                subject=CompiledTemplate("{t.subject}", t, escape=False),
+                html=CompiledTemplate(html_source, t, escape=True),
+                text=CompiledTemplate(text_source, t, escape=False) if text_source else None,
+            )
+    return compiled
+
+
+def render(templates: Dict[Tuple[str, str], EmailTemplate], email_type: str, language: str, **values) -> RenderedEmail:
+    """Render a compiled template (unknown languages fall back to English)"""
+    template = templates.get((email_type, language)) or templates[(email_type, "en")]
+    return RenderedEmail(
+        subject=template.subject.render(values),
+        html=template.html.render(values),
+        text=template.text.render(values) if template.text else None,
+    )
+
+
+# =============================================================================
+# TEMPLATE SOURCES
+# =============================================================================
+VERIFICATION_HTML = """
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="UTF-8">
+            <title>{t.subject}</title>
+            <style>
+                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+                .header {{ background: #2563eb; color: white; padding: 20px; text-align: center; }}
+                .content {{ padding: 20px; background: #f9f9f9; }}
+                .code {{ 
+                    font-size: 24px; 
+                    font-weight: bold; 
+                    background: #e5e7eb; 
+                    padding: 15px; 
+                    text-align: center; 
+                    margin: 20px 0; 
+                    border-radius: 5px;
+                    letter-spacing: 2px;
+                }}
+                .button {{
+                    display: inline-block;
+                    background: #2563eb;
+                    color: white !important;
+                    padding: 12px 30px;
+                    text-decoration: none;
+                    border-radius: 5px;
+                    margin: 20px 0;
+                    font-weight: bold;
+                    text-shadow: none;
+                    font-size: 16px;
+                    border: 2px solid #2563eb;
+                }}
+                .button:hover {{
+                    background: #1d4ed8;
+                    color: white !important;
+                    border-color: #1d4ed8;
+                }}
+                .link {{
+                    color: #2563eb;
+                    word-break: break-all;
+                    font-size: 14px;
+                    background: #f3f4f6;
+                    padding: 10px;
+                    border-radius: 5px;
+                    margin: 10px 0;
+                }}
+                .footer {{ padding: 20px; text-align: center; color: #666; }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h1>Portfolio KGR33N</h1>
+                    <p>{t.header}</p>
+                </div>
+                <div class="content">
+                    <h2>{t.greeting}</h2>
+                    <p>{t.message}</p>
+                    <div class="code">{code}</div>
+                    <p>{t.code_validity}</p>
+                    
+                    <hr style="margin: 30px 0; border: none; border-top: 1px solid #ddd;">
+                    
+                    <p>{t.verification_link}</p>
+                    <div style="text-align: center;">
+                        <a href="{link}" class="button">{t.button_text}</a>
+                    </div>
+                    
+                    <p>{t.manual_link}</p>
+                    <div class="link">{link}</div>
+                    
+                    <hr style="margin: 30px 0; border: none; border-top: 1px solid #ddd;">
+                    
+                    <p>{t.ignore_message}</p>
+                </div>
+                <div class="footer">{t.footer}</div>
+            </div>
+        </body>
+        </html>
+        """
+
+VERIFICATION_TEXT = """
+        Portfolio KGR33N - {t.header}
+        
+        {t.greeting}
+        
+        {t.message}
+        
+        {code}
+        
+        {t.code_validity}
+        
+        {t.verification_link}
+        {link}
+        
+        {t.ignore_message}
+        
+        {t.footer}
+        """
+
+PASSWORD_RESET_HTML = """
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="UTF-8">
+            <title>{t.subject}</title>
+            <style>
+                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+                .header {{ background: #dc2626; color: white; padding: 20px; text-align: center; }}
+                .content {{ padding: 20px; background: #f9f9f9; }}
+                .button {{ 
+                    display: inline-block; 
+                    background: #2563eb; 
+                    color: white !important; 
+                    padding: 12px 30px; 
+                    text-decoration: none; 
+                    border-radius: 5px; 
+                    margin: 20px 0;
+                    font-weight: bold;
+                    text-shadow: none;
+                    font-size: 16px;
+                    border: 2px solid #2563eb;
+                }}
+                .button:hover {{ 
+                    background: #1d4ed8; 
+                    color: white !important;
+                    border-color: #1d4ed8;
+                }}
+                .footer {{ padding: 20px; text-align: center; color: #666; }}
+                .warning {{ background: #fef3c7; padding: 15px; border-radius: 5px; margin: 15px 0; }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h1>Portfolio KGR33N</h1>
+                    <p>{t.header}</p>
+                </div>
+                <div class="content">
+                    <h2>{t.greeting}</h2>
+                    <p>{t.message}</p>
+                    <p>{t.instructions}</p>
+                    <p style="text-align: center;">
+                        <a href="{link}" class="button">{t.button_text}</a>
+                    </p>
+                    <div class="warning">
+                        <strong>{t.warning_title}:</strong> {t.link_validity} {t.ignore_message}
+                    </div>
+                    <p>{t.manual_copy}:</p>
+                    <p style="word-break: break-all; color: #666;">{link}</p>
+                </div>
+                <div class="footer">
+                    <p>{t.footer}</p>
+                </div>
+            </div>
+        </body>
+        </html>
+        """
+
+PASSWORD_RESET_TEXT = """
+        Portfolio KGR33N - {t.header}
+        
+        {t.greeting}
+        
+        {t.message}
+        
+        {t.instructions}
+        {link}
+        
+        {t.warning_title}: {t.link_validity} {t.ignore_message}
+        
+        {t.footer}
+        """
+
+CONTACT_FORM_HTML = """
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="UTF-8">
+            <title>{t.header}</title>
+            <style>
+                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+                .header {{ background: #059669; color: white; padding: 20px; text-align: center; }}
+                .content {{ padding: 20px; background: #f9f9f9; }}
+                .field {{ margin: 15px 0; }}
+                .label {{ font-weight: bold; color: #374151; }}
+                .value {{ background: white; padding: 10px; border-radius: 3px; margin-top: 5px; }}
+                .message-content {{ background: white; padding: 15px; border-radius: 5px; border-left: 4px solid #059669; }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h1>Portfolio KGR33N</h1>
+                    <p>{t.header}</p>
+                </div>
+                <div class="content">
+                    <div class="field">
+                        <div class="label">{t.field_name}</div>
+                        <div class="value">{name}</div>
+                    </div>
+                    <div class="field">
+                        <div class="label">{t.field_email}</div>
+                        <div class="value">{email}</div>
+                    </div>
+                    <div class="field">
+                        <div class="label">{t.field_subject}</div>
+                        <div class="value">{subject}</div>
+                    </div>
+                    <div class="field">
+                        <div class="label">{t.field_message}</div>
+                        <div class="message-content">{message}</div>
+                    </div>
+                    <p style="color: #666; font-size: 14px; margin-top: 30px;">
+                        {t.sent_at}: {sent_at}
+                    </p>
+                </div>
+            </div>
+        </body>
+        </html>
+        """
+
+# email_type -> (html source, text source or None)
+TEMPLATE_SOURCES: Dict[str, Tuple[str, Optional[str]]] = {
+    "verification": (VERIFICATION_HTML, VERIFICATION_TEXT),
+    "password_reset": (PASSWORD_RESET_HTML, PASSWORD_RESET_TEXT),
+    "contact_form": (CONTACT_FORM_HTML, None),
+}
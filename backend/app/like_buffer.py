@@ -0,0 +1,187 @@
+"""
+Write coalescing for like bursts (optional, LIKE_BUFFER_ENABLED=true)
+
+The per-user CommentLike row is always written in the request transaction.
+Only the author-side counters (XP events for likes received) are accumulated
+in memory per comment and flushed in one batched transaction every
+LIKE_BUFFER_FLUSH_MS milliseconds or LIKE_BUFFER_MAX_EVENTS events, whichever
+comes first. A failed flush puts its deltas back into the buffer for the next
+attempt; buffered deltas not yet flushed are lost only if the process dies.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Optional
+
+from sqlalchemy import insert
+
+from .database import SessionLocal
+from .models import User, XPEvent
+from .rank_utils import XP_ACTIONS, apply_rank_upgrade, get_pending_stats
+
+LIKE_BUFFER_ENABLED = os.getenv("LIKE_BUFFER_ENABLED", "false").lower() == "true"
+LIKE_BUFFER_FLUSH_MS = int(os.getenv("LIKE_BUFFER_FLUSH_MS", "200"))
+LIKE_BUFFER_MAX_EVENTS = int(os.getenv("LIKE_BUFFER_MAX_EVENTS", "100"))
+
+
+class LikeCounterBuffer:
+    """Accumulates like deltas per comment and flushes them in batches"""
+
+    def __init__(self, flush_interval_ms: int = LIKE_BUFFER_FLUSH_MS, max_events: int = LIKE_BUFFER_MAX_EVENTS):
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_events = max_events
+        self._lock = threading.Lock()
+        self._pending: Dict[int, list] = {}  # comment_id -> [author_id, likes]
+        self._pending_events = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # Metrics
+        self.flushes = 0
+        self.events_flushed = 0
+        self.flush_errors = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    def add_like(self, comment_id: int, author_id: int) -> None:
+        """Record a like received by the comment author"""
+        with self._lock:
+            entry = self._pending.get(comment_id)
+            if entry is None:
+                self._pending[comment_id] = [author_id, 1]
+            else:
+                entry[1] += 1
+            self._pending_events += 1
+            full = self._pending_events >= self.max_events
+
+        if full and self._wakeup is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _drain(self) -> Dict[int, list]:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._pending_events = 0
+        return pending
+
+    def _restore(self, pending: Dict[int, list]) -> None:
+        """Merge drained deltas back after a failed flush"""
+        with self._lock:
+            for comment_id, (author_id, likes) in pending.items():
+                entry = self._pending.get(comment_id)
+                if entry is None:
+                    self._pending[comment_id] = [author_id, likes]
+                else:
+                    entry[1] += likes
+                self._pending_events += likes
+
+    def _write(self, per_author: Dict[int, int]) -> None:
+        """Insert one XP event per author and apply rank upgrades (one transaction)"""
+        xp, comments_delta, likes_delta = XP_ACTIONS["like_received"]
+        db = SessionLocal()
+        try:
+            authors = db.query(User.id, User.reputation_score, User.rank_id).filter(
+                User.id.in_(list(per_author.keys()))
+            ).all()
+            # Autorzy usunięci w międzyczasie są pomijani - inaczej FK blokowałby każdą próbę
+            if authors:
+                # Jedno zdarzenie XP na autora zamiast jednego na każdy lajk
+                db.execute(insert(XPEvent), [
+                    {
+                        "user_id": author.id,
+                        "action": "like_received",
+                        "xp": xp * per_author[author.id],
+                        "comments_delta": comments_delta * per_author[author.id],
+                        "likes_delta": likes_delta * per_author[author.id],
+                    }
+                    for author in authors
+                ])
+
+                # Awanse rang - efektywne XP (users + niezagregowane zdarzenia)
+                pending_stats = get_pending_stats(db, per_author.keys())
+                for user_id, reputation, rank_id in authors:
+                    effective_xp = (reputation or 0) + (pending_stats[user_id].xp if user_id in pending_stats else 0)
+                    apply_rank_upgrade(user_id, effective_xp, rank_id, db)
+
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def flush(self) -> int:
+        """Write buffered deltas in one transaction; returns number of likes flushed"""
+        pending = self._drain()
+        if not pending:
+            return 0
+
+        per_author = defaultdict(int)
+        for author_id, likes in pending.values():
+            per_author[author_id] += likes
+        batch_size = sum(per_author.values())
+
+        started = time.perf_counter()
+        try:
+            self._write(per_author)
+        except Exception as e:
+            # Delty wracają do bufora - następny flush spróbuje ponownie
+            self._restore(pending)
+            with self._lock:
+                self.flush_errors += 1
+            print(f"❌ Like buffer flush failed ({batch_size} likes kept for retry): {e}")
+            return 0
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.flushes += 1
+            self.events_flushed += batch_size
+            self.last_batch_size = batch_size
+            self.max_batch_size = max(self.max_batch_size, batch_size)
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self.total_flush_ms += elapsed_ms
+        return batch_size
+
+    async def run(self) -> None:
+        """Flush loop - every flush interval or as soon as max_events is reached"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                print(f"Error in like buffer flush loop: {e}")
+
+    def stats(self) -> dict:
+        """Flush latency and batch size metrics"""
+        with self._lock:
+            return {
+                "enabled": LIKE_BUFFER_ENABLED,
+                "flush_interval_ms": self.flush_interval * 1000,
+                "max_events": self.max_events,
+                "pending_events": self._pending_events,
+                "pending_comments": len(self._pending),
+                "flushes": self.flushes,
+                "flush_errors": self.flush_errors,
+                "events_flushed": self.events_flushed,
+                "last_batch_size": self.last_batch_size,
+                "max_batch_size": self.max_batch_size,
+                "avg_batch_size": round(self.events_flushed / self.flushes, 2) if self.flushes else 0,
+                "last_flush_ms": round(self.last_flush_ms, 3),
+                "max_flush_ms": round(self.max_flush_ms, 3),
+                "avg_flush_ms": round(self.total_flush_ms / self.flushes, 3) if self.flushes else 0,
+            }
+
+
+# Process-wide buffer instance
+like_buffer = LikeCounterBuffer()
@@ -7,13 +7,21 @@ from slowapi.middleware import SlowAPIMiddleware
 import os
 import asyncio
 from datetime import datetime
-from .database import init_roles_and_ranks
-from .routers import auth, comments, roles, profile, admin
+from .database import init_roles_and_ranks, ReadSessionLocal, SessionLocal, READ_AFTER_WRITE_SECONDS
+from .routers import auth, comments, roles, profile, admin, polls
 from .routers import blog
-from .security import limiter, get_current_admin_user, conditional_limit
+from .security import limiter, get_current_admin_user, conditional_limit, set_read_primary_cookie
 from .schemas import ContactForm, ContactResponse
 from .email_service import EmailService
-from .tasks import run_maintenance_tasks
+from .tasks import run_maintenance_tasks, aggregate_xp_ledger, flush_api_key_last_used, dispatch_email_outbox, purge_deleted_accounts, reconcile_poll_tallies
+from .api_key_cache import API_KEY_LAST_USED_FLUSH_INTERVAL
+from .email_outbox import EMAIL_OUTBOX_INTERVAL
+from .account_deletion import ACCOUNT_DELETION_INTERVAL
+from .poll_tallies import POLL_RECONCILE_INTERVAL
+from .like_buffer import LIKE_BUFFER_ENABLED, like_buffer
+from .compression import CompressionMiddleware
+from .comment_events import comment_event_hub
+from .comment_snapshots import comment_snapshot_writer
 import uvicorn
 import resend
 
@@ -51,6 +59,54 @@ async def periodic_cleanup():
         # Wait 1 hour before next cleanup
         await asyncio.sleep(3600)
 
+# XP ledger aggregation interval (seconds)
+XP_AGGREGATION_INTERVAL = float(os.getenv("XP_AGGREGATION_INTERVAL", "5"))
+
+async def periodic_xp_aggregation():
+    """Fold pending XP events into user counters every few seconds"""
+    while True:
+        try:
+            await aggregate_xp_ledger()
+        except Exception as e:
+            print(f"Error in XP aggregation: {e}")
+        await asyncio.sleep(XP_AGGREGATION_INTERVAL)
+
+async def periodic_api_key_flush():
+    """Write buffered API key last_used timestamps once a minute"""
+    while True:
+        await asyncio.sleep(API_KEY_LAST_USED_FLUSH_INTERVAL)
+        try:
+            await flush_api_key_last_used()
+        except Exception as e:
+            print(f"Error in API key last_used flush: {e}")
+
+async def periodic_email_outbox():
+    """Deliver (and retry) queued outbox emails"""
+    while True:
+        try:
+            await dispatch_email_outbox()
+        except Exception as e:
+            print(f"Error in email outbox dispatch: {e}")
+        await asyncio.sleep(EMAIL_OUTBOX_INTERVAL)
+
+async def periodic_account_purge():
+    """Purge accounts marked for deletion in bounded batches"""
+    while True:
+        try:
+            await purge_deleted_accounts()
+        except Exception as e:
+            print(f"Error in account purge: {e}")
+        await asyncio.sleep(ACCOUNT_DELETION_INTERVAL)
+
+async def periodic_poll_reconcile():
+    """Replace in-memory poll tallies with table counts (votes from other workers)"""
+    while True:
+        await asyncio.sleep(POLL_RECONCILE_INTERVAL)
+        try:
+            await reconcile_poll_tallies()
+        except Exception as e:
+            print(f"Error in poll tally reconcile: {e}")
+
 # Start background tasks
 @app.on_event("startup")
 def startup_event():  # <- Zmienione z async na sync
@@ -71,13 +127,38 @@ def startup_event():  # <- Zmienione z async na sync
         print(f"❌ Database connection failed: {e}")
         print(f"   DATABASE_URL: {DATABASE_URL.split('@')[0] if DATABASE_URL else 'NOT SET'}@****")
     
+    # Load roles/ranks snapshot into memory (served without DB afterwards)
+    try:
+        from .role_cache import load_snapshot
+        snapshot = load_snapshot()
+        print(f"✅ Loaded {len(snapshot.roles)} roles and {len(snapshot.ranks)} ranks into memory")
+    except Exception as e:
+        print(f"⚠️ Could not preload roles/ranks snapshot: {e}")
+    
     # Inicjalizacja danych została przeniesiona do skryptu create_admin.py
     # Uruchom: docker compose exec web python app/create_admin.py
     
+    loop = asyncio.get_event_loop()
+    
+    # XP ledger must be folded in every environment (profiles read pending deltas anyway)
+    loop.create_task(periodic_xp_aggregation())
+    loop.create_task(periodic_api_key_flush())
+    loop.create_task(periodic_email_outbox())
+    loop.create_task(periodic_account_purge())
+    loop.create_task(periodic_poll_reconcile())
+    
+    # Optional write coalescing for like bursts
+    if LIKE_BUFFER_ENABLED:
+        loop.create_task(like_buffer.run())
+        print(f"⚡ Like buffer enabled (flush every {like_buffer.flush_interval * 1000:.0f} ms or {like_buffer.max_events} events)")
+    
+    # Static comment snapshots for CDN serving (COMMENT_SNAPSHOT_DIR)
+    if comment_snapshot_writer.enabled:
+        loop.create_task(comment_snapshot_writer.run())
+        print(f"📸 Comment snapshots enabled in {comment_snapshot_writer.directory}")
+    
     if ENVIRONMENT == "production":
         # Only run cleanup tasks in production - use asyncio for background task
-        import asyncio
-        loop = asyncio.get_event_loop()
         loop.create_task(periodic_cleanup())
     print(f"🚀 Portfolio API started in {ENVIRONMENT} mode")
     print("💡 Aby zainicjalizować dane i utworzyć administratora:")
@@ -87,6 +168,13 @@ def startup_event():  # <- Zmienione z async na sync
 async def shutdown_event():
     """Cleanup when application shuts down"""
     print("👋 Portfolio API shutting down...")
+    await flush_api_key_last_used()
+    if LIKE_BUFFER_ENABLED:
+        flushed = like_buffer.flush()
+        print(f"⚡ Flushed {flushed} buffered likes")
+    comment_event_hub.close()
+    if comment_snapshot_writer.enabled:
+        comment_snapshot_writer.flush()
 
 # CORS Configuration - Production ready
 # Get allowed origins from environment or use defaults
@@ -173,11 +261,29 @@ app.add_middleware(
     max_age=600,  # Cache preflight requests for 10 minutes
 )
 
+# Read-your-writes: after a successful write the client reads from the primary
+# for READ_AFTER_WRITE_SECONDS (only when a read replica is configured)
+# Odczyty wysyłane POST-em (lista slugów w body) nie przypinają klienta do primary
+READ_ONLY_POST_PATHS = frozenset({"/api/comments/stats:batch"})
+
+async def read_after_write_middleware(request: Request, call_next):
+    response = await call_next(request)
+    if (request.method in ("POST", "PUT", "PATCH", "DELETE") and response.status_code < 400
+            and request.url.path not in READ_ONLY_POST_PATHS):
+        set_read_primary_cookie(response, READ_AFTER_WRITE_SECONDS)
+    return response
+
+if ReadSessionLocal is not SessionLocal:
+    app.middleware("http")(read_after_write_middleware)
+
 # Add rate limiting middleware
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 app.add_middleware(SlowAPIMiddleware)
 
+# Brotli/gzip for responses >= COMPRESSION_MIN_SIZE (outermost middleware)
+app.add_middleware(CompressionMiddleware)
+
 # Include routers with authentication
 app.include_router(blog.router, prefix="/api/blog", tags=["blog"])
 app.include_router(auth.router, prefix="/api", tags=["auth"])
@@ -185,6 +291,7 @@ app.include_router(comments.router, prefix="/api/comments", tags=["comments"])
 app.include_router(roles.router, tags=["roles"])
 app.include_router(profile.router, prefix="/api", tags=["profile"])
 app.include_router(admin.router, prefix="/api", tags=["admin"])
+app.include_router(polls.router, prefix="/api/polls", tags=["polls"])
 
 @app.get("/")
 async def root():
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, UniqueConstraint, Enum as SQLEnum
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Boolean, ForeignKey, JSON, UniqueConstraint, Index, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from enum import Enum
@@ -141,6 +141,7 @@ class User(Base):
     
     # Account expiration for unverified accounts
     account_expires_at = Column(DateTime)  # Account will be deleted if not verified by this time
+    deletion_requested_at = Column(DateTime)  # Set by /profile/delete-account, data purged in background
     
     # Two-factor authentication (future feature)
     two_factor_enabled = Column(Boolean, default=False)
@@ -150,6 +151,17 @@ class User(Base):
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     
+    __table_args__ = (
+        Index('ix_users_deletion_pending', 'deletion_requested_at', postgresql_where=deletion_requested_at.isnot(None)),
+        # ⚡ Zadania sprzątające z tasks.py - indeksy tylko z kandydatami
+        Index('ix_users_unverified_expires', 'account_expires_at',
+              postgresql_where=(email_verified == False) & account_expires_at.isnot(None)),
+        Index('ix_users_verification_expires', 'verification_expires_at',
+              postgresql_where=verification_expires_at.isnot(None)),
+        Index('ix_users_password_reset_expires', 'password_reset_expires_at',
+              postgresql_where=password_reset_expires_at.isnot(None)),
+    )
+    
     # Relationships
     role = relationship("UserRole", back_populates="users")
     rank = relationship("UserRank", back_populates="users")
@@ -160,11 +172,10 @@ class User(Base):
     
     # 🎯 UTILITY METHODS for role and rank system
     def has_permission(self, permission: str) -> bool:
-        """Check if user has specific permission"""
-            
-        if self.role and self.role.permissions:
-            return permission in self.role.permissions
-        return False
+        """Check if user has specific permission (compiled role mask, no lazy load)"""
+        from .role_cache import get_snapshot
+        role = get_snapshot().role(self.role_id)
+        return role is not None and role.has_permission(permission)
     
     def has_role(self, role_name: str) -> bool:
         """Check if user has specific role"""
@@ -223,6 +234,13 @@ class Vote(Base):
     created_at = Column(DateTime, server_default=func.now())
     ip_address = Column(String(45))  # For anonymous voting tracking
     
+    # ON CONFLICT targets - jeden głos na użytkownika, anonimowo jeden na IP
+    __table_args__ = (
+        Index('uq_votes_poll_user', 'poll_name', 'user_id', unique=True, postgresql_where=user_id.isnot(None)),
+        Index('uq_votes_poll_ip', 'poll_name', 'ip_address', unique=True, postgresql_where=user_id.is_(None)),
+        Index('ix_votes_poll_option', 'poll_name', 'option'),
+    )
+    
     # Relationships
     user = relationship("User")
 
@@ -232,8 +250,8 @@ class Comment(Base):
     __tablename__ = "comments"
     
     id = Column(Integer, primary_key=True, index=True)
-    post_slug = Column(String(200), index=True, nullable=False)  # Link to static post slug
-    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    post_slug = Column(String(200), nullable=False)  # Link to static post slug (indexed below)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     parent_id = Column(Integer, ForeignKey("comments.id", ondelete="CASCADE"), nullable=True)  # For replies
     
     # Content
@@ -249,6 +267,16 @@ class Comment(Base):
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     
+    __table_args__ = (
+        # ⚡ Strona komentarzy posta: post_slug + parent_id IS NULL + ORDER BY created_at
+        Index('ix_comments_slug_parent_created', 'post_slug', 'parent_id', 'created_at', 'id'),
+        # ⚡ Odpowiedzi na komentarz (i CASCADE po parent_id)
+        Index('ix_comments_parent_created', 'parent_id', 'created_at'),
+        # ⚡ Liczniki nieusuniętych komentarzy (index-only scan)
+        Index('ix_comments_live_slug_parent', 'post_slug', 'parent_id',
+              postgresql_include=['id'], postgresql_where=is_deleted == False),
+    )
+    
     # Relationships
     user = relationship("User", back_populates="comments")
     parent = relationship("Comment", remote_side=[id], back_populates="replies")
@@ -276,3 +304,72 @@ class CommentLike(Base):
     
     # Ensure one like/dislike per user per comment
     __table_args__ = (UniqueConstraint('comment_id', 'user_id', name='uq_comment_user_like'),)
+
+class XPEvent(Base):
+    """Append-only ledger of XP-earning actions
+
+    Events are folded into users.reputation_score / total_* counters in
+    batches by the background aggregator (rank_utils.aggregate_xp_events),
+    which only stamps aggregated_at - event data is never modified.
+    """
+    __tablename__ = "xp_events"
+    
+    id = Column(BigInteger, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    action = Column(String(30), nullable=False)  # 'comment', 'like_received'
+    
+    # Deltas applied to the user row on aggregation
+    xp = Column(Integer, nullable=False, default=0)
+    comments_delta = Column(Integer, nullable=False, default=0)
+    likes_delta = Column(Integer, nullable=False, default=0)
+    
+    created_at = Column(DateTime, server_default=func.now())
+    aggregated_at = Column(DateTime, nullable=True)  # NULL = pending
+    
+    # ⚡ Partial indexes - only pending events are ever scanned
+    __table_args__ = (
+        Index('ix_xp_events_pending', 'id', postgresql_where=aggregated_at.is_(None)),
+        Index('ix_xp_events_pending_user', 'user_id', postgresql_where=aggregated_at.is_(None)),
+    )
+
+class RefreshToken(Base):
+    """Issued refresh tokens (by jti) for rotation and reuse detection
+
+    Every refresh rotates the token within its family. Presenting a token
+    that was already rotated (replaced_by set) revokes the whole family.
+    """
+    __tablename__ = "refresh_tokens"
+    
+    jti = Column(String(64), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    family_id = Column(String(64), nullable=False, index=True)  # jti of the login that started the chain
+    
+    issued_at = Column(DateTime, server_default=func.now())
+    expires_at = Column(DateTime, nullable=False, index=True)
+    replaced_by = Column(String(64), nullable=True)   # jti of the rotated successor
+    revoked_at = Column(DateTime, nullable=True)
+
+class EmailOutbox(Base):
+    """Transactional outbox for emails
+
+    Rows are committed in the same transaction as the change that triggers
+    the email (e.g. registration) and delivered by email_outbox.dispatch_pending.
+    """
+    __tablename__ = "email_outbox"
+    
+    id = Column(BigInteger, primary_key=True)
+    kind = Column(String(30), nullable=False)  # 'verification'
+    recipient = Column(String(255), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True, index=True)
+    payload = Column(JSON, nullable=False, default=dict)  # cleared once sent, dead or superseded
+    
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+    next_attempt_at = Column(DateTime, server_default=func.now(), nullable=False)
+    sent_at = Column(DateTime, nullable=True)  # NULL = pending
+    
+    # ⚡ Only undelivered rows are ever scanned
+    __table_args__ = (
+        Index('ix_email_outbox_pending', 'next_attempt_at', postgresql_where=sent_at.is_(None)),
+    )
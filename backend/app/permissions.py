@@ -0,0 +1,67 @@
+"""
+Permission registry - permission names interned into integer bit positions
+
+Roles (role_cache) and API keys (api_key_cache) compile their JSON permission
+lists into a bitmask once; a permission check is then a single AND.
+"""
+import threading
+from typing import Dict, Iterable, Tuple
+
+# Uprawnienia przydzielane rolom - lista i kolejność z GET /api/roles/permissions
+ROLE_PERMISSIONS = (
+    "comment.create", "comment.like", "comment.moderate", "comment.delete",
+    "post.create", "post.edit", "post.delete", "post.publish",
+    "user.manage", "role.manage", "system.admin",
+    "profile.edit", "profile.view",
+)
+
+# Zakresy kluczy API - nie są uprawnieniami ról
+API_KEY_SCOPES = ("read",)
+
+# Wszystkie znane nazwy rejestrowane od startu (bity żyją tylko w procesie);
+# *.moderate nadają domyślne role z database.py
+KNOWN_PERMISSIONS = ROLE_PERMISSIONS + ("post.moderate", "user.moderate") + API_KEY_SCOPES
+
+
+class PermissionRegistry:
+    """Maps permission names to bits; unknown names from the DB are interned on compile"""
+
+    def __init__(self, names: Iterable[str] = ()):
+        self._bits: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        for name in names:
+            self.intern(name)
+
+    def intern(self, name: str) -> int:
+        """Bit mask for a permission, registering it if new"""
+        bit = self._bits.get(name)
+        if bit is None:
+            with self._lock:
+                bit = self._bits.setdefault(name, 1 << len(self._bits))
+        return bit
+
+    def bit(self, name: str) -> int:
+        """Bit mask for a permission (0 if nobody has it)"""
+        return self._bits.get(name, 0)
+
+    def compile(self, names: Iterable[str]) -> int:
+        """Compile a permission list into a bitmask"""
+        mask = 0
+        for name in names or ():
+            mask |= self.intern(name)
+        return mask
+
+    def names(self, mask: int) -> Tuple[str, ...]:
+        """Permission names set in a mask"""
+        return tuple(name for name, bit in self._bits.items() if mask & bit)
+
+    def all_names(self) -> Tuple[str, ...]:
+        return tuple(self._bits)
+
+
+registry = PermissionRegistry(KNOWN_PERMISSIONS)
+
+
+def has_permission(mask: int, permission: str) -> bool:
+    """O(1) check of a compiled permission mask"""
+    return bool(mask & registry.bit(permission))
@@ -0,0 +1,142 @@
+"""
+Poll votes - deduplicated ingestion and in-memory live tallies
+
+A vote is a single INSERT ... ON CONFLICT DO NOTHING against the partial unique
+indexes on votes (one vote per poll per user, anonymous votes one per IP), so
+duplicates cost no extra round trip and no exception. Results are served from a
+per-process aggregate: loaded once per poll, bumped by this process's own
+inserts and replaced every POLL_RECONCILE_INTERVAL seconds by a background
+recount (which also brings in votes taken by other workers). The results
+endpoint never runs GROUP BY on the request path after the first read.
+"""
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+POLL_RECONCILE_INTERVAL = float(os.getenv("POLL_RECONCILE_INTERVAL", "10"))
+POLL_MAX_OPTIONS = int(os.getenv("POLL_MAX_OPTIONS", "20"))
+# Ankiety nieczytane dłużej niż tyle sekund wypadają z pamięci
+POLL_IDLE_SECONDS = 600
+
+_INSERT_USER_VOTE_SQL = text("""
+    INSERT INTO votes (poll_name, option, user_id, ip_address, created_at)
+    VALUES (:poll_name, :option, :user_id, :ip_address, now())
+    ON CONFLICT (poll_name, user_id) WHERE user_id IS NOT NULL DO NOTHING
+    RETURNING id
+""")
+
+_INSERT_ANONYMOUS_VOTE_SQL = text("""
+    INSERT INTO votes (poll_name, option, user_id, ip_address, created_at)
+    VALUES (:poll_name, :option, NULL, :ip_address, now())
+    ON CONFLICT (poll_name, ip_address) WHERE user_id IS NULL DO NOTHING
+    RETURNING id
+""")
+
+_COUNT_SQL = text("""
+    SELECT poll_name, option, count(*) AS votes
+    FROM votes
+    WHERE poll_name = ANY(:poll_names)
+    GROUP BY poll_name, option
+""")
+
+
+def insert_vote(db: Session, poll_name: str, option: str, user_id: Optional[int], ip_address: Optional[str]) -> bool:
+    """Record a vote (commits); False when this user / IP already voted in the poll"""
+    if user_id is not None:
+        row = db.execute(_INSERT_USER_VOTE_SQL, {
+            "poll_name": poll_name, "option": option, "user_id": user_id, "ip_address": ip_address,
+        }).first()
+    else:
+        row = db.execute(_INSERT_ANONYMOUS_VOTE_SQL, {
+            "poll_name": poll_name, "option": option, "ip_address": ip_address,
+        }).first()
+    db.commit()
+    return row is not None
+
+
+class PollTallies:
+    """Per-process poll -> option -> votes aggregate"""
+
+    def __init__(self, idle_seconds: float = POLL_IDLE_SECONDS):
+        self.idle_seconds = idle_seconds
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._last_read: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.reconciles = 0
+        self.drift = 0  # suma |różnic| wykrytych przy uzgadnianiu (głosy innych workerów)
+
+    def _count(self, db: Session, poll_names: Iterable[str]) -> Dict[str, Dict[str, int]]:
+        poll_names = list(poll_names)
+        counts: Dict[str, Dict[str, int]] = {name: {} for name in poll_names}
+        for row in db.execute(_COUNT_SQL, {"poll_names": poll_names}):
+            counts[row.poll_name][row.option] = row.votes
+        return counts
+
+    def get(self, db: Session, poll_name: str) -> Dict[str, int]:
+        """Current tally (copy); the database is read only the first time a poll is seen"""
+        with self._lock:
+            self._last_read[poll_name] = time.monotonic()
+            counts = self._counts.get(poll_name)
+            if counts is not None:
+                return dict(counts)
+
+        loaded = self._count(db, [poll_name])[poll_name]
+        with self._lock:
+            counts = self._counts.setdefault(poll_name, loaded)
+            self.loads += 1
+            return dict(counts)
+
+    def record(self, poll_name: str, option: str) -> None:
+        """Count a vote inserted by this process (no-op for polls not in memory)"""
+        with self._lock:
+            counts = self._counts.get(poll_name)
+            if counts is not None:
+                counts[option] = counts.get(option, 0) + 1
+
+    def reconcile(self, db: Session) -> int:
+        """Replace in-memory tallies with table counts, drop idle polls; returns polls reconciled"""
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            for poll_name in [name for name, at in self._last_read.items() if at < cutoff]:
+                self._last_read.pop(poll_name, None)
+                self._counts.pop(poll_name, None)
+            poll_names = list(self._counts)
+        if not poll_names:
+            return 0
+
+        fresh = self._count(db, poll_names)
+        db.rollback()
+        with self._lock:
+            for poll_name, counts in fresh.items():
+                current = self._counts.get(poll_name)
+                if current is None:
+                    continue
+                options = set(current) | set(counts)
+                self.drift += sum(abs(current.get(o, 0) - counts.get(o, 0)) for o in options)
+                self._counts[poll_name] = counts
+            self.reconciles += 1
+        return len(poll_names)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counts.clear()
+            self._last_read.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "polls": len(self._counts),
+                "options": sum(len(counts) for counts in self._counts.values()),
+                "loads": self.loads,
+                "reconciles": self.reconciles,
+                "drift": self.drift,
+                "reconcile_interval": POLL_RECONCILE_INTERVAL,
+            }
+
+
+poll_tallies = PollTallies()
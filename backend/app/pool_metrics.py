@@ -0,0 +1,147 @@
+"""
+Connection pool instrumentation
+
+Tracks checkouts, overflow, disconnect-driven invalidations and how long
+requests wait for a pooled connection (histogram in milliseconds).
+"""
+import bisect
+import itertools
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.pool import NullPool, QueuePool
+
+# Granice kubełków histogramu czasu oczekiwania (ms); ostatni kubełek = +Inf.
+# Snapshot podaje kubełki skumulowane jak Prometheus: le_X = liczba oczekiwań <= X ms
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+class PoolMetrics:
+    """Thread-safe counters for a single engine pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.connects = 0
+            self.checkouts = 0
+            self.checkins = 0
+            self.invalidations = 0
+            self.disconnect_errors = 0
+            self.wait_count = 0
+            self.wait_total_ms = 0.0
+            self.wait_max_ms = 0.0
+            self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def observe_wait(self, elapsed_ms: float) -> None:
+        with self._lock:
+            self.wait_count += 1
+            self.wait_total_ms += elapsed_ms
+            self.wait_max_ms = max(self.wait_max_ms, elapsed_ms)
+            self.wait_buckets[bisect.bisect_left(WAIT_BUCKETS_MS, elapsed_ms)] += 1
+
+    def incr(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self, pool) -> dict:
+        """Counters plus live pool state"""
+        with self._lock:
+            data = {
+                "pool_class": type(pool).__name__,
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "disconnect_errors": self.disconnect_errors,
+                "wait": {
+                    "count": self.wait_count,
+                    "avg_ms": round(self.wait_total_ms / self.wait_count, 3) if self.wait_count else 0,
+                    "max_ms": round(self.wait_max_ms, 3),
+                    "histogram_ms": dict(zip(
+                        [f"le_{bound}" for bound in WAIT_BUCKETS_MS] + ["le_inf"],
+                        itertools.accumulate(self.wait_buckets),
+                    )),
+                },
+            }
+
+        if isinstance(pool, QueuePool):
+            data.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+            })
+        else:
+            data["checked_out"] = self.checkouts - self.checkins
+        return data
+
+
+# Metryki puli głównej (primary) i repliki do odczytu
+pool_metrics = PoolMetrics()
+read_pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records time spent waiting for a connection"""
+    metrics = pool_metrics
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.metrics.observe_wait((time.perf_counter() - started) * 1000)
+
+
+class InstrumentedNullPool(NullPool):
+    """NullPool (PgBouncer mode) - wait time is the time to open a connection"""
+    metrics = pool_metrics
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.metrics.observe_wait((time.perf_counter() - started) * 1000)
+
+
+def pool_class_for(base, metrics: PoolMetrics):
+    """Instrumented pool class bound to a metrics instance (survives pool.recreate())"""
+    if metrics is base.metrics:
+        return base
+    return type(base.__name__, (base,), {"metrics": metrics})
+
+
+def instrument_engine(engine, metrics: PoolMetrics = pool_metrics) -> None:
+    """Attach pool and error listeners to an engine"""
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        metrics.incr("connects")
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.incr("checkouts")
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        metrics.incr("checkins")
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.incr("invalidations")
+
+    # Bez pre_ping zerwane połączenie wychodzi dopiero błędem zapytania.
+    # Unieważnienie całej puli robi wtedy sam SQLAlchemy (domyślne
+    # invalidate_pool_on_disconnect=True) - kolejne checkouty dostają świeże
+    # połączenia, ale żądanie, które trafiło na błąd, nie jest ponawiane.
+    # Handler tylko liczy i loguje takie zdarzenia.
+    @event.listens_for(engine, "handle_error")
+    def _on_error(context):
+        if context.is_disconnect:
+            metrics.incr("disconnect_errors")
+            print(f"🔌 Database disconnect detected, pool invalidated: {context.original_exception}")
@@ -1,9 +1,97 @@
 """
 Utilities for automatic rank management
 """
+import os
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from sqlalchemy import func, insert, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .models import User, XPEvent
+from .role_cache import RankThresholdTable, get_snapshot, invalidate
+
+# XP przyznawane za akcje: (XP, delta komentarzy, delta otrzymanych lajków)
+XP_ACTIONS = {
+    "comment": (2, 1, 0),        # +2 XP za komentarz
+    "like_received": (1, 0, 1),  # +1 XP za like
+}
+
+# Ile zdarzeń XP agregator przetwarza w jednej transakcji
+XP_AGGREGATION_BATCH_SIZE = 500
+# Limit paczek na jedno uruchomienie - zaległości dokończy kolejny cykl
+XP_AGGREGATION_MAX_BATCHES = int(os.getenv("XP_AGGREGATION_MAX_BATCHES", "20"))
+
+
+class PendingStats(NamedTuple):
+    """XP/counter deltas recorded in xp_events but not yet folded into users"""
+    xp: int = 0
+    comments: int = 0
+    likes: int = 0
+
+
+def get_rank_table(db: Session) -> RankThresholdTable:
+    """Return XP threshold table from the cached role/rank snapshot"""
+    return get_snapshot(db).rank_table
+
+
+def invalidate_rank_table() -> None:
+    """Force the threshold table to be rebuilt on next use (call after rank edits)"""
+    invalidate()
+
+
+def apply_rank_upgrade(user_id: int, xp: int, rank_id: Optional[int], db: Session) -> dict:
+    """Resolve rank for given XP and persist it only if it is an upgrade"""
+    table = get_rank_table(db)
+    current = table.by_id.get(rank_id) if rank_id is not None else None
+    target = table.resolve(xp)
+
+    if target and (current is None or target.level > current.level):
+        old_rank_name = current.display_name if current else "No rank"
+        # Warunek na starą rangę - przy wyścigu awans zgłasza tylko jedno żądanie
+        result = db.execute(
+            update(User)
+            .where(User.id == user_id, User.rank_id.is_not_distinct_from(rank_id))
+            .values(rank_id=target.id)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            return {
+                "success": True,
+                "upgraded": False,
+                "current_rank": target.display_name,
+                "current_xp": xp,
+                "message": "Rank already updated"
+            }
+        return {
+            "success": True,
+            "upgraded": True,
+            "old_rank": old_rank_name,
+            "new_rank": target.display_name,
+            "new_rank_icon": target.icon,
+            "message": f"🎉 Upgraded from {old_rank_name} to {target.display_name}!"
+        }
+
+    return {
+        "success": True,
+        "upgraded": False,
+        "current_rank": current.display_name if current else "No rank",
+        "current_xp": xp,
+        "message": "No upgrade yet - keep earning XP!"
+    }
+
+
+def _effective_xp_query(user_id: int):
+    """reputation_score + pending ledger XP (read path, no row locks)"""
+    pending = (
+        select(func.coalesce(func.sum(XPEvent.xp), 0))
+        .where(XPEvent.user_id == user_id, XPEvent.aggregated_at.is_(None))
+        .scalar_subquery()
+    )
+    return select(
+        (func.coalesce(User.reputation_score, 0) + pending).label("xp"),
+        User.rank_id
+    ).where(User.id == user_id)
 
-from sqlalchemy.orm import Session, joinedload
-from .models import User, UserRank
 
 def auto_check_rank_upgrade(user_id: int, db: Session) -> dict:
     """
@@ -11,89 +99,167 @@ def auto_check_rank_upgrade(user_id: int, db: Session) -> dict:
     Zwraca info o awansie lub braku zmian
     """
     try:
-        # Pobierz użytkownika z obecną rangą
-        user = db.query(User).options(joinedload(User.rank)).filter(User.id == user_id).first()
-        if not user:
+        row = db.execute(_effective_xp_query(user_id)).first()
+        if not row:
             return {"success": False, "message": "User not found"}
-        
-        # Pobierz wszystkie aktywne rangi (od najwyższej)
-        available_ranks = db.query(UserRank).filter(
-            UserRank.is_active == True
-        ).order_by(UserRank.level.desc()).all()
-        
-        # Aktualny XP użytkownika
-        user_xp = user.reputation_score or 0
-        
-        # Sprawdź czy użytkownik kwalifikuje się do wyższej rangi
-        for rank in available_ranks:
-            requirements = rank.requirements or {}
-            xp_req = requirements.get("xp", 0)
-            
-            # Sprawdź czy spełnia wymagania XP
-            if user_xp >= xp_req:
-                # Sprawdź czy to wyższa ranga niż obecna
-                if not user.rank or rank.level > user.rank.level:
-                    old_rank_name = user.rank.display_name if user.rank else "No rank"
-                    
-                    # Awansuj
-                    user.rank_id = rank.id
-                    db.commit()
-                    
-                    return {
-                        "success": True,
-                        "upgraded": True,
-                        "old_rank": old_rank_name,
-                        "new_rank": rank.display_name,
-                        "new_rank_icon": rank.icon,
-                        "message": f"🎉 Upgraded from {old_rank_name} to {rank.display_name}!"
-                    }
-                else:
-                    # Już ma tę rangę lub wyższą
-                    break
-        
-        # Brak awansu
-        return {
-            "success": True,
-            "upgraded": False,
-            "current_rank": user.rank.display_name if user.rank else "No rank",
-            "current_xp": user_xp,
-            "message": "No upgrade yet - keep earning XP!"
-        }
-        
+
+        result = apply_rank_upgrade(user_id, row.xp, row.rank_id, db)
+        if result.get("upgraded"):
+            db.commit()
+        return result
+
     except Exception as e:
+        db.rollback()
         return {"success": False, "message": f"Error checking rank: {str(e)}"}
 
 def update_user_stats(user_id: int, db: Session, action: str = "comment") -> dict:
     """
-    Aktualizuj statystyki użytkownika i sprawdź awans
+    Zapisz zdarzenie XP w ledgerze i sprawdź awans
     action: 'comment' (dodaj komentarz) lub 'like_received' (otrzymał lajka)
+
+    Wiersz users nie jest tu blokowany - liczniki aktualizuje w paczkach
+    agregator (aggregate_xp_events). Ranga zapisywana jest od razu, ale
+    tylko przy awansie.
     """
     try:
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
+        if action not in XP_ACTIONS:
+            return {"success": False, "message": f"Unknown action: {action}"}
+
+        xp, comments_delta, likes_delta = XP_ACTIONS[action]
+
+        # INSERT zdarzenia + odczyt efektywnego XP w jednym zapytaniu
+        # (CTE nie widzi własnego INSERT-a, więc XP zdarzenia dodajemy jawnie)
+        event = (
+            insert(XPEvent)
+            .values(
+                user_id=user_id,
+                action=action,
+                xp=xp,
+                comments_delta=comments_delta,
+                likes_delta=likes_delta
+            )
+            .returning(XPEvent.user_id, XPEvent.xp)
+            .cte("event")
+        )
+        effective = _effective_xp_query(user_id).subquery()
+        row = db.execute(
+            select((effective.c.xp + event.c.xp).label("xp"), effective.c.rank_id)
+            .select_from(event.join(effective, text("true")))
+        ).first()
+        if not row:
+            db.rollback()
             return {"success": False, "message": "User not found"}
-        
-        # Aktualizuj statystyki i reputation_score
-        if action == "comment":
-            user.total_comments += 1
-            user.reputation_score = (user.reputation_score or 0) + 2  # +2 XP za komentarz
-        elif action == "like_received":
-            user.total_likes_received += 1
-            user.reputation_score = (user.reputation_score or 0) + 1  # +1 XP za like
-        
+
+        # Sprawdź awans (ta sama transakcja)
+        rank_result = apply_rank_upgrade(user_id, row.xp, row.rank_id, db)
         db.commit()
-        
-        # Sprawdź awans po aktualizacji statystyk
-        rank_result = auto_check_rank_upgrade(user_id, db)
-        
+
         return {
             "success": True,
             "stats_updated": True,
             "action": action,
-            "new_reputation": user.reputation_score,
+            "new_reputation": row.xp,
             "rank_check": rank_result
         }
-        
+
+    except IntegrityError:
+        db.rollback()
+        return {"success": False, "message": "User not found"}
     except Exception as e:
+        db.rollback()
         return {"success": False, "message": f"Error updating stats: {str(e)}"}
 
+
+# Jedna instrukcja: zaznacz paczkę zdarzeń jako zagregowaną i dodaj sumy do users.
+# SKIP LOCKED pozwala uruchomić kilka agregatorów równolegle.
+_AGGREGATE_XP_SQL = text("""
+    WITH batch AS (
+        UPDATE xp_events SET aggregated_at = now()
+        WHERE id IN (
+            SELECT id FROM xp_events
+            WHERE aggregated_at IS NULL
+            ORDER BY id
+            LIMIT :batch_size
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING user_id, xp, comments_delta, likes_delta
+    ), totals AS (
+        SELECT user_id,
+               SUM(xp) AS xp,
+               SUM(comments_delta) AS comments,
+               SUM(likes_delta) AS likes,
+               COUNT(*) AS events
+        FROM batch
+        GROUP BY user_id
+    )
+    UPDATE users SET
+        reputation_score = COALESCE(users.reputation_score, 0) + totals.xp,
+        total_comments = COALESCE(users.total_comments, 0) + totals.comments,
+        total_likes_received = COALESCE(users.total_likes_received, 0) + totals.likes
+    FROM totals
+    WHERE users.id = totals.user_id
+    RETURNING users.id, users.reputation_score, users.rank_id, totals.events
+""")
+
+
+def aggregate_xp_events(db: Session, batch_size: int = XP_AGGREGATION_BATCH_SIZE,
+                        max_batches: int = XP_AGGREGATION_MAX_BATCHES) -> dict:
+    """
+    Fold pending xp_events into users counters, one batch per transaction,
+    applying rank upgrades. Runs until the ledger is drained or max_batches
+    batches were processed (the rest waits for the next run).
+    """
+    events_total = 0
+    users_total = 0
+    upgrades = 0
+    for _ in range(max_batches):
+        rows = db.execute(_AGGREGATE_XP_SQL, {"batch_size": batch_size}).all()
+        for row in rows:
+            if apply_rank_upgrade(row.id, row.reputation_score, row.rank_id, db).get("upgraded"):
+                upgrades += 1
+        db.commit()
+
+        events = sum(row.events for row in rows)
+        events_total += events
+        users_total += len(rows)
+        if events < batch_size:
+            break
+
+    return {"events": events_total, "users": users_total, "rank_upgrades": upgrades}
+
+
+def get_pending_stats(db: Session, user_ids: Iterable[int]) -> Dict[int, PendingStats]:
+    """Unaggregated ledger deltas per user (read path for profiles)"""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+    rows = db.query(
+        XPEvent.user_id,
+        func.sum(XPEvent.xp),
+        func.sum(XPEvent.comments_delta),
+        func.sum(XPEvent.likes_delta)
+    ).filter(
+        XPEvent.user_id.in_(user_ids),
+        XPEvent.aggregated_at.is_(None)
+    ).group_by(XPEvent.user_id).all()
+    return {
+        user_id: PendingStats(int(xp or 0), int(comments or 0), int(likes or 0))
+        for user_id, xp, comments, likes in rows
+    }
+
+
+def apply_pending_stats(target, pending: Optional[PendingStats]):
+    """Add pending deltas to a stats dict or schema object (in place)"""
+    if not pending:
+        return target
+    fields = {
+        "reputation_score": pending.xp,
+        "total_comments": pending.comments,
+        "total_likes_received": pending.likes,
+    }
+    for field, delta in fields.items():
+        if isinstance(target, dict):
+            target[field] = (target.get(field) or 0) + delta
+        else:
+            setattr(target, field, (getattr(target, field, 0) or 0) + delta)
+    return target
@@ -0,0 +1,179 @@
+"""
+Refresh-token rotation store
+
+Every issued refresh token is recorded by jti. /auth/refresh rotates it with a
+single conditional UPDATE (replaced_by IS NULL), so a token can be exchanged
+exactly once. Presenting an already rotated token means it leaked - the whole
+family (chain started at login) is revoked and its JTIs go to the in-memory
+revoked_jtis filter, which verify_token checks without touching the database.
+"""
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .security import REFRESH_TOKEN_EXPIRE_DAYS, create_refresh_token, revoked_jtis
+
+REFRESH_TOKEN_PURGE_BATCH = 1000
+
+# Kolumny DateTime są bez strefy - zapisujemy UTC jako naive
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def _exp_timestamp(expires_at: datetime) -> float:
+    return expires_at.replace(tzinfo=timezone.utc).timestamp()
+
+_INSERT_SQL = text("""
+    INSERT INTO refresh_tokens (jti, user_id, family_id, issued_at, expires_at, replaced_by)
+    VALUES (:jti, :user_id, :family_id, :issued_at, :expires_at, :replaced_by)
+""")
+
+# Atomowa rotacja - tylko jedno żądanie może zastąpić dany token
+_ROTATE_SQL = text("""
+    UPDATE refresh_tokens
+    SET replaced_by = :new_jti
+    WHERE jti = :jti
+      AND user_id = :user_id
+      AND replaced_by IS NULL
+      AND revoked_at IS NULL
+      AND expires_at > :now
+    RETURNING family_id
+""")
+
+_REVOKE_FAMILY_SQL = text("""
+    UPDATE refresh_tokens
+    SET revoked_at = :now
+    WHERE family_id = (SELECT family_id FROM refresh_tokens WHERE jti = :jti)
+      AND revoked_at IS NULL
+    RETURNING jti, expires_at
+""")
+
+_REVOKE_USER_SQL = text("""
+    UPDATE refresh_tokens
+    SET revoked_at = :now
+    WHERE user_id = :user_id
+      AND revoked_at IS NULL
+    RETURNING jti, expires_at
+""")
+
+_PURGE_SQL = text("""
+    DELETE FROM refresh_tokens
+    WHERE jti IN (
+        SELECT jti FROM refresh_tokens
+        WHERE expires_at < :now
+        LIMIT :batch_size
+    )
+""")
+
+
+def _new_token(db: Session, user_id: int, family_id: Optional[str], jti: Optional[str] = None) -> str:
+    """Insert a row for a fresh token (no commit) and return the encoded JWT"""
+    jti = jti or secrets.token_urlsafe(16)
+    family_id = family_id or jti
+    now = _utcnow()
+    expires_at = now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    db.execute(_INSERT_SQL, {
+        "jti": jti, "user_id": user_id, "family_id": family_id,
+        "issued_at": now, "expires_at": expires_at, "replaced_by": None,
+    })
+    return create_refresh_token(user_id, jti=jti, family_id=family_id,
+                                expires_at=expires_at.replace(tzinfo=timezone.utc))
+
+
+def issue_refresh_token(db: Session, user_id: int) -> str:
+    """Record and return a refresh token starting a new family (login / verify-email)"""
+    token = _new_token(db, user_id, None)
+    db.commit()
+    return token
+
+
+def _revoke_family(db: Session, jti: str) -> int:
+    """Revoke every token in jti's family (no commit); returns number of tokens revoked"""
+    rows = db.execute(_REVOKE_FAMILY_SQL, {"jti": jti, "now": _utcnow()}).all()
+    for row in rows:
+        revoked_jtis.add(row.jti, _exp_timestamp(row.expires_at))
+    return len(rows)
+
+
+def rotate_refresh_token(db: Session, payload: dict) -> Optional[str]:
+    """Exchange a verified refresh token payload for a new token in the same family
+
+    Returns None when the token was already rotated or revoked; reuse of a
+    rotated token revokes its whole family.
+    """
+    jti = payload.get("jti")
+    user_id = int(payload["sub"])
+    if not jti or jti in revoked_jtis:
+        return None
+
+    new_jti = secrets.token_urlsafe(16)
+    row = db.execute(_ROTATE_SQL, {"new_jti": new_jti, "jti": jti, "user_id": user_id, "now": _utcnow()}).first()
+    if row is not None:
+        token = _new_token(db, user_id, row.family_id, new_jti)
+        db.commit()
+        return token
+
+    known = db.execute(text("SELECT 1 FROM refresh_tokens WHERE jti = :jti"), {"jti": jti}).first()
+    if known is not None:
+        # Token już zrotowany/odwołany - ktoś używa starej kopii, odwołaj całą rodzinę
+        revoked = _revoke_family(db, jti)
+        db.commit()
+        revoked_jtis.add(jti, payload.get("exp"))
+        print(f"🚨 Refresh token reuse detected for user {user_id}, revoked {revoked} token(s) in family")
+        return None
+
+    if payload.get("fam"):
+        # Token z rodziny, której nie ma w bazie - odrzuć
+        return None
+
+    # Token wydany przed wprowadzeniem tabeli - przyjmij raz i rozpocznij nową rodzinę
+    now = _utcnow()
+    exp = payload.get("exp")
+    try:
+        db.execute(_INSERT_SQL, {
+            "jti": jti, "user_id": user_id, "family_id": jti, "issued_at": now,
+            "expires_at": datetime.fromtimestamp(exp, timezone.utc).replace(tzinfo=None) if exp else now,
+            "replaced_by": new_jti,
+        })
+        token = _new_token(db, user_id, jti, new_jti)
+        db.commit()
+    except IntegrityError:
+        # Równoległe żądanie z tym samym tokenem już go przyjęło
+        db.rollback()
+        return None
+    return token
+
+
+def revoke_refresh_token(db: Session, payload: dict) -> int:
+    """Revoke the family of a refresh token (logout); returns number of tokens revoked"""
+    jti = payload.get("jti")
+    if not jti:
+        return 0
+    revoked = _revoke_family(db, jti)
+    db.commit()
+    revoked_jtis.add(jti, payload.get("exp"))
+    return revoked
+
+
+def revoke_user_tokens(db: Session, user_id: int) -> int:
+    """Revoke every live refresh token of a user (no commit); returns number of tokens revoked"""
+    rows = db.execute(_REVOKE_USER_SQL, {"user_id": user_id, "now": _utcnow()}).all()
+    for row in rows:
+        revoked_jtis.add(row.jti, _exp_timestamp(row.expires_at))
+    return len(rows)
+
+
+def purge_expired(db: Session, batch_size: int = REFRESH_TOKEN_PURGE_BATCH) -> int:
+    """Delete expired rows in batches (short transactions); returns number deleted"""
+    total = 0
+    while True:
+        deleted = db.execute(_PURGE_SQL, {"now": _utcnow(), "batch_size": batch_size}).rowcount
+        db.commit()
+        total += deleted
+        if deleted < batch_size:
+            break
+    revoked_jtis.purge()
+    return total
@@ -0,0 +1,226 @@
+"""
+Process-wide, immutable snapshot of user roles and ranks
+
+UserRole/UserRank rows almost never change, so they are loaded once (at
+startup or on first use) and served from memory. Every snapshot carries a
+version; invalidate() bumps it and the next get_snapshot() call rebuilds it.
+Only writes to user_roles/user_ranks rows call invalidate() - assigning a
+role or rank to a user changes users.role_id/rank_id, not the snapshot.
+"""
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from .models import UserRole, UserRank, UserRoleEnum, UserRankEnum
+from .permissions import has_permission, registry as permission_registry
+
+# Maksymalny wiek snapshotu (sekundy) - zabezpieczenie gdy role edytowano w innym procesie
+SNAPSHOT_TTL = 300
+
+
+class RoleInfo(NamedTuple):
+    """Read-only copy of a UserRole row"""
+    id: int
+    name: UserRoleEnum
+    display_name: str
+    description: Optional[str]
+    color: Optional[str]
+    permissions: Tuple[str, ...]
+    permission_mask: int            # skompilowane przez permissions.registry
+    level: int
+    is_active: bool
+    created_at: Optional[datetime]
+
+    def author_dict(self) -> dict:
+        """Role block embedded in comment author info"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "display_name": self.display_name,
+            "color": self.color,
+            "level": self.level,
+        }
+
+    def has_permission(self, permission: str) -> bool:
+        return has_permission(self.permission_mask, permission)
+
+
+class RankInfo(NamedTuple):
+    """Read-only copy of a UserRank row"""
+    id: int
+    name: UserRankEnum
+    display_name: str
+    description: Optional[str]
+    icon: Optional[str]
+    color: Optional[str]
+    requirements: dict
+    level: int
+    is_active: bool
+    created_at: Optional[datetime]
+
+    def author_dict(self) -> dict:
+        """Rank block embedded in comment author info"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "display_name": self.display_name,
+            "color": self.color,
+            "level": self.level,
+            "icon": self.icon,
+        }
+
+
+class RankThresholdTable(NamedTuple):
+    """Sorted XP thresholds with the best rank reachable at each threshold"""
+    thresholds: Tuple[int, ...]     # posortowane wymagania XP (tylko aktywne rangi)
+    best: Tuple[RankInfo, ...]      # best[i] = najwyższa ranga dla xp >= thresholds[i]
+    by_id: Dict[int, RankInfo]      # rank_id -> RankInfo (wszystkie rangi, także nieaktywne)
+
+    def resolve(self, xp: int) -> Optional[RankInfo]:
+        """Highest-level active rank whose XP requirement is met"""
+        idx = bisect_right(self.thresholds, xp) - 1
+        return self.best[idx] if idx >= 0 else None
+
+
+class RoleRankSnapshot(NamedTuple):
+    """All roles and ranks at a given version"""
+    version: int
+    loaded_at: float
+    roles: Tuple[RoleInfo, ...]     # posortowane po id
+    ranks: Tuple[RankInfo, ...]     # posortowane po level
+    roles_by_id: Dict[int, RoleInfo]
+    roles_by_name: Dict[UserRoleEnum, RoleInfo]
+    ranks_by_id: Dict[int, RankInfo]
+    ranks_by_name: Dict[UserRankEnum, RankInfo]
+    rank_table: RankThresholdTable
+
+    @property
+    def active_roles(self) -> Tuple[RoleInfo, ...]:
+        return tuple(r for r in self.roles if r.is_active)
+
+    @property
+    def active_ranks(self) -> Tuple[RankInfo, ...]:
+        return tuple(r for r in self.ranks if r.is_active)
+
+    def role(self, role_id: Optional[int]) -> Optional[RoleInfo]:
+        return self.roles_by_id.get(role_id) if role_id is not None else None
+
+    def rank(self, rank_id: Optional[int]) -> Optional[RankInfo]:
+        return self.ranks_by_id.get(rank_id) if rank_id is not None else None
+
+
+def build_rank_table(ranks) -> RankThresholdTable:
+    """Build XP threshold table from rank rows (ORM objects or RankInfo)"""
+    by_id = {r.id: r for r in ranks}
+    active = sorted(
+        ((r.requirements or {}).get("xp", 0), r.level or 0, r.id)
+        for r in ranks if r.is_active
+    )
+    thresholds = []
+    best = []
+    current = None
+    for xp_req, level, rank_id in active:
+        if current is None or level > (current.level or 0):
+            current = by_id[rank_id]
+        thresholds.append(xp_req)
+        best.append(current)
+    return RankThresholdTable(tuple(thresholds), tuple(best), by_id)
+
+
+def _role_info(role: UserRole) -> RoleInfo:
+    permissions = tuple(role.permissions or ())
+    return RoleInfo(
+        id=role.id,
+        name=role.name,
+        display_name=role.display_name,
+        description=role.description,
+        color=role.color,
+        permissions=permissions,
+        permission_mask=permission_registry.compile(permissions),
+        level=role.level or 0,
+        is_active=bool(role.is_active),
+        created_at=role.created_at,
+    )
+
+
+def _rank_info(rank: UserRank) -> RankInfo:
+    return RankInfo(
+        id=rank.id,
+        name=rank.name,
+        display_name=rank.display_name,
+        description=rank.description,
+        icon=rank.icon,
+        color=rank.color,
+        requirements=dict(rank.requirements or {}),
+        level=rank.level or 0,
+        is_active=bool(rank.is_active),
+        created_at=rank.created_at,
+    )
+
+
+def build_snapshot(roles, ranks, version: int = 0) -> RoleRankSnapshot:
+    """Build snapshot from UserRole/UserRank rows"""
+    role_infos = tuple(sorted((_role_info(r) for r in roles), key=lambda r: r.id))
+    rank_infos = tuple(sorted((_rank_info(r) for r in ranks), key=lambda r: (r.level, r.id)))
+    return RoleRankSnapshot(
+        version=version,
+        loaded_at=time.monotonic(),
+        roles=role_infos,
+        ranks=rank_infos,
+        roles_by_id={r.id: r for r in role_infos},
+        roles_by_name={r.name: r for r in role_infos},
+        ranks_by_id={r.id: r for r in rank_infos},
+        ranks_by_name={r.name: r for r in rank_infos},
+        rank_table=build_rank_table(rank_infos),
+    )
+
+
+_snapshot: Optional[RoleRankSnapshot] = None
+_version = 0
+_lock = threading.Lock()
+
+
+def _is_stale(snapshot: Optional[RoleRankSnapshot]) -> bool:
+    return (
+        snapshot is None
+        or snapshot.version != _version
+        or time.monotonic() - snapshot.loaded_at > SNAPSHOT_TTL
+    )
+
+
+def load_snapshot(db: Optional[Session] = None) -> RoleRankSnapshot:
+    """(Re)load roles and ranks from the database and publish a new snapshot"""
+    global _snapshot
+    from .database import SessionLocal
+
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        with _lock:
+            version = _version
+            snapshot = build_snapshot(db.query(UserRole).all(), db.query(UserRank).all(), version)
+            _snapshot = snapshot
+        return snapshot
+    finally:
+        if own_session:
+            db.close()
+
+
+def get_snapshot(db: Optional[Session] = None) -> RoleRankSnapshot:
+    """Return current snapshot, loading it only when missing or stale"""
+    snapshot = _snapshot
+    if _is_stale(snapshot):
+        snapshot = load_snapshot(db)
+    return snapshot
+
+
+def invalidate() -> None:
+    """Mark current snapshot stale (call after roles/ranks are modified)"""
+    global _version
+    with _lock:
+        _version += 1
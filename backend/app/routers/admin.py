@@ -1,15 +1,25 @@
 """
 Admin dashboard router - statistics and management
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from datetime import datetime, timezone, timedelta
+from typing import Optional
 
-from ..database import get_db
+from ..database import get_db, get_read_db, get_pool_stats
 from ..models import User, BlogPost, Comment, CommentLike
 from ..security import get_current_admin_user
 from ..schemas import APIResponse
+from ..rank_utils import get_pending_stats
+from ..like_buffer import like_buffer
+from ..compression import SUPPORTED_ENCODINGS, COMPRESSION_MIN_SIZE, precompressed_cache
+from ..comment_events import comment_event_hub
+from ..comment_snapshots import comment_snapshot_writer
+from .. import account_deletion
+from ..poll_tallies import poll_tallies
+from ..admin_export import EXPORT_DATASETS, EXPORT_MEDIA_TYPES, build_export_query, stream_export
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -17,7 +27,7 @@ router = APIRouter(prefix="/admin", tags=["admin"])
 @router.get("/stats", response_model=dict)
 async def get_dashboard_stats(
     current_user: User = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get dashboard statistics (admin only)"""
     
@@ -58,6 +68,7 @@ async def get_dashboard_stats(
     
     # Recent registrations with rank info
     recent_users = db.query(User).order_by(User.created_at.desc()).limit(5).all()
+    pending_stats = get_pending_stats(db, [u.id for u in recent_users])
     
     # Reactions per post (for posts with comments)
     posts_with_reactions = db.query(
@@ -115,7 +126,7 @@ async def get_dashboard_stats(
                     "level": u.rank.level if u.rank else 1,
                     "color": u.rank.color if u.rank else None,
                 } if u.rank else None,
-                "reputation_score": u.reputation_score or 0
+                "reputation_score": (u.reputation_score or 0) + (pending_stats[u.id].xp if u.id in pending_stats else 0)
             }
             for u in recent_users
         ],
@@ -159,3 +170,111 @@ async def get_all_users(
             "pages": (total + limit - 1) // limit
         }
     }
+
+
+@router.get("/like-buffer", response_model=dict)
+async def get_like_buffer_stats(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Like write-coalescing metrics: flush latency and batch sizes (admin only)"""
+    return like_buffer.stats()
+
+
+@router.get("/db-pool", response_model=dict)
+async def get_db_pool_stats(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Connection pool metrics: checked out, overflow, wait time histogram (admin only)"""
+    return get_pool_stats()
+
+
+@router.get("/compression", response_model=dict)
+async def get_compression_stats(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Response compression settings and precompressed cache hit rate (admin only)"""
+    return {
+        "encodings": list(SUPPORTED_ENCODINGS),
+        "min_size": COMPRESSION_MIN_SIZE,
+        "cache": precompressed_cache.stats(),
+    }
+
+
+@router.get("/comment-events", response_model=dict)
+async def get_comment_events_stats(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Live comment stream: connected SSE clients, deliveries and evictions (admin only)"""
+    return {**comment_event_hub.stats(), "snapshots": comment_snapshot_writer.stats()}
+
+
+@router.get("/polls", response_model=dict)
+async def get_poll_tally_stats(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """In-memory poll tallies: polls held, reconciles and drift (admin only)"""
+    return poll_tallies.stats()
+
+
+@router.get("/account-deletions", response_model=dict)
+async def get_account_deletions(
+    current_user: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Accounts waiting for background purge with rows left per table (admin only)"""
+    return {
+        "pending": account_deletion.pending_deletions(db),
+        "purge": account_deletion.stats(),
+    }
+
+
+@router.get("/export/{dataset}")
+async def export_dataset(
+    dataset: str,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    after_id: Optional[int] = Query(None, ge=0),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    post_slug: Optional[str] = None,
+    user_id: Optional[int] = None,
+    comment_id: Optional[int] = None,
+    is_active: Optional[bool] = None,
+    email_verified: Optional[bool] = None,
+    is_deleted: Optional[bool] = None,
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Stream users / comments / likes as NDJSON or CSV, ordered by id (admin only)
+
+    Resume an interrupted export with after_id=<last id received>.
+    """
+    if dataset not in EXPORT_DATASETS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                "message": f"Unknown export dataset: {dataset}",
+                "translation_code": "EXPORT_NOT_FOUND"
+            }
+        )
+
+    try:
+        query = build_export_query(
+            dataset, after_id=after_id, since=since, until=until, limit=limit,
+            post_slug=post_slug, user_id=user_id, comment_id=comment_id,
+            is_active=is_active, email_verified=email_verified, is_deleted=is_deleted,
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "message": str(e),
+                "translation_code": "EXPORT_INVALID_FILTER"
+            }
+        )
+
+    filename = f"{dataset}-{datetime.now(timezone.utc):%Y%m%d%H%M%S}.{format}"
+    return StreamingResponse(
+        stream_export(query, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
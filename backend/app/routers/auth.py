@@ -3,13 +3,13 @@ Authentication router with email verification system
 """
 from datetime import datetime, timedelta, timezone
 from typing import Any
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Request, Response
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session, joinedload
 
 from ..database import get_db
 from ..datetime_utils import safe_datetime_comparison, is_datetime_expired, safe_current_time
-from ..models import User, APIKey, UserRole, UserRank, UserRoleEnum, UserRankEnum
+from ..models import User, APIKey, UserRoleEnum, UserRankEnum
 from ..schemas import (
     UserCreate, UserLogin, UserResponse, AuthResponse, User as UserSchema, UserWithRoleRank,
     APIKeyCreate, APIKeyResponse, APIKey as APIKeySchema, APIResponse,
@@ -17,15 +17,22 @@ from ..schemas import (
     PasswordResetConfirm, UserRegistrationRequest
 )
 from ..security import (
-    verify_password, get_password_hash, create_access_token, create_refresh_token,
+    verify_password, get_password_hash, create_access_token,
     authenticate_user, get_current_active_user, get_current_admin_user,
     generate_api_key, hash_api_key, rate_limit_by_ip, admin_rate_limit,
     strict_rate_limit_login, handle_failed_login, is_email_valid, 
     is_password_strong, get_security_headers, generate_verification_code,
     generate_verification_token, create_verification_token, verify_verification_token,
-    hash_verification_code, verify_verification_code, set_auth_cookies, clear_auth_cookies
+    hash_verification_code, verify_verification_code, set_auth_cookies, clear_auth_cookies,
+    get_token_from_cookie, verify_token, revoke_token_payload
 )
 from ..email_service import EmailService
+from ..email_outbox import enqueue_verification_email
+from ..tasks import dispatch_email_outbox
+from ..role_cache import get_snapshot
+from ..api_key_cache import invalidate as invalidate_api_key
+from ..refresh_tokens import issue_refresh_token, rotate_refresh_token, revoke_refresh_token
+from ..rank_utils import get_pending_stats, apply_pending_stats
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
@@ -34,9 +41,10 @@ router = APIRouter(prefix="/auth", tags=["authentication"])
 async def register_user(
     user_data: UserRegistrationRequest,
     request: Request,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
-    """Register a new user - sends verification email"""
+    """Register a new user - verification email goes through the outbox (sent after the response)"""
     # Validate email format
     if not is_email_valid(user_data.email):
         raise HTTPException(
@@ -74,21 +82,14 @@ async def register_user(
                 existing_user.verification_token = verification_token
                 existing_user.verification_expires_at = datetime.now(timezone.utc) + timedelta(minutes=15)
                 
-                db.commit()
-                
-                # Send verification email with user's language preference
-                email_service = EmailService()
+                # Queue verification email with user's language preference (same transaction)
                 # Use language from request body if provided, otherwise fallback to headers
-                user_language = user_data.language if user_data.language in ["pl", "en"] else email_service.get_user_language_from_request(request)
-                email_result = await email_service.send_verification_email(
-                    user_data.email, verification_code, existing_user.username, user_language
+                user_language = user_data.language if user_data.language in ["pl", "en"] else EmailService.get_user_language_from_request(request)
+                enqueue_verification_email(
+                    db, existing_user.id, user_data.email, verification_code, existing_user.username, user_language
                 )
-                
-                if not email_result.get("success", False):
-                    raise HTTPException(
-                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                        detail={"translation_code": "EMAIL_SEND_FAILED", "message": "Failed to send verification email"}
-                    )
+                db.commit()
+                background_tasks.add_task(dispatch_email_outbox)
                 
                 return APIResponse(
                     success=True,
@@ -110,9 +111,10 @@ async def register_user(
     # Hash password
     hashed_password = get_password_hash(user_data.password)
     
-    # Get default role and rank for new users
-    default_role = db.query(UserRole).filter(UserRole.name == UserRoleEnum.USER).first()
-    default_rank = db.query(UserRank).filter(UserRank.name == UserRankEnum.NEWBIE).first()
+    # Get default role and rank for new users (from in-memory snapshot)
+    snapshot = get_snapshot(db)
+    default_role = snapshot.roles_by_name.get(UserRoleEnum.USER)
+    default_rank = snapshot.ranks_by_name.get(UserRankEnum.NEWBIE)
     
     if not default_role:
         raise HTTPException(
@@ -144,25 +146,18 @@ async def register_user(
     )
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    db.flush()
+    user_id = db_user.id
     
-    # Send verification email using EmailService with user's language preference
-    email_service = EmailService()
+    # User and outbox row commit together - delivery happens after the response,
+    # failed sends are retried and the user can always use /resend-verification
     # Use language from request body if provided, otherwise fallback to headers
-    user_language = user_data.language if user_data.language in ["pl", "en"] else email_service.get_user_language_from_request(request)
-    email_result = await email_service.send_verification_email(
-        user_data.email, verification_code, user_data.username, user_language
+    user_language = user_data.language if user_data.language in ["pl", "en"] else EmailService.get_user_language_from_request(request)
+    enqueue_verification_email(
+        db, db_user.id, user_data.email, verification_code, user_data.username, user_language
     )
-    
-    if not email_result.get("success", False):
-        # Rollback user creation if email failed
-        db.delete(db_user)
-        db.commit()
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail={"translation_code": "EMAIL_SEND_FAILED", "message": "Failed to send verification email"}
-        )
+    db.commit()
+    background_tasks.add_task(dispatch_email_outbox)
     
     return APIResponse(
         success=True,
@@ -172,7 +167,7 @@ async def register_user(
         data={
             "email": user_data.email,
             "expires_in_minutes": 15,
-            "user_id": db_user.id
+            "user_id": user_id
         }
     )
 
@@ -247,7 +242,7 @@ async def verify_email(
         data={"sub": user.email}, expires_delta=access_token_expires
     )
     
-    refresh_token = create_refresh_token(user.id)
+    refresh_token = issue_refresh_token(db, user.id)
     
     # Set HTTP-only cookies (secure based on environment)
     set_auth_cookies(response, access_token, refresh_token)
@@ -291,6 +286,8 @@ async def resend_verification_code(
     user.verification_code_hash = hash_verification_code(verification_code)
     user.verification_token = verification_token
     user.verification_expires_at = datetime.now(timezone.utc) + timedelta(minutes=15)
+    # Odczyt po commit odświeżyłby obiekt i trzymał połączenie z puli przez całą wysyłkę
+    username = user.username
     
     db.commit()
     
@@ -299,7 +296,7 @@ async def resend_verification_code(
     # Use language from request body if provided, otherwise fallback to headers
     user_language = email_data.language if email_data.language in ["pl", "en"] else email_service.get_user_language_from_request(request)
     email_result = await email_service.send_verification_email(
-        email_data.email, verification_code, user.username, user_language
+        email_data.email, verification_code, username, user_language
     )
     
     if not email_result.get("success", False):
@@ -367,7 +364,7 @@ async def login_user(
         data={"sub": user.email}, expires_delta=access_token_expires  # Use email as subject
     )
     
-    refresh_token = create_refresh_token(user.id)
+    refresh_token = issue_refresh_token(db, user.id)
     
     # Set HTTP-only cookies (secure based on environment)
     set_auth_cookies(response, access_token, refresh_token)
@@ -389,13 +386,25 @@ async def get_current_user_info(
         joinedload(User.rank)
     ).filter(User.id == current_user.id).first()
     
-    return UserWithRoleRank.from_orm(user_with_relations)
+    user_data = UserWithRoleRank.from_orm(user_with_relations)
+    # Include XP events not yet folded in by the aggregator
+    return apply_pending_stats(user_data, get_pending_stats(db, [current_user.id]).get(current_user.id))
 
 @router.post("/logout", response_model=APIResponse)
 async def logout_user(
-    response: Response
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db)
 ):
-    """Logout user by clearing authentication cookies"""
+    """Logout user: revoke the refresh token family and current access token, clear cookies"""
+    refresh_payload = verify_token(get_token_from_cookie(request, "refresh_token") or "", "refresh")
+    if refresh_payload:
+        revoke_refresh_token(db, refresh_payload)
+    
+    access_payload = verify_token(get_token_from_cookie(request, "access_token") or "", "access")
+    if access_payload:
+        revoke_token_payload(access_payload)
+    
     clear_auth_cookies(response)
     
     return APIResponse(
@@ -412,9 +421,7 @@ async def refresh_token(
     response: Response,
     db: Session = Depends(get_db)
 ):
-    """Refresh access token using refresh token from cookie"""
-    from ..security import get_token_from_cookie, verify_token
-    
+    """Refresh access token using refresh token from cookie (rotated - each token works once)"""
     refresh_token = get_token_from_cookie(request, "refresh_token")
     
     if not refresh_token:
@@ -447,15 +454,20 @@ async def refresh_token(
             detail={"translation_code": "USER_NOT_FOUND", "message": "User not found or inactive"}
         )
     
+    # Rotate refresh token - an already used token revokes its whole family
+    new_refresh_token = rotate_refresh_token(db, payload)
+    if not new_refresh_token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail={"translation_code": "INVALID_REFRESH_TOKEN", "message": "Invalid refresh token"}
+        )
+    
     # Create new access token
     access_token = create_access_token(
         data={"sub": user.email}, 
         expires_delta=timedelta(minutes=15)
     )
     
-    # Create new refresh token for security (token rotation)
-    new_refresh_token = create_refresh_token(user.id)
-    
     # Set both tokens as cookies (using environment-based security)
     set_auth_cookies(response, access_token, new_refresh_token)
     
@@ -496,6 +508,7 @@ async def request_password_reset(
     # Update user with reset token
     user.password_reset_token = reset_token
     user.password_reset_expires_at = datetime.now(timezone.utc) + timedelta(minutes=30)
+    username = user.username  # przed commit - bez ponownego pobrania połączenia w trakcie wysyłki
     
     db.commit()
     
@@ -504,7 +517,7 @@ async def request_password_reset(
     # Use language from request body if provided, otherwise fallback to headers
     user_language = reset_data.language if reset_data.language in ["pl", "en"] else email_service.get_user_language_from_request(request)
     email_result = await email_service.send_password_reset_email(
-        reset_data.email, reset_token, user.username, user_language
+        reset_data.email, reset_token, username, user_language
     )
     
     if not email_result.get("success", False):
@@ -647,6 +660,7 @@ async def delete_api_key(
     
     db.delete(api_key)
     db.commit()
+    invalidate_api_key(api_key.key_hash)
     
     return {"message": "API key deleted successfully"}
 
@@ -670,6 +684,7 @@ async def toggle_api_key(
     
     api_key.is_active = not api_key.is_active
     db.commit()
+    invalidate_api_key(api_key.key_hash)
     
     return {
         "message": f"API key {'activated' if api_key.is_active else 'deactivated'}",
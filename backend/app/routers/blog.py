@@ -2,15 +2,18 @@
 Simplified Blog Router - posts content is in .md files
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session, joinedload
 from typing import Optional
 from datetime import datetime, timezone
 import re
 
-from ..database import get_db
+from ..database import get_db, get_read_db
 from ..models import BlogPost, BlogTag, User, Comment
-from ..schemas import (BlogPostPublic, APIResponse, PaginatedResponse)
+from ..schemas import (BlogPostPublic, APIResponse, PaginatedResponse, BlogPostSummaryPage, BlogPostMeta)
 from ..security import get_current_admin_user
+from ..comment_stats import get_comment_stats
+from ..compression import PRECOMPRESS_CACHE_HEADER
 
 router = APIRouter()
 
@@ -67,9 +70,9 @@ async def get_admin_blog_posts(
         per_page=per_page
     )
 
-@router.get("/posts", response_model=PaginatedResponse)
+@router.get("/posts", response_model=BlogPostSummaryPage, response_class=ORJSONResponse)
 async def get_blog_posts(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     page: int = Query(1, ge=1),
     per_page: int = Query(10, ge=1, le=100),
 ):
@@ -83,31 +86,30 @@ async def get_blog_posts(
     total = query.count()
     posts = query.offset((page - 1) * per_page).limit(per_page).all()
     
-    # Build response
+    # Build response - comment counts for the whole page in one grouped query
+    comment_stats = get_comment_stats(db, [post.slug for post in posts])
     posts_data = []
     for post in posts:
-        comment_count = db.query(Comment).filter(Comment.post_slug == post.slug).count()
-        
         posts_data.append({
             "id": post.id,
             "slug": post.slug,
             "created_at": post.created_at,
             "updated_at": post.updated_at,
-            "comment_count": comment_count,
+            "comment_count": comment_stats[post.slug]["total_comments"],
         })
     
-    return PaginatedResponse(
-        items=posts_data,
-        total=total,
-        page=page,
-        pages=(total + per_page - 1) // per_page,
-        per_page=per_page
-    )
+    return ORJSONResponse({
+        "items": posts_data,
+        "total": total,
+        "page": page,
+        "pages": (total + per_page - 1) // per_page,
+        "per_page": per_page
+    }, headers=PRECOMPRESS_CACHE_HEADER)
 
-@router.get("/{slug}")
+@router.get("/{slug}", response_model=BlogPostMeta, response_class=ORJSONResponse)
 async def get_post_by_slug(
     slug: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Public: Get post metadata by slug"""
     post = db.query(BlogPost).filter(BlogPost.slug == slug).first()
@@ -115,8 +117,8 @@ async def get_post_by_slug(
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
-    return {
+    return ORJSONResponse({
         "id": post.id,
         "slug": post.slug,
         "created_at": post.created_at,
-    }
+    })
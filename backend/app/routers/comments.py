@@ -1,20 +1,38 @@
 """
 Comments router for blog posts
 """
+import asyncio
+import os
+
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func, and_, or_
-from typing import List, Optional
+from typing import List, Optional, Union
 from datetime import datetime, timedelta, timezone
 
-from ..database import get_db
+from ..database import get_db, get_read_db, ReadSessionLocal
 from ..models import Comment, CommentLike, BlogPost, User, UserRoleEnum
-from ..schemas import CommentCreate, CommentUpdate, CommentLikeCreate, Comment as CommentSchema, CommentWithReplies, APIResponse, PaginatedResponse
+from ..schemas import CommentCreate, CommentUpdate, CommentLikeCreate, Comment as CommentSchema, CommentWithReplies, CommentResponse, NormalizedCommentsResponse, APIResponse, PaginatedResponse, CommentStats, CommentStatsBatchRequest, CommentStatsBatchResponse
 from ..security import get_current_user, get_current_user_optional
 from ..rank_utils import update_user_stats
+from ..comment_likes import toggle_comment_like
+from ..like_buffer import LIKE_BUFFER_ENABLED, like_buffer
+from ..role_cache import RoleRankSnapshot, get_snapshot
+from ..compression import PRECOMPRESS_CACHE_HEADER, choose_encoding
+from ..comment_snapshots import COMMENT_SNAPSHOT_MAX_AGE, comment_snapshot_writer, snapshot_path
+from ..comment_stats import get_comment_stats, invalidate as invalidate_comment_stats
+from ..comment_events import SSE_MAX_CLIENTS, comment_event_hub, notify_comment_event, stream_events
 
 router = APIRouter()
 
+# Liczba zaufanych proxy przed API dopisujących się do X-Forwarded-For
+# (produkcja: Cloudflare + ingress = 2, sam ingress = 1, 0 = adres połączenia)
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "2"))
+# Nagłówek z adresem klienta ustawiany przez proxy brzegowe (np. CF-Connecting-IP) -
+# ma pierwszeństwo; bezpieczny tylko gdy origin przyjmuje ruch wyłącznie od tego proxy
+CLIENT_IP_HEADER = os.getenv("CLIENT_IP_HEADER", "")
+
 def make_timezone_aware(dt):
     """Convert naive datetime to UTC timezone-aware datetime"""
     if dt is None:
@@ -24,14 +42,45 @@ def make_timezone_aware(dt):
     return dt
 
 def get_client_ip(request: Request) -> str:
-    """Get client IP address"""
+    """Get client IP address as seen by the outermost trusted proxy
+
+    Each proxy appends its peer to X-Forwarded-For, so only the last
+    TRUSTED_PROXY_HOPS entries come from our infrastructure - anything left of
+    them is whatever the client sent and must not be trusted (poll dedup).
+    CLIENT_IP_HEADER, when configured and present, takes precedence.
+    """
+    if CLIENT_IP_HEADER:
+        client_ip = request.headers.get(CLIENT_IP_HEADER, "").strip()
+        if client_ip:
+            return client_ip
     x_forwarded_for = request.headers.get('X-Forwarded-For')
-    if x_forwarded_for:
-        return x_forwarded_for.split(',')[0].strip()
+    if TRUSTED_PROXY_HOPS > 0 and x_forwarded_for:
+        hops = [hop.strip() for hop in x_forwarded_for.split(',') if hop.strip()]
+        if hops:
+            return hops[-min(TRUSTED_PROXY_HOPS, len(hops))]
     return request.client.host
 
-def build_comment_response(comment: Comment, current_user: Optional[User] = None, include_replies: bool = False) -> dict:
-    """Build comment response with like counts and user like status"""
+def build_author_info(user: Optional[User], snapshot: RoleRankSnapshot) -> dict:
+    """Author block (user + role + rank) for a comment"""
+    author_role = snapshot.role(user.role_id) if user else None
+    author_rank = snapshot.rank(user.rank_id) if user else None
+    return {
+        "id": user.id if user else None,
+        "username": user.username if user else "Usunięty użytkownik",
+        "role": author_role.author_dict() if author_role else None,
+        "rank": author_rank.author_dict() if author_rank else None
+    }
+
+def build_comment_response(comment: Comment, current_user: Optional[User] = None, include_replies: bool = False, snapshot: Optional[RoleRankSnapshot] = None, authors: Optional[dict] = None) -> dict:
+    """Build comment response with like counts and user like status
+
+    With an ``authors`` dict (format=normalized) the comment gets ``author_id``
+    and the author block is stored once in ``authors`` instead of inline.
+    """
+    
+    # Role i rangi z cache w pamięci - bez lazy-load per autor
+    if snapshot is None:
+        snapshot = get_snapshot()
     
     # Count likes and dislikes
     likes_count = len([like for like in comment.likes if like.is_like])
@@ -64,31 +113,10 @@ def build_comment_response(comment: Comment, current_user: Optional[User] = None
         # can_delete: właściciel/moderator/admin
         if comment.user_id == current_user.id:
             can_delete = True
-        elif current_user.role and current_user.role.name == UserRoleEnum.ADMIN:
-            can_delete = True
-        elif current_user.role and current_user.role.name == UserRoleEnum.MODERATOR:
-            can_delete = True
-    
-    # Build author info with role and rank
-    author_info = {
-        "id": comment.user.id if comment.user else None,
-        "username": comment.user.username if comment.user else "Usunięty użytkownik",
-        "role": {
-            "id": comment.user.role.id if comment.user and comment.user.role else None,
-            "name": comment.user.role.name if comment.user and comment.user.role else None,
-            "display_name": comment.user.role.display_name if comment.user and comment.user.role else None,
-            "color": comment.user.role.color if comment.user and comment.user.role else None,
-            "level": comment.user.role.level if comment.user and comment.user.role else 0,
-        } if comment.user and comment.user.role else None,
-        "rank": {
-            "id": comment.user.rank.id if comment.user and comment.user.rank else None,
-            "name": comment.user.rank.name if comment.user and comment.user.rank else None,
-            "display_name": comment.user.rank.display_name if comment.user and comment.user.rank else None,
-            "color": comment.user.rank.color if comment.user and comment.user.rank else None,
-            "level": comment.user.rank.level if comment.user and comment.user.rank else 0,
-            "icon": comment.user.rank.icon if comment.user and comment.user.rank else None
-        } if comment.user and comment.user.rank else None
-    }
+        else:
+            current_role = snapshot.role(current_user.role_id)
+            if current_role and current_role.name in (UserRoleEnum.ADMIN, UserRoleEnum.MODERATOR):
+                can_delete = True
     
     comment_data = {
         "id": comment.id,
@@ -97,7 +125,6 @@ def build_comment_response(comment: Comment, current_user: Optional[User] = None
         "parent_id": comment.parent_id,
         "content": comment.content if not comment.is_deleted else "[Komentarz został usunięty]",
         "is_deleted": comment.is_deleted,
-        "author": author_info,
         "created_at": comment.created_at,
         "updated_at": comment.updated_at,
         "likes_count": likes_count,
@@ -108,35 +135,34 @@ def build_comment_response(comment: Comment, current_user: Optional[User] = None
         "can_delete": can_delete
     }
     
+    # Build author info with role and rank - once per author in normalized mode
+    if authors is None:
+        comment_data["author"] = build_author_info(comment.user, snapshot)
+    else:
+        comment_data["author_id"] = comment.user_id
+        if comment.user_id not in authors:
+            authors[comment.user_id] = build_author_info(comment.user, snapshot)
+    
     if include_replies:
         comment_data["replies"] = [
-            build_comment_response(reply, current_user, False) 
+            build_comment_response(reply, current_user, False, snapshot, authors) 
             for reply in comment.replies 
         ]
     
     return comment_data
 
-@router.get("/{post_slug}", response_model=List[dict])
-async def get_post_comments(
-    post_slug: str,
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user_optional),
-    page: int = Query(1, ge=1),
-    per_page: int = Query(20, ge=1, le=100),
-    sort: str = Query("created_at", pattern="^(created_at|likes)$"),
-    order: str = Query("asc", pattern="^(asc|desc)$"),
-    include_replies: bool = Query(True, description="Include replies in response")
-):
-    """Pobierz komentarze dla posta"""
-    
+# ⚡ Listy komentarzy: typowany kontrakt (OpenAPI), ale odpowiedź zwracana wprost
+# przez ORJSONResponse - bez walidacji response_model i jsonable_encoder
+def load_post_comments(db: Session, post_slug: str, current_user: Optional[User] = None, page: int = 1,
+                       per_page: int = 20, sort: str = "created_at", order: str = "asc",
+                       include_replies: bool = True, format: str = "nested"):
+    """Page of top-level comments as returned by GET /{post_slug} (also used for snapshots)"""
     # Base query - only top-level comments (no parent)
-    # Eager load user with role and rank to avoid N+1 queries
+    # Eager load users to avoid N+1 queries (roles and ranks come from the in-memory snapshot)
     query = db.query(Comment).options(
-        joinedload(Comment.user).joinedload(User.role),
-        joinedload(Comment.user).joinedload(User.rank),
+        joinedload(Comment.user),
         joinedload(Comment.likes),
-        joinedload(Comment.replies).joinedload(Comment.user).joinedload(User.role),
-        joinedload(Comment.replies).joinedload(Comment.user).joinedload(User.rank)
+        joinedload(Comment.replies).joinedload(Comment.user)
     ).filter(
         Comment.post_slug == post_slug,
         Comment.parent_id.is_(None)
@@ -166,13 +192,88 @@ async def get_post_comments(
     comments = query.offset((page - 1) * per_page).limit(per_page).all()
     
     # Build response
+    snapshot = get_snapshot(db)
+    authors = {} if format == "normalized" else None
     comments_data = [
-        build_comment_response(comment, current_user, include_replies)
+        build_comment_response(comment, current_user, include_replies, snapshot, authors)
         for comment in comments
     ]
     
+    if authors is not None:
+        return {"comments": comments_data, "authors": authors}
     return comments_data
 
+def _generate_snapshot(post_slug: str) -> Optional[bytes]:
+    """Write a missing snapshot (worker thread); None when no blog post has this slug"""
+    db = ReadSessionLocal()
+    try:
+        # Pliki tylko dla istniejących postów - dowolne slugi nie zapełnią katalogu
+        if db.query(BlogPost.id).filter(BlogPost.slug == post_slug).first() is None:
+            return None
+        return comment_snapshot_writer.write(post_slug, db)
+    finally:
+        db.close()
+
+@router.get("/snapshots/{post_slug}.json")
+async def get_comment_snapshot(post_slug: str, request: Request):
+    """Statyczny snapshot pierwszej strony komentarzy (anonimowy widok) - cache'owalny przez CDN
+
+    Brak pliku = pierwszy odczyt generuje snapshot; przy wyłączonych snapshotach 404.
+    """
+    writer = comment_snapshot_writer
+    if not writer.enabled or snapshot_path(writer.directory, post_slug) is None:
+        raise HTTPException(
+            status_code=404,
+            detail={"translation_code": "SNAPSHOT_NOT_FOUND", "message": "Comment snapshot not available"}
+        )
+    
+    encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+    headers = {"Cache-Control": f"public, max-age={COMMENT_SNAPSHOT_MAX_AGE}", "Vary": "Accept-Encoding"}
+    try:
+        with open(snapshot_path(writer.directory, post_slug, encoding), "rb") as f:
+            body = f.read()
+    except FileNotFoundError:
+        # Pierwszy odczyt - wygeneruj teraz (poza pętlą zdarzeń), kolejne idą z dysku / CDN
+        loop = asyncio.get_running_loop()
+        body = await loop.run_in_executor(None, _generate_snapshot, post_slug)
+        if body is None:
+            raise HTTPException(
+                status_code=404,
+                detail={"translation_code": "SNAPSHOT_NOT_FOUND", "message": "Comment snapshot not available"}
+            )
+        return Response(body, media_type="application/json", headers=headers)
+    
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type="application/json", headers=headers)
+
+@router.get("/{post_slug}", response_model=Union[List[CommentResponse], NormalizedCommentsResponse], response_class=ORJSONResponse)
+async def get_post_comments(
+    post_slug: str,
+    db: Session = Depends(get_read_db),
+    current_user: Optional[User] = Depends(get_current_user_optional),
+    page: int = Query(1, ge=1),
+    per_page: int = Query(20, ge=1, le=100),
+    sort: str = Query("created_at", pattern="^(created_at|likes)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    include_replies: bool = Query(True, description="Include replies in response"),
+    format: str = Query("nested", pattern="^(nested|normalized)$", description="normalized: comments reference author_id, authors map per response")
+):
+    """Pobierz komentarze dla posta"""
+    payload = load_post_comments(db, post_slug, current_user, page, per_page, sort, order, include_replies, format)
+    
+    # Anonimowe odpowiedzi są identyczne dla wszystkich - skompresowane bajty trafiają do cache
+    headers = PRECOMPRESS_CACHE_HEADER if current_user is None else None
+    return ORJSONResponse(payload, headers=headers)
+
+@router.post("/stats:batch", response_model=CommentStatsBatchResponse)
+async def get_comment_stats_batch(
+    batch: CommentStatsBatchRequest,
+    db: Session = Depends(get_read_db)
+):
+    """Statystyki komentarzy dla wielu postów naraz (karty postów, indeks bloga)"""
+    return {"stats": get_comment_stats(db, batch.slugs)}
+
 @router.post("/{post_slug}", response_model=dict, status_code=status.HTTP_201_CREATED)
 async def create_comment(
     post_slug: str,
@@ -211,8 +312,15 @@ async def create_comment(
     )
     
     db.add(new_comment)
+    db.flush()
+    notify_comment_event(
+        db, post_slug, "created", new_comment.id,
+        parent_id=new_comment.parent_id, user_id=current_user.id, content=new_comment.content
+    )
     db.commit()
     db.refresh(new_comment)
+    invalidate_comment_stats(post_slug)
+    comment_snapshot_writer.schedule(post_slug)
     
     # 🎉 AUTOMATYCZNE SPRAWDZENIE AWANSU RANGI
     # Aktualizuj statystyki użytkownika i sprawdź awans
@@ -221,8 +329,7 @@ async def create_comment(
     # Load relationships for response
     # Load comment with all relationships for response
     new_comment = db.query(Comment).options(
-        joinedload(Comment.user).joinedload(User.role),
-        joinedload(Comment.user).joinedload(User.rank),
+        joinedload(Comment.user),
         joinedload(Comment.likes),
         joinedload(Comment.replies)
     ).filter(Comment.id == new_comment.id).first()
@@ -234,6 +341,26 @@ async def create_comment(
     
     return response
 
+@router.get("/{post_slug}/stream")
+async def stream_post_comments(post_slug: str, request: Request):
+    """Server-Sent Events z nowymi/edytowanymi/usuniętymi komentarzami i lajkami posta
+
+    Zdarzenia: created, updated, deleted, liked (data = JSON z comment_id);
+    bez połączenia z bazą na czas streamu - zdarzenia przychodzą z LISTEN.
+    """
+    if comment_event_hub.client_count >= SSE_MAX_CLIENTS:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={"translation_code": "STREAM_CAPACITY_REACHED", "message": "Too many live connections, try again later"}
+        )
+    
+    subscription = comment_event_hub.subscribe(post_slug)
+    return StreamingResponse(
+        stream_events(subscription, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.put("/{comment_id}", response_model=dict)
 async def update_comment(
     comment_id: int,
@@ -269,14 +396,15 @@ async def update_comment(
     
     comment.content = comment_data.content
     comment.updated_at = datetime.now(timezone.utc)
+    notify_comment_event(db, comment.post_slug, "updated", comment.id, content=comment.content)
     
     db.commit()
+    comment_snapshot_writer.schedule(comment.post_slug)
     db.refresh(comment)
     
     # Load relationships for response
     comment = db.query(Comment).options(
-        joinedload(Comment.user).joinedload(User.role),
-        joinedload(Comment.user).joinedload(User.rank),
+        joinedload(Comment.user),
         joinedload(Comment.likes),
         joinedload(Comment.replies)
     ).filter(Comment.id == comment.id).first()
@@ -325,8 +453,11 @@ async def delete_comment(
     
     # Soft delete
     comment.is_deleted = True
+    notify_comment_event(db, comment.post_slug, "deleted", comment.id)
     
     db.commit()
+    invalidate_comment_stats(comment.post_slug)
+    comment_snapshot_writer.schedule(comment.post_slug)
     
     return APIResponse(
         success=True,
@@ -344,80 +475,66 @@ async def like_comment(
 ):
     """Polub lub nie lubię komentarza"""
     
-    comment = db.query(Comment).filter(
-        Comment.id == comment_id,
-        Comment.is_deleted == False
-    ).first()
-    if not comment:
+    # ⚡ Cały toggle (walidacja + DELETE/UPDATE/INSERT + XP autora) w jednej instrukcji
+    # W trybie buforowanym XP autora trafia do like_buffer i jest zapisywane w paczkach
+    result = toggle_comment_like(
+        db, comment_id, current_user.id, like_data.is_like,
+        record_xp=not LIKE_BUFFER_ENABLED
+    )
+    if LIKE_BUFFER_ENABLED and result.like_received:
+        like_buffer.add_like(comment_id, result.author_id)
+    
+    if not result.found:
         raise HTTPException(
             status_code=404, 
             detail={"translation_code": "COMMENT_NOT_FOUND", "message": "Comment not found"}
         )
     
     # 🚫 WALIDACJA: Użytkownik nie może polubić własnych komentarzy
-    if comment.user_id == current_user.id:
+    if result.self_like:
         raise HTTPException(
             status_code=400, 
             detail={"translation_code": "SELF_LIKE_ERROR", "message": "Nie możesz polubić własnego komentarza"}
         )
     
-    # Check if user already liked/disliked this comment
-    existing_like = db.query(CommentLike).filter(
-        CommentLike.comment_id == comment_id,
-        CommentLike.user_id == current_user.id
-    ).first()
-    
-    if existing_like:
-        if existing_like.is_like == like_data.is_like:
-            # Same action - remove like/dislike
-            db.delete(existing_like)
-            action = "removed"
-        else:
-            # Different action - update like/dislike
-            existing_like.is_like = like_data.is_like
-            action = "updated"
-    else:
-        # New like/dislike
-        new_like = CommentLike(
-            comment_id=comment_id,
-            user_id=current_user.id,
-            is_like=like_data.is_like
+    # Toggle jest już zatwierdzony - osobna krótka transakcja tylko z NOTIFY
+    if result.likes_delta or result.dislikes_delta:
+        post_slug = db.query(Comment.post_slug).filter(Comment.id == comment_id).scalar()
+        notify_comment_event(
+            db, post_slug, "liked", comment_id,
+            likes_delta=result.likes_delta, dislikes_delta=result.dislikes_delta
         )
-        db.add(new_like)
-        action = "added"
-    
-    db.commit()
-    
-    # 🎉 AUTOMATYCZNE SPRAWDZENIE AWANSU RANGI
-    # Sprawdź awans dla właściciela komentarza jeśli otrzymał lajka
-    rank_update_info = None
-    if like_data.is_like and action in ["added", "updated"]:
-        # Właściciel komentarza otrzymał lajka
-        rank_update = update_user_stats(comment.user_id, db, "like_received")
-        if rank_update.get("rank_check", {}).get("upgraded"):
-            rank_update_info = rank_update["rank_check"]
+        db.commit()
+        comment_snapshot_writer.schedule(post_slug)
     
     like_type = "like" if like_data.is_like else "dislike"
     response_data = {
         "success": True,
         "type": "success",
         "translation_code": "COMMENT_LIKE_SUCCESS",
-        "message": f"Comment {like_type} {action} successfully"
+        "message": f"Comment {like_type} {result.action} successfully",
+        "data": {
+            "action": result.action,
+            "user_like_status": result.user_like_status,
+            "likes_delta": result.likes_delta,
+            "dislikes_delta": result.dislikes_delta
+        }
     }
     
     # Dodaj info o awansie właściciela komentarza
-    if rank_update_info:
-        response_data["comment_author_rank_upgrade"] = rank_update_info
+    if result.rank_check and result.rank_check.get("upgraded"):
+        response_data["data"]["comment_author_rank_upgrade"] = result.rank_check
     
     return APIResponse(**response_data)
 
-@router.get("/{comment_id}/replies", response_model=List[dict])
+@router.get("/{comment_id}/replies", response_model=Union[List[CommentResponse], NormalizedCommentsResponse], response_class=ORJSONResponse)
 async def get_comment_replies(
     comment_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: Optional[User] = Depends(get_current_user_optional),
     page: int = Query(1, ge=1),
-    per_page: int = Query(20, ge=1, le=100)
+    per_page: int = Query(20, ge=1, le=100),
+    format: str = Query("nested", pattern="^(nested|normalized)$")
 ):
     """Pobierz odpowiedzi na komentarz"""
     
@@ -429,10 +546,9 @@ async def get_comment_replies(
             detail={"translation_code": "COMMENT_NOT_FOUND", "message": "Comment not found"}
         )
     
-    # Get replies with eager loading of user roles and ranks
+    # Get replies with eager loading of users
     query = db.query(Comment).options(
-        joinedload(Comment.user).joinedload(User.role),
-        joinedload(Comment.user).joinedload(User.rank),
+        joinedload(Comment.user),
         joinedload(Comment.likes),
         joinedload(Comment.replies)
     ).filter(
@@ -444,35 +560,22 @@ async def get_comment_replies(
     replies = query.offset((page - 1) * per_page).limit(per_page).all()
     
     # Build response
+    snapshot = get_snapshot(db)
+    authors = {} if format == "normalized" else None
     replies_data = [
-        build_comment_response(reply, current_user, False)
+        build_comment_response(reply, current_user, False, snapshot, authors)
         for reply in replies
     ]
     
-    return replies_data
+    headers = PRECOMPRESS_CACHE_HEADER if current_user is None else None
+    if authors is not None:
+        return ORJSONResponse({"comments": replies_data, "authors": authors}, headers=headers)
+    return ORJSONResponse(replies_data, headers=headers)
 
-@router.get("/stats/{post_slug}")
+@router.get("/stats/{post_slug}", response_model=CommentStats)
 async def get_post_comment_stats(
     post_slug: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Pobierz statystyki komentarzy dla posta"""
-    
-    # Get stats
-    total_comments = db.query(Comment).filter(
-        Comment.post_slug == post_slug,
-        Comment.is_deleted == False
-    ).count()
-    
-    total_replies = db.query(Comment).filter(
-        Comment.post_slug == post_slug,
-        Comment.parent_id.isnot(None),
-        Comment.is_deleted == False
-    ).count()
-    
-    return {
-        "post_slug": post_slug,
-        "total_comments": total_comments,
-        "total_replies": total_replies,
-        "total_interactions": total_comments
-    }
+    return get_comment_stats(db, [post_slug])[post_slug]
@@ -0,0 +1,67 @@
+"""
+Polls router - votes on the Vote model, live results from memory
+"""
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Request, status
+from sqlalchemy.orm import Session
+
+from ..database import get_db, get_read_db
+from ..models import User
+from ..schemas import APIResponse, PollResults, PollVoteRequest
+from ..security import get_current_user_optional
+from ..poll_tallies import POLL_MAX_OPTIONS, insert_vote, poll_tallies
+from .comments import get_client_ip
+
+router = APIRouter()
+
+
+def _results(poll_name: str, counts: dict) -> dict:
+    return {"poll_name": poll_name, "total_votes": sum(counts.values()), "options": counts}
+
+
+@router.get("/{poll_name}", response_model=PollResults)
+async def get_poll_results(
+    poll_name: str = Path(..., min_length=1, max_length=100),
+    db: Session = Depends(get_read_db)
+):
+    """Wyniki ankiety z pamięci (uzgadniane z tabelą votes w tle)"""
+    return _results(poll_name, poll_tallies.get(db, poll_name))
+
+
+@router.post("/{poll_name}/vote", response_model=APIResponse)
+async def vote(
+    vote_data: PollVoteRequest,
+    request: Request,
+    poll_name: str = Path(..., min_length=1, max_length=100),
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_current_user_optional)
+):
+    """Oddaj głos - jeden na użytkownika, anonimowo jeden na adres IP"""
+    counts = poll_tallies.get(db, poll_name)
+    if vote_data.option not in counts and len(counts) >= POLL_MAX_OPTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"translation_code": "POLL_OPTIONS_LIMIT", "message": f"Poll cannot have more than {POLL_MAX_OPTIONS} options"}
+        )
+
+    # ⚡ Jedno INSERT ... ON CONFLICT DO NOTHING - duplikat to brak wiersza, nie wyjątek
+    inserted = insert_vote(
+        db, poll_name, vote_data.option,
+        current_user.id if current_user else None,
+        get_client_ip(request)
+    )
+    if not inserted:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"translation_code": "ALREADY_VOTED", "message": "You have already voted in this poll"}
+        )
+
+    poll_tallies.record(poll_name, vote_data.option)
+    return APIResponse(
+        success=True,
+        type="success",
+        translation_code="VOTE_RECORDED",
+        message="Vote recorded",
+        data=_results(poll_name, poll_tallies.get(db, poll_name))
+    )
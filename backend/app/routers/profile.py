@@ -1,15 +1,18 @@
 """
 User profile management router
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 
 from ..database import get_db
-from ..models import User, UserRoleEnum, UserRank, Comment, CommentLike, APIKey
+from ..models import User, UserRoleEnum
 from ..schemas import APIResponse
+from ..role_cache import get_snapshot
+from ..account_deletion import request_account_deletion
+from ..rank_utils import get_pending_stats, apply_pending_stats
 from ..security import (
     get_current_user, verify_password, get_password_hash, 
-    is_password_strong, is_email_valid
+    is_password_strong, is_email_valid, clear_auth_cookies
 )
 from pydantic import BaseModel, Field
 
@@ -200,6 +203,7 @@ async def change_email(
 @router.delete("/delete-account", response_model=APIResponse)
 async def delete_account(
     request: DeleteAccountRequest,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -229,36 +233,22 @@ async def delete_account(
             detail={"translation_code": "ADMIN_DELETE_FORBIDDEN", "message": "Nie można usunąć konta administratora. Skontaktuj się z innym administratorem."}
         )
     
-    # Zapisz informacje przed usunięciem (dla logów)
     deleted_username = current_user.username
-    deleted_email = current_user.email
     deleted_id = current_user.id
     
     try:
-        # 🗑️ USUNIĘCIE KONTA
-        # Najpierw usuwamy powiązane dane ręcznie, aby uniknąć problemów z foreign key constraints
+        # 🗑️ Oznacz konto do usunięcia - dane usuwa partiami zadanie w tle (account_deletion)
+        request_account_deletion(db, current_user)
+        clear_auth_cookies(response)
         
-        # 1. Usuń polubienia komentarzy użytkownika
-        db.query(CommentLike).filter(CommentLike.user_id == current_user.id).delete()
-        
-        # 2. Usuń komentarze użytkownika (wraz z odpowiedziami dzięki CASCADE w parent_id)
-        db.query(Comment).filter(Comment.user_id == current_user.id).delete()
-        
-        # 3. Usuń klucze API użytkownika
-        db.query(APIKey).filter(APIKey.user_id == current_user.id).delete()
-        
-        # 4. Usuń użytkownika
-        db.delete(current_user)
-        db.commit()
-        
-        # Log usunięcia konta (opcjonalnie można zapisać do tabeli audytu)
-        print(f"🗑️ KONTO USUNIĘTE: ID={deleted_id}, username={deleted_username}, email={deleted_email}")
+        print(f"🗑️ KONTO ZAPLANOWANE DO USUNIĘCIA: ID={deleted_id}, username={deleted_username}")
         
         return APIResponse(
             success=True,
             type="success",
             translation_code="ACCOUNT_DELETED",
-            message=f"Konto '{deleted_username}' zostało permanentnie usunięte. Dziękujemy za korzystanie z naszej platformy."
+            message=f"Konto '{deleted_username}' zostało zablokowane i zostanie permanentnie usunięte w ciągu kilku minut. Dziękujemy za korzystanie z naszej platformy.",
+            data={"deletion_pending": True}
         )
         
     except Exception as e:
@@ -270,10 +260,21 @@ async def delete_account(
 
 @router.get("/", response_model=dict)
 async def get_profile_info(
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
     """Pobierz podstawowe informacje o profilu użytkownika"""
     
+    # Statystyki z users + zdarzenia XP jeszcze niezagregowane
+    stats = apply_pending_stats(
+        {
+            "total_comments": current_user.total_comments,
+            "total_likes_received": current_user.total_likes_received,
+            "reputation_score": current_user.reputation_score or 0,
+        },
+        get_pending_stats(db, [current_user.id]).get(current_user.id)
+    )
+    
     return {
         "id": current_user.id,
         "username": current_user.username,
@@ -282,9 +283,9 @@ async def get_profile_info(
         "is_verified": current_user.email_verified,
         "created_at": current_user.created_at,
         "last_login": current_user.last_login,
-        "total_comments": current_user.total_comments,
-        "total_likes_received": current_user.total_likes_received,
-        "reputation_score": current_user.reputation_score or 0,
+        "total_comments": stats["total_comments"],
+        "total_likes_received": stats["total_likes_received"],
+        "reputation_score": stats["reputation_score"],
         "role": {
             "id": current_user.role.id if current_user.role else None,
             "name": current_user.role.name if current_user.role else None,
@@ -308,11 +309,9 @@ async def get_profile_info(
     }
 
 @router.get("/ranks", response_model=dict)
-async def get_all_ranks(
-    db: Session = Depends(get_db)
-):
+async def get_all_ranks():
     """Get all available ranks and their requirements"""
-    ranks = db.query(UserRank).filter(UserRank.is_active == True).order_by(UserRank.level.asc()).all()
+    ranks = get_snapshot().active_ranks
     
     return {
         "ranks": [
@@ -9,7 +9,9 @@ from ..database import get_db
 from ..models import User, UserRole, UserRank, UserRoleEnum, UserRankEnum
 from ..schemas import UserRole as UserRoleSchema, UserRank as UserRankSchema, UserWithRoleRank
 from ..security import get_current_user, get_current_admin_user
-from ..rank_utils import auto_check_rank_upgrade
+from ..rank_utils import auto_check_rank_upgrade, get_pending_stats, apply_pending_stats
+from ..role_cache import get_snapshot
+from ..permissions import ROLE_PERMISSIONS
 
 router = APIRouter(prefix="/api/roles", tags=["User Roles & Ranks"])
 
@@ -17,21 +19,17 @@ router = APIRouter(prefix="/api/roles", tags=["User Roles & Ranks"])
 
 @router.get("/roles", response_model=List[UserRoleSchema])
 def get_all_roles(
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Pobierz wszystkie dostępne role"""
-    roles = db.query(UserRole).filter(UserRole.is_active == True).all()
-    return roles
+    return list(get_snapshot().active_roles)
 
 @router.get("/ranks", response_model=List[UserRankSchema])
 def get_all_ranks(
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Pobierz wszystkie dostępne rangi"""
-    ranks = db.query(UserRank).filter(UserRank.is_active == True).order_by(UserRank.level).all()
-    return ranks
+    return list(get_snapshot().active_ranks)
 
 @router.get("/user/{user_id}", response_model=UserWithRoleRank)
 def get_user_role_rank(
@@ -60,6 +58,7 @@ def get_user_role_rank(
     
     # Dodaj computed fields
     user_data = UserWithRoleRank.from_orm(user)
+    apply_pending_stats(user_data, get_pending_stats(db, [user.id]).get(user.id))
     user_data.display_role = user.get_display_role()
     user_data.display_rank = user.get_display_rank()
     user_data.role_color = user.get_role_color()
@@ -162,12 +161,8 @@ def get_available_permissions(
 ):
     """Lista wszystkich dostępnych uprawnień w systemie"""
     return {
-        "permissions": [
-            "comment.create", "comment.like", "comment.moderate", "comment.delete",
-            "post.create", "post.edit", "post.delete", "post.publish",
-            "user.manage", "role.manage", "system.admin",
-            "profile.edit", "profile.view"
-        ],
+        # Uprawnienia do nadania rolom - bez zakresów kluczy API i nazw z wierszy ról
+        "permissions": list(ROLE_PERMISSIONS),
         "roles": list(UserRoleEnum),
         "ranks": list(UserRankEnum)
     }
@@ -184,6 +179,7 @@ def get_my_profile(
     ).filter(User.id == current_user.id).first()
     
     user_data = UserWithRoleRank.from_orm(user)
+    apply_pending_stats(user_data, get_pending_stats(db, [user.id]).get(user.id))
     user_data.display_role = user.get_display_role()
     user_data.display_rank = user.get_display_rank()
     user_data.role_color = user.get_role_color()
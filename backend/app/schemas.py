@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 # Blog Post Schemas 
@@ -147,6 +147,14 @@ class Vote(VoteCreate):
     class Config:
         from_attributes = True
 
+class PollVoteRequest(BaseModel):
+    option: str = Field(..., min_length=1, max_length=200)
+
+class PollResults(BaseModel):
+    poll_name: str
+    total_votes: int
+    options: Dict[str, int]
+
 # Comment Schemas
 class CommentCreate(BaseModel):
     content: str = Field(..., min_length=1, max_length=2000)
@@ -191,6 +199,67 @@ class Comment(BaseModel):
 class CommentWithReplies(Comment):
     replies: List['CommentWithReplies'] = []
 
+# Comment payloads built by build_comment_response (serialized with orjson)
+class CommentAuthorRole(BaseModel):
+    id: int
+    name: str
+    display_name: str
+    color: str
+    level: int
+
+class CommentAuthorRank(CommentAuthorRole):
+    icon: str
+
+class CommentAuthorInfo(BaseModel):
+    id: Optional[int] = None
+    username: str
+    role: Optional[CommentAuthorRole] = None
+    rank: Optional[CommentAuthorRank] = None
+
+class CommentResponseBase(BaseModel):
+    id: int
+    post_slug: str
+    user_id: int
+    parent_id: Optional[int] = None
+    content: str
+    is_deleted: bool
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    likes_count: int = 0
+    dislikes_count: int = 0
+    user_like_status: Optional[bool] = None
+    replies_count: int = 0
+    can_edit: bool = False
+    can_delete: bool = False
+
+class CommentResponse(CommentResponseBase):
+    author: CommentAuthorInfo
+    replies: Optional[List["CommentResponse"]] = None  # only with include_replies
+
+# format=normalized: author blocks deduplicated into one map per response
+class NormalizedComment(CommentResponseBase):
+    author_id: int
+    replies: Optional[List["NormalizedComment"]] = None
+
+class NormalizedCommentsResponse(BaseModel):
+    comments: List[NormalizedComment]
+    authors: Dict[int, CommentAuthorInfo]
+
+# Comment counts (single post and POST /comments/stats:batch)
+COMMENT_STATS_BATCH_MAX = 100
+
+class CommentStats(BaseModel):
+    post_slug: str
+    total_comments: int
+    total_replies: int
+    total_interactions: int
+
+class CommentStatsBatchRequest(BaseModel):
+    slugs: List[str] = Field(..., min_length=1, max_length=COMMENT_STATS_BATCH_MAX)
+
+class CommentStatsBatchResponse(BaseModel):
+    stats: Dict[str, CommentStats]
+
 class CommentLike(BaseModel):
     id: int
     comment_id: int
@@ -216,6 +285,21 @@ class PaginatedResponse(BaseModel):
     pages: int
     per_page: int
 
+class BlogPostSummary(BaseModel):
+    id: int
+    slug: str
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    comment_count: int = 0
+
+class BlogPostSummaryPage(PaginatedResponse):
+    items: List[BlogPostSummary]
+
+class BlogPostMeta(BaseModel):
+    id: int
+    slug: str
+    created_at: datetime
+
 # 🎯 USER ROLES AND RANKS SCHEMAS
 class UserRoleBase(BaseModel):
     name: str
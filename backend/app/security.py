@@ -14,9 +14,15 @@ from slowapi.errors import RateLimitExceeded
 import secrets
 import hashlib
 import os
-
-from .database import get_db
-from .models import User, APIKey, UserRoleEnum
+import threading
+import time
+from collections import OrderedDict
+
+from .database import get_db, READ_PRIMARY_COOKIE
+from .models import User, UserRoleEnum
+from . import api_key_cache
+from .api_key_cache import CachedAPIKey
+from .role_cache import get_snapshot
 from .datetime_utils import safe_current_time, is_datetime_expired, make_timezone_aware
 
 # Import Response for cookie handling  
@@ -80,15 +86,18 @@ def create_access_token(data: dict, expires_delta: Union[timedelta, None] = None
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def create_refresh_token(user_id: int):
-    """Create JWT refresh token"""
+def create_refresh_token(user_id: int, jti: Optional[str] = None, family_id: Optional[str] = None,
+                         expires_at: Optional[datetime] = None):
+    """Create JWT refresh token (use refresh_tokens.issue_refresh_token to also record it)"""
     data = {
         "sub": str(user_id),
         "type": "refresh",
-        "exp": safe_current_time() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+        "exp": expires_at or safe_current_time() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
         "iat": safe_current_time(),
-        "jti": secrets.token_urlsafe(16)
+        "jti": jti or secrets.token_urlsafe(16)
     }
+    if family_id:
+        data["fam"] = family_id  # rodzina rotacji - pierwszy jti łańcucha
     return jwt.encode(data, SECRET_KEY, algorithm=ALGORITHM)
 
 def set_auth_cookies(response: Response, access_token: str, refresh_token: str):
@@ -131,6 +140,23 @@ def set_auth_cookies(response: Response, access_token: str, refresh_token: str):
         **domain_config
     )
 
+def set_read_primary_cookie(response: Response, seconds: int):
+    """Pin this client's reads to the primary database for a few seconds after a write"""
+    environment = os.getenv("ENVIRONMENT", "production").lower()
+    is_secure = environment == "production"
+    domain_config = {"domain": ".kgr33n.com"} if environment == "production" else {}
+
+    response.set_cookie(
+        key=READ_PRIMARY_COOKIE,
+        value=f"{time.time() + seconds:.3f}",
+        max_age=seconds,
+        httponly=True,
+        secure=is_secure,
+        samesite="none" if is_secure else "lax",
+        path="/",
+        **domain_config
+    )
+
 def clear_auth_cookies(response: Response):
     """Clear authentication cookies"""
     # Check environment to determine cookie settings
@@ -166,14 +192,96 @@ def get_token_from_cookie(request: Request, cookie_name: str) -> Optional[str]:
     """Extract token from HTTP-only cookie"""
     return request.cookies.get(cookie_name)
 
+# LRU zweryfikowanych payloadów JWT: digest tokenu -> (payload, exp)
+# Ten sam access token przychodzi wielokrotnie w ciągu 15 minut - podpis sprawdzamy raz
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "4096"))
+_jwt_cache: "OrderedDict[bytes, tuple]" = OrderedDict()
+_jwt_cache_lock = threading.Lock()
+
+def _decode_token_cached(token: str) -> dict:
+    """jwt.decode with a bounded LRU of verified payloads; entries are evicted at exp"""
+    if JWT_CACHE_SIZE <= 0:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    
+    key = hashlib.blake2b(token.encode(), digest_size=32).digest()
+    now = time.time()
+    with _jwt_cache_lock:
+        entry = _jwt_cache.get(key)
+        if entry is not None:
+            payload, exp = entry
+            if exp is None or exp > now:
+                _jwt_cache.move_to_end(key)
+                return payload
+            del _jwt_cache[key]
+    
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])  # raises JWTError
+    exp = payload.get("exp")
+    with _jwt_cache_lock:
+        _jwt_cache[key] = (payload, exp)
+        if len(_jwt_cache) > JWT_CACHE_SIZE:
+            _jwt_cache.popitem(last=False)
+    return payload
+
+def clear_token_cache() -> None:
+    with _jwt_cache_lock:
+        _jwt_cache.clear()
+
+class RevokedJTIFilter:
+    """In-memory set of revoked token JTIs (jti -> exp timestamp)
+
+    Checked on every verify_token, so the common path (token not revoked)
+    never touches the database. Revoked tokens are few and short-lived, so an
+    exact dict is used instead of a Bloom filter - no false positives.
+    Entries are dropped by purge() once the token would have expired anyway.
+    """
+
+    def __init__(self):
+        self._jtis: dict = {}
+        self._lock = threading.Lock()
+
+    def add(self, jti: str, exp: Optional[float] = None) -> None:
+        with self._lock:
+            self._jtis[jti] = exp
+
+    def __contains__(self, jti: str) -> bool:
+        return jti in self._jtis
+
+    def __len__(self) -> int:
+        return len(self._jtis)
+
+    def purge(self, now: Optional[float] = None) -> int:
+        """Drop entries past their exp; returns number removed"""
+        now = time.time() if now is None else now
+        with self._lock:
+            expired = [jti for jti, exp in self._jtis.items() if exp is not None and exp <= now]
+            for jti in expired:
+                del self._jtis[jti]
+        return len(expired)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._jtis.clear()
+
+revoked_jtis = RevokedJTIFilter()
+
+def revoke_token_payload(payload: dict) -> None:
+    """Reject a decoded token in this process until it expires (e.g. access token on logout)"""
+    jti = payload.get("jti")
+    if jti:
+        revoked_jtis.add(jti, payload.get("exp"))
+
 def verify_token(token: str, token_type: str = "access") -> Optional[dict]:
-    """Verify and decode a JWT token with type checking"""
+    """Verify and decode a JWT token with type checking (payload is shared - do not mutate)"""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = _decode_token_cached(token)
         
         # Verify token type
         if payload.get("type") != token_type:
             return None
+        
+        # Odwołane tokeny (wylogowanie, wykryte ponowne użycie refresh tokenu)
+        if payload.get("jti") in revoked_jtis:
+            return None
             
         # Check if token is expired using safe datetime comparison
         exp = payload.get("exp")
@@ -290,7 +398,8 @@ def get_current_user(
         if not user:
             user = get_user_by_username(db, user_identifier)
             
-        if user is None:
+        # Konto w trakcie usuwania traktujemy jak nieistniejące
+        if user is None or user.deletion_requested_at is not None:
             raise credentials_exception
             
     except JWTError:
@@ -334,8 +443,9 @@ def get_current_user_optional(
 
 def get_current_admin_user(current_user: User = Depends(get_current_active_user)) -> User:
     """Get current admin user - checks role-based permissions"""
-    # Check if user has admin role
-    if not current_user.role or current_user.role.name != UserRoleEnum.ADMIN:
+    # Check if user has admin role (role from the in-memory snapshot - no lazy load)
+    role = get_snapshot().role(current_user.role_id)
+    if not role or role.name != UserRoleEnum.ADMIN:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail={"translation_code": "INSUFFICIENT_PERMISSIONS", "message": "Not enough permissions"}
@@ -351,33 +461,29 @@ def hash_api_key(api_key: str) -> str:
     """Hash an API key for storage"""
     return hashlib.sha256(api_key.encode()).hexdigest()
 
-def verify_api_key(db: Session, api_key: str) -> Optional[APIKey]:
-    """Verify API key and return the key object if valid"""
-    key_hash = hash_api_key(api_key)
-    api_key_obj = db.query(APIKey).filter(
-        APIKey.key_hash == key_hash,
-        APIKey.is_active == True
-    ).first()
-    
-    if api_key_obj and (api_key_obj.expires_at is None or api_key_obj.expires_at > datetime.now(timezone.utc)):
-        # Update last used timestamp
-        api_key_obj.last_used = datetime.now(timezone.utc)
-        db.commit()
-        return api_key_obj
-    return None
+def verify_api_key(db: Session, api_key: str) -> Optional[CachedAPIKey]:
+    """Verify API key and return the cached key if valid
+
+    last_used is buffered in memory and flushed in bulk (api_key_cache).
+    """
+    return api_key_cache.lookup(db, hash_api_key(api_key))
+
+def get_request_api_key(request: Request, db: Session) -> Optional[CachedAPIKey]:
+    """Verify the X-API-Key header once per request"""
+    if hasattr(request.state, "api_key"):
+        return request.state.api_key
+    api_key = request.headers.get("X-API-Key")
+    request.state.api_key = verify_api_key(db, api_key) if api_key else None
+    return request.state.api_key
 
 def get_user_from_api_key(
     request: Request,
     db: Session = Depends(get_db)
 ) -> Optional[User]:
     """Get user from API key in header"""
-    api_key = request.headers.get("X-API-Key")
-    if not api_key:
-        return None
-    
-    api_key_obj = verify_api_key(db, api_key)
+    api_key_obj = get_request_api_key(request, db)
     if api_key_obj:
-        return api_key_obj.user
+        return db.get(User, api_key_obj.user_id)
     return None
 
 def require_permission(permission: str):
@@ -387,20 +493,20 @@ def require_permission(permission: str):
         db: Session = Depends(get_db),
         current_user: User = Depends(get_current_active_user)
     ):
+        role = get_snapshot().role(current_user.role_id)
+        
         # Check if user has admin role (admins have all permissions)
-        if current_user.role and current_user.role.name == UserRoleEnum.ADMIN:
+        if role and role.name == UserRoleEnum.ADMIN:
             return current_user
         
-        # Check user role permissions
-        if current_user.role and current_user.role.permissions and permission in current_user.role.permissions:
+        # Check user role permissions (compiled bitmask)
+        if role and role.has_permission(permission):
             return current_user
         
         # Check API key permissions
-        api_key = request.headers.get("X-API-Key")
-        if api_key:
-            api_key_obj = verify_api_key(db, api_key)
-            if api_key_obj and permission in api_key_obj.permissions:
-                return current_user
+        api_key_obj = get_request_api_key(request, db)
+        if api_key_obj and api_key_obj.has_permission(permission):
+            return current_user
         
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
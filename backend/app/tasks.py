@@ -6,6 +6,12 @@ from datetime import datetime, timedelta, timezone
 from sqlalchemy.orm import Session
 from .database import SessionLocal
 from .models import User
+from .rank_utils import aggregate_xp_events
+from . import api_key_cache
+from .email_outbox import dispatch_pending as dispatch_pending_emails, purge_finished as purge_finished_emails
+from .refresh_tokens import purge_expired as purge_expired_refresh_rows
+from .account_deletion import purge_pending_accounts
+from .poll_tallies import poll_tallies
 import logging
 
 logger = logging.getLogger(__name__)
@@ -104,6 +110,123 @@ async def cleanup_expired_password_resets():
     finally:
         db.close()
 
+async def aggregate_xp_ledger():
+    """
+    Fold pending xp_events into users counters in bounded batches
+    Runs every XP_AGGREGATION_INTERVAL seconds; batches run in a worker thread
+    """
+    db = SessionLocal()
+    try:
+        # Paczki w wątku - zaległy ledger nie blokuje pętli zdarzeń
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, aggregate_xp_events, db)
+        if result["events"]:
+            logger.info(
+                f"Aggregated {result['events']} XP events for {result['users']} users "
+                f"({result['rank_upgrades']} rank upgrades)"
+            )
+    except Exception as e:
+        logger.error(f"Error during XP aggregation: {str(e)}")
+        db.rollback()
+    finally:
+        db.close()
+
+async def flush_api_key_last_used():
+    """
+    Write buffered API key last_used timestamps in one bulk UPDATE
+    This task should be run every minute
+    """
+    db = SessionLocal()
+    try:
+        flushed = api_key_cache.flush_last_used(db)
+        if flushed:
+            logger.info(f"Updated last_used for {flushed} API keys")
+    except Exception as e:
+        logger.error(f"Error during API key last_used flush: {str(e)}")
+    finally:
+        db.close()
+
+async def dispatch_email_outbox():
+    """
+    Send pending outbox emails (registration verification etc.)
+    Runs right after registration and every EMAIL_OUTBOX_INTERVAL seconds for retries
+    """
+    db = SessionLocal()
+    try:
+        result = await dispatch_pending_emails(db)
+        if result["sent"] or result["failed"]:
+            logger.info(f"Email outbox: {result['sent']} sent, {result['failed']} failed")
+    except Exception as e:
+        logger.error(f"Error during email outbox dispatch: {str(e)}")
+        db.rollback()
+    finally:
+        db.close()
+
+async def purge_email_outbox():
+    """
+    Delete sent and dead email outbox rows after the retention period
+    This task should be run periodically (e.g., every hour)
+    """
+    db = SessionLocal()
+    try:
+        purged = purge_finished_emails(db)
+        if purged:
+            logger.info(f"Purged {purged} finished email outbox rows")
+    except Exception as e:
+        logger.error(f"Error during email outbox purge: {str(e)}")
+        db.rollback()
+    finally:
+        db.close()
+
+async def purge_expired_refresh_tokens():
+    """
+    Delete expired refresh_tokens rows in batches and drop expired revoked JTIs
+    This task should be run periodically (e.g., every hour)
+    """
+    db = SessionLocal()
+    try:
+        purged = purge_expired_refresh_rows(db)
+        if purged:
+            logger.info(f"Purged {purged} expired refresh tokens")
+    except Exception as e:
+        logger.error(f"Error during refresh token purge: {str(e)}")
+        db.rollback()
+    finally:
+        db.close()
+
+async def purge_deleted_accounts():
+    """
+    Purge data of accounts marked for deletion in bounded batches
+    Runs every ACCOUNT_DELETION_INTERVAL seconds; batches run in a worker thread
+    """
+    db = SessionLocal()
+    try:
+        loop = asyncio.get_running_loop()
+        deleted = await loop.run_in_executor(None, purge_pending_accounts, db)
+        if deleted:
+            logger.info(f"Purged {deleted} deleted accounts")
+    except Exception as e:
+        logger.error(f"Error during account purge: {str(e)}")
+        db.rollback()
+    finally:
+        db.close()
+
+async def reconcile_poll_tallies():
+    """
+    Recount votes of polls held in memory (one GROUP BY off the request path)
+    Runs every POLL_RECONCILE_INTERVAL seconds in a worker thread
+    """
+    db = SessionLocal()
+    try:
+        # GROUP BY w wątku - pętla zdarzeń obsługuje żądania w tym czasie
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, poll_tallies.reconcile, db)
+    except Exception as e:
+        logger.error(f"Error during poll tally reconcile: {str(e)}")
+        db.rollback()
+    finally:
+        db.close()
+
 async def run_maintenance_tasks():
     """
     Run all maintenance tasks
@@ -113,6 +236,9 @@ async def run_maintenance_tasks():
     await cleanup_expired_accounts()
     await cleanup_expired_verification_codes()
     await cleanup_expired_password_resets()
+    await purge_expired_refresh_tokens()
+    await purge_email_outbox()
+    await aggregate_xp_ledger()
     
     logger.info("Maintenance tasks completed")
 
@@ -0,0 +1,110 @@
+"""
+Harness: users cleanup tasks on a large table read only candidate rows
+
+Seeds N users (default 1M) with a small share of cleanup candidates, runs the
+real tasks.py jobs to capture their SQL, then EXPLAIN ANALYZEs each SELECT on
+the seeded data - with the partial indexes and with index scans disabled - and
+checks that the indexed plan removes no rows by filter and returns exactly the
+candidates. Everything runs in one transaction that is rolled back, so the
+database is left as it was.
+
+    cd backend && PYTHONPATH=. DATABASE_URL=postgresql://... \
+        python tests/benchmarks/bench_user_cleanup.py --users 1000000
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from app import tasks
+from app.database import engine
+from tests.conftest import capture_selects, explain
+
+# (zadanie, indeks, SQL zliczający kandydatów)
+JOBS = (
+    (tasks.cleanup_expired_accounts, "ix_users_unverified_expires",
+     "SELECT count(*) FROM users WHERE email_verified = false AND account_expires_at < now()"),
+    (tasks.cleanup_expired_verification_codes, "ix_users_verification_expires",
+     "SELECT count(*) FROM users WHERE verification_expires_at < now()"),
+    (tasks.cleanup_expired_password_resets, "ix_users_password_reset_expires",
+     "SELECT count(*) FROM users WHERE password_reset_expires_at < now()"),
+)
+
+# Co 100. konto: nieaktywne po terminie; co 100. (inne): kod/reset po terminie;
+# tyle samo jeszcze ważnych - indeks musi odciąć je zakresem, nie filtrem
+SEED_SQL = text("""
+    INSERT INTO users (username, email, hashed_password, is_active, email_verified,
+                       account_expires_at, verification_expires_at, password_reset_expires_at)
+    SELECT 'seed_' || :run || '_' || i, 'seed_' || :run || '_' || i || '@seed.test', 'x',
+           i % 100 > 1,
+           i % 100 > 1,
+           CASE i % 100 WHEN 0 THEN now() - interval '1 day' WHEN 1 THEN now() + interval '1 day' END,
+           CASE i % 100 WHEN 10 THEN now() - interval '1 hour' WHEN 11 THEN now() + interval '1 hour' END,
+           CASE i % 200 WHEN 20 THEN now() - interval '1 hour' WHEN 21 THEN now() + interval '1 hour' END
+    FROM generate_series(1, :users) AS i
+""")
+
+
+def walk(plan):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from walk(child)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    failures = 0
+    with engine.connect() as conn:
+        outer = conn.begin()
+        try:
+            started = time.perf_counter()
+            conn.execute(SEED_SQL, {"run": str(int(time.time())), "users": args.users})
+            conn.execute(text("ANALYZE users"))
+            total = conn.execute(text("SELECT count(*) FROM users")).scalar()
+            print(f"Seeded {args.users:,} users in {time.perf_counter() - started:.1f} s ({total:,} in table)")
+
+            # Zadania działają na sesji w savepoincie tego połączenia
+            tasks.SessionLocal = sessionmaker(bind=conn, join_transaction_mode="create_savepoint")
+
+            for job, index_name, count_sql in JOBS:
+                candidates = conn.execute(text(count_sql)).scalar()
+                savepoint = conn.begin_nested()
+                try:
+                    statements = capture_selects(conn, lambda: asyncio.run(job()),
+                                                 match=lambda statement: "FROM users" in statement)
+                finally:
+                    savepoint.rollback()
+
+                print(f"\n{job.__name__}: {candidates:,} candidates")
+                for label, settings in (("partial index", ()),
+                                        ("no index", ("enable_indexscan", "enable_bitmapscan"))):
+                    plan = explain(conn, statements[:1], options="ANALYZE, BUFFERS, FORMAT JSON", disable=settings)[0]
+
+                    nodes = [node for node in walk(plan["Plan"]) if node.get("Relation Name") == "users"]
+                    # Wartości w węzłach równoległych są średnią na pętlę (worker)
+                    rows = sum(node["Actual Rows"] * node["Actual Loops"] for node in nodes)
+                    removed = sum((node.get("Rows Removed by Filter", 0) + node.get("Rows Removed by Index Recheck", 0))
+                                  * node["Actual Loops"] for node in nodes)
+                    buffers = sum(node.get("Shared Hit Blocks", 0) + node.get("Shared Read Blocks", 0) for node in nodes)
+                    used = {node["Index Name"] for node in walk(plan["Plan"]) if "Index Name" in node}
+                    print(f"  {label:<14} {plan['Execution Time']:9.2f} ms  rows {rows:>8,}  "
+                          f"removed by filter {removed:>9,}  buffers {buffers:>7,}  {', '.join(sorted(used)) or 'seq scan'}")
+
+                    if not settings:
+                        ok = index_name in used and removed == 0 and rows == candidates
+                        failures += not ok
+                        print(f"  {'OK' if ok else 'FAIL'}: {index_name} reads only candidate rows")
+        finally:
+            outer.rollback()
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
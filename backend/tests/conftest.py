@@ -0,0 +1,143 @@
+"""
+Shared fixtures for tests against PostgreSQL (migrations applied)
+
+    TEST_DATABASE_URL=postgresql://... pytest
+
+Tests using pg_engine (or fixtures built on it) are skipped when the variable
+is not set. explain_captured runs real application code, captures the SELECTs
+it sends and returns their EXPLAIN plans - also used by tests/benchmarks.
+"""
+import json
+import os
+import secrets
+from typing import Callable, Iterable, List, Optional, Tuple, Union
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import sessionmaker
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+requires_db = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL not set")
+
+
+@pytest.fixture
+def pg_engine():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL not set")
+    # Pula pod testy współbieżności (16 wątków w test_comment_likes)
+    engine = create_engine(TEST_DATABASE_URL, pool_size=20, max_overflow=0)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def pg_session(pg_engine):
+    db = sessionmaker(bind=pg_engine)()
+    yield db
+    db.rollback()
+    db.close()
+
+
+@pytest.fixture
+def pg_connection(pg_engine):
+    """Connection inside a transaction that is rolled back after the test"""
+    with pg_engine.connect() as conn:
+        outer = conn.begin()
+        try:
+            yield conn
+        finally:
+            outer.rollback()
+
+
+@pytest.fixture
+def make_user(pg_session):
+    """Factory of throwaway users with unique names; deleted (with cascaded rows) after the test"""
+    from app.models import User
+
+    created = []
+
+    def make(prefix: str = "user", **fields):
+        suffix = secrets.token_hex(4)
+        fields.setdefault("hashed_password", "x")
+        user = User(username=f"{prefix}_{suffix}", email=f"{prefix}_{suffix}@test.pl", **fields)
+        pg_session.add(user)
+        pg_session.flush()
+        created.append(user.id)
+        return user
+
+    yield make
+    pg_session.rollback()
+    if created:
+        pg_session.query(User).filter(User.id.in_(created)).delete(synchronize_session=False)
+        pg_session.commit()
+
+
+@pytest.fixture
+def seeded_user(make_user, pg_session):
+    """One committed throwaway user"""
+    user = make_user()
+    pg_session.commit()
+    return user
+
+
+# --- EXPLAIN of captured statements ---------------------------------------------
+
+Statement = Tuple[str, object]
+
+
+def capture_selects(target: Union[Engine, Connection], fn: Callable[[], object],
+                    match: Optional[Callable[[str], bool]] = None) -> List[Statement]:
+    """Run fn() and return the SELECTs it executed on target (statement, parameters)"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and (match is None or match(statement)):
+            statements.append((statement, parameters))
+
+    event.listen(target, "before_cursor_execute", capture)
+    try:
+        fn()
+    finally:
+        event.remove(target, "before_cursor_execute", capture)
+    return statements
+
+
+def explain(target: Union[Engine, Connection], statements: Iterable[Statement], options: str = "",
+            disable: Iterable[str] = ("enable_seqscan",)) -> list:
+    """EXPLAIN each statement with the given planner settings off
+
+    On an Engine the plans run on a fresh connection that is rolled back; on a
+    Connection they run in its current transaction (sees uncommitted data).
+    Returns plan text, or the plan dict for FORMAT JSON.
+    """
+    own = isinstance(target, Engine)
+    raw = target.raw_connection() if own else target.connection
+    prefix = f"EXPLAIN ({options}) " if options else "EXPLAIN "
+    try:
+        cursor = raw.cursor()
+        for name in disable:
+            cursor.execute(f"SET LOCAL {name} = off")
+        plans = []
+        for statement, parameters in statements:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+            if "JSON" in options.upper():
+                result = rows[0][0]
+                plans.append((json.loads(result) if isinstance(result, str) else result)[0])
+            else:
+                plans.append("\n".join(row[0] for row in rows))
+        for name in disable:
+            cursor.execute(f"SET LOCAL {name} = on")
+        return plans
+    finally:
+        if own:
+            raw.rollback()
+            raw.close()
+
+
+def explain_captured(target: Union[Engine, Connection], fn: Callable[[], object],
+                     match: Optional[Callable[[str], bool]] = None, **explain_options) -> list:
+    """Plans of every SELECT fn() executes on target (seqscan off by default)"""
+    return explain(target, capture_selects(target, fn, match), **explain_options)
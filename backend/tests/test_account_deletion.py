@@ -0,0 +1,71 @@
+"""
+Background, batched account deletion
+
+Requires a PostgreSQL database with migrations applied:
+    TEST_DATABASE_URL=postgresql://... pytest tests/test_account_deletion.py
+"""
+from app import account_deletion
+from app.models import APIKey, Comment, CommentLike, User, Vote, XPEvent
+
+
+def test_marks_account_and_purges_in_batches(pg_session, make_user):
+    db = pg_session
+    user = make_user("purge")
+    other = make_user("keep")
+    suffix = user.username.split("_")[-1]
+    slug = f"purge-{suffix}"
+    kept = Comment(post_slug=slug, user_id=other.id, content="kept")
+    db.add(kept)
+    own = [Comment(post_slug=slug, user_id=user.id, content=f"c{i}") for i in range(5)]
+    db.add_all(own)
+    db.flush()
+    # Cudzy wątek pod komentarzem użytkownika: odpowiedź, odpowiedź na nią, polubienia
+    reply = Comment(post_slug=slug, user_id=other.id, parent_id=own[0].id, content="reply")
+    db.add(reply)
+    db.flush()
+    nested = Comment(post_slug=slug, user_id=other.id, parent_id=reply.id, content="nested")
+    db.add(nested)
+    db.flush()
+    db.add_all([
+        CommentLike(comment_id=own[0].id, user_id=other.id, is_like=True),
+        CommentLike(comment_id=nested.id, user_id=other.id, is_like=True),
+        CommentLike(comment_id=kept.id, user_id=user.id, is_like=True),
+        APIKey(name="k", key_hash=f"hash-{suffix}", key_preview="kgr_", user_id=user.id),
+        XPEvent(user_id=user.id, action="comment", xp=1),
+        Vote(user_id=user.id, poll_name=f"poll-{suffix}", option="a"),
+    ])
+    db.commit()
+    user_id, other_id = user.id, other.id
+    kept_id, reply_id, nested_id = kept.id, reply.id, nested.id
+
+    try:
+        account_deletion.request_account_deletion(db, user)
+        assert user.deletion_requested_at is not None and not user.is_active
+        assert db.query(APIKey).filter(APIKey.user_id == user_id, APIKey.is_active == True).count() == 0
+
+        # Budżet 2 partii: polubienia użytkownika + polubienia w jego wątkach - komentarze nietknięte
+        assert account_deletion._purge_account(db, user_id, batch_size=2, max_batches=2) == 2
+        progress = next(p for p in account_deletion.pending_deletions(db) if p["id"] == user_id)
+        assert progress["remaining"]["comment_likes"] == 0
+        assert progress["remaining"]["thread_likes"] == 0
+        assert progress["remaining"]["comments"] == 7
+
+        # Jedna partia komentarzy to dokładnie batch_size liści - kaskada nic nie dokłada
+        assert account_deletion._purge_account(db, user_id, batch_size=2, max_batches=1) == 1
+        progress = next(p for p in account_deletion.pending_deletions(db) if p["id"] == user_id)
+        assert progress["remaining"]["comments"] == 5
+        assert db.get(Comment, reply_id) is not None  # rodzic liścia jeszcze czeka
+
+        while db.get(User, user_id) is not None:
+            account_deletion.purge_pending_accounts(db, batch_size=2, max_batches=3)
+            db.expire_all()
+
+        assert db.query(Comment).filter(Comment.user_id == user_id).count() == 0
+        assert db.query(Vote).filter(Vote.poll_name == f"poll-{suffix}").one().user_id is None
+        assert db.get(Comment, kept_id) is not None
+        assert db.get(Comment, nested_id) is None and db.get(Comment, reply_id) is None
+    finally:
+        db.rollback()
+        db.query(Vote).filter(Vote.poll_name == f"poll-{suffix}").delete()
+        db.query(APIKey).filter(APIKey.user_id.in_([user_id, other_id])).delete()
+        db.commit()
@@ -0,0 +1,69 @@
+"""
+Streaming admin exports (GET /api/admin/export/{dataset})
+
+The filter test runs anywhere; streaming tests need a PostgreSQL database
+with migrations applied:
+    TEST_DATABASE_URL=postgresql://... pytest tests/test_admin_export.py
+"""
+import csv
+import io
+
+import orjson
+import pytest
+from sqlalchemy import text
+
+from app.admin_export import _csv_value, build_export_query, stream_export
+from app.models import Comment
+
+
+def test_rejects_filters_of_other_datasets():
+    with pytest.raises(ValueError):
+        build_export_query("users", post_slug="abc")
+    # None znaczy "bez filtra"
+    build_export_query("users", post_slug=None, is_active=True)
+
+
+def test_user_export_has_no_secret_columns():
+    columns = {c.name for c in build_export_query("users").selected_columns}
+    assert "email" in columns
+    assert not columns & {"hashed_password", "verification_code_hash", "verification_token",
+                           "password_reset_token", "two_factor_secret"}
+
+
+def test_csv_cells_cannot_start_a_formula():
+    assert _csv_value("=HYPERLINK(\"http://x\")") == "'=HYPERLINK(\"http://x\")"
+    assert [_csv_value(v) for v in ("+1", "-1", "@SUM(A1)", "\tx")] == ["'+1", "'-1", "'@SUM(A1)", "'\tx"]
+    assert [_csv_value(v) for v in ("a=b", -1, None)] == ["a=b", -1, ""]
+
+
+def test_streams_in_batches_and_resumes_after_id(pg_engine, pg_session, make_user):
+    engine, db = pg_engine, pg_session
+    user = make_user("export")
+    slug = f"export-{user.username}"
+    db.add_all([Comment(post_slug=slug, user_id=user.id, content=f"c{i},\"q\"\n") for i in range(4)])
+    db.add(Comment(post_slug=slug, user_id=user.id, content="=1+1"))
+    db.commit()
+
+    chunks = list(stream_export(build_export_query("comments", post_slug=slug), "ndjson",
+                                engine=engine, batch_size=2))
+    assert len(chunks) == 3  # 2 + 2 + 1
+    rows = [orjson.loads(line) for line in b"".join(chunks).splitlines()]
+    assert [r["content"] for r in rows] == [f"c{i},\"q\"\n" for i in range(4)] + ["=1+1"]
+
+    resumed = b"".join(stream_export(
+        build_export_query("comments", post_slug=slug, after_id=rows[2]["id"]), "ndjson", engine=engine))
+    assert [orjson.loads(line)["id"] for line in resumed.splitlines()] == [r["id"] for r in rows[3:]]
+
+    body = b"".join(stream_export(build_export_query("comments", post_slug=slug, limit=3), "csv",
+                                  engine=engine, batch_size=2)).decode()
+    parsed = list(csv.DictReader(io.StringIO(body)))
+    assert [r["id"] for r in parsed] == [str(r["id"]) for r in rows[:3]]
+    assert parsed[0]["content"] == "c0,\"q\"\n" and parsed[0]["parent_id"] == ""
+
+    body = b"".join(stream_export(build_export_query("comments", post_slug=slug, after_id=rows[3]["id"]),
+                                  "csv", engine=engine)).decode()
+    assert next(csv.DictReader(io.StringIO(body)))["content"] == "'=1+1"
+
+    # Limity czasu tylko w transakcji eksportu - nie zostają na połączeniu w puli
+    with engine.connect() as conn:
+        assert conn.execute(text("SHOW idle_in_transaction_session_timeout")).scalar() != "1min"
@@ -0,0 +1,59 @@
+"""
+API key cache and buffered last_used flush
+
+Requires a PostgreSQL database with migrations applied:
+    TEST_DATABASE_URL=postgresql://... pytest tests/test_api_key_cache.py
+"""
+import secrets
+
+import pytest
+from sqlalchemy import event
+
+from app import api_key_cache
+from app.models import APIKey
+from app.security import hash_api_key, verify_api_key
+
+
+@pytest.fixture
+def db_with_key(pg_engine, pg_session, make_user):
+    engine, db = pg_engine, pg_session
+    raw_key = secrets.token_urlsafe(32)
+
+    user = make_user("apikey")
+    key = APIKey(name="test", key_hash=hash_api_key(raw_key), key_preview=raw_key[:8],
+                 permissions=["read"], user_id=user.id)
+    db.add(key)
+    db.commit()
+    api_key_cache.invalidate()
+
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    yield db, raw_key, key, queries
+
+    db.rollback()
+    db.query(APIKey).filter(APIKey.user_id == user.id).delete()
+    db.commit()
+
+
+def test_key_is_looked_up_once_and_last_used_flushed_in_bulk(db_with_key):
+    db, raw_key, key, queries = db_with_key
+
+    key_info = verify_api_key(db, raw_key)
+    assert key_info.has_permission("read") and not key_info.has_permission("post.create")
+    assert verify_api_key(db, raw_key) is not None
+    assert len(queries) == 1  # drugi raz z cache, bez UPDATE last_used
+
+    assert api_key_cache.flush_last_used(db) >= 1
+    db.refresh(key)
+    assert key.last_used is not None
+
+
+def test_invalidate_after_deactivation(db_with_key):
+    db, raw_key, key, _ = db_with_key
+    assert verify_api_key(db, raw_key) is not None
+
+    key.is_active = False
+    db.commit()
+    api_key_cache.invalidate(key.key_hash)
+
+    assert verify_api_key(db, raw_key) is None
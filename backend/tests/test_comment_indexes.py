@@ -0,0 +1,52 @@
+"""
+EXPLAIN checks: comment read paths use the indexes from migration 007
+
+Runs the real queries (comments page, replies, counts), captures their SQL and
+EXPLAINs it with enable_seqscan off - on a small test table the planner would
+otherwise always prefer a sequential scan. Requires a PostgreSQL database with
+migrations applied:
+    TEST_DATABASE_URL=postgresql://... pytest tests/test_comment_indexes.py
+"""
+import asyncio
+
+import pytest
+
+from app import comment_stats
+from app.models import Comment
+from app.routers.comments import get_comment_replies, load_post_comments
+from conftest import explain_captured
+
+
+@pytest.fixture
+def seeded(pg_engine, pg_session, make_user):
+    user = make_user("idx")
+    slug = f"indexes-{user.username}"
+    root = Comment(post_slug=slug, user_id=user.id, content="root")
+    pg_session.add(root)
+    pg_session.flush()
+    pg_session.add_all([Comment(post_slug=slug, user_id=user.id, parent_id=root.id, content="reply") for _ in range(3)])
+    pg_session.commit()
+    return pg_engine, pg_session, slug, root.id
+
+
+def test_comments_page_uses_slug_parent_created_index(seeded):
+    engine, db, slug, _ = seeded
+    plans = explain_captured(engine, lambda: load_post_comments(db, slug))
+    assert any("ix_comments_slug_parent_created" in plan for plan in plans), plans
+
+
+def test_replies_use_parent_created_index(seeded):
+    engine, db, _, root_id = seeded
+    plans = explain_captured(engine, lambda: asyncio.run(get_comment_replies(
+        comment_id=root_id, db=db, current_user=None, page=1, per_page=20, format="nested"
+    )))
+    assert any("ix_comments_parent_created" in plan for plan in plans), plans
+
+
+def test_counts_use_partial_live_index(seeded):
+    engine, db, slug, _ = seeded
+    comment_stats.clear()
+    plans = explain_captured(engine, lambda: comment_stats.get_comment_stats(db, [slug]))
+    comment_stats.clear()
+    assert len(plans) == 1
+    assert "Index Only Scan using ix_comments_live_slug_parent" in plans[0], plans[0]
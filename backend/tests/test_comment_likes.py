@@ -0,0 +1,88 @@
+"""
+Concurrency stress test for the single-statement like toggle
+
+Requires a PostgreSQL database with migrations applied:
+    TEST_DATABASE_URL=postgresql://... pytest tests/test_comment_likes.py
+"""
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import func
+from sqlalchemy.orm import sessionmaker
+
+from app.comment_likes import toggle_comment_like
+from app.models import Comment, CommentLike, XPEvent
+
+
+@pytest.fixture
+def db_factory(pg_engine, pg_session, make_user):
+    author = make_user("author")
+    likers = [make_user(f"liker{i}") for i in range(8)]
+    comment = Comment(post_slug=f"stress-{author.username}", user_id=author.id, content="stress")
+    pg_session.add(comment)
+    pg_session.commit()
+    ids = {"author": author.id, "likers": [u.id for u in likers], "comment": comment.id}
+    return sessionmaker(bind=pg_engine), ids
+
+
+def test_concurrent_toggles_keep_counts_consistent(db_factory):
+    Session, ids = db_factory
+    rng = random.Random(42)
+    ops = [(rng.choice(ids["likers"]), rng.random() < 0.7) for _ in range(400)]
+
+    def run(op):
+        user_id, is_like = op
+        db = Session()
+        try:
+            return toggle_comment_like(db, ids["comment"], user_id, is_like)
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(run, ops))
+
+    db = Session()
+    try:
+        likes = db.query(func.count()).filter(
+            CommentLike.comment_id == ids["comment"], CommentLike.is_like.is_(True)
+        ).scalar()
+        dislikes = db.query(func.count()).filter(
+            CommentLike.comment_id == ids["comment"], CommentLike.is_like.is_(False)
+        ).scalar()
+        xp_events = db.query(func.count()).filter(XPEvent.user_id == ids["author"]).scalar()
+    finally:
+        db.close()
+
+    # Reported deltas must add up to the final table state
+    assert sum(r.likes_delta for r in results) == likes
+    assert sum(r.dislikes_delta for r in results) == dislikes
+    assert likes + dislikes <= len(ids["likers"])
+    # One XP event per like that was added or switched from dislike
+    assert xp_events == sum(1 for r in results if r.xp_awarded)
+
+
+def test_toggle_same_reaction_twice_removes_it(db_factory):
+    Session, ids = db_factory
+    db = Session()
+    try:
+        liker = ids["likers"][0]
+        first = toggle_comment_like(db, ids["comment"], liker, True)
+        switched = toggle_comment_like(db, ids["comment"], liker, False)
+        second = toggle_comment_like(db, ids["comment"], liker, False)
+    finally:
+        db.close()
+
+    assert (first.action, first.user_like_status, first.likes_delta) == ("added", True, 1)
+    assert (switched.action, switched.likes_delta, switched.dislikes_delta) == ("updated", -1, 1)
+    assert (second.action, second.user_like_status, second.dislikes_delta) == ("removed", None, -1)
+
+
+def test_self_like_and_missing_comment_are_rejected(db_factory):
+    Session, ids = db_factory
+    db = Session()
+    try:
+        assert toggle_comment_like(db, ids["comment"], ids["author"], True).self_like
+        assert not toggle_comment_like(db, -1, ids["likers"][0], True).found
+    finally:
+        db.close()
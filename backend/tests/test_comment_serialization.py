@@ -0,0 +1,60 @@
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+
+from app.role_cache import build_snapshot
+from app.routers.comments import build_comment_response
+from app.schemas import CommentResponse, NormalizedCommentsResponse
+
+
+def make_comment(comment_id, parent_id=None, replies=()):
+    created = datetime(2026, 1, 1, 12, 0, 0, 123456)
+    return SimpleNamespace(
+        id=comment_id, post_slug="post", user_id=1, parent_id=parent_id, content="Cześć 👋",
+        is_deleted=False, created_at=created, updated_at=created,
+        user=SimpleNamespace(id=1, username="autor", role_id=1, rank_id=1),
+        likes=[SimpleNamespace(user_id=2, is_like=True), SimpleNamespace(user_id=3, is_like=False)],
+        replies=list(replies),
+    )
+
+
+def make_snapshot():
+    return build_snapshot(
+        [SimpleNamespace(id=1, name="user", display_name="User", description=None, color="#6c757d",
+                         permissions=[], level=1, is_active=True, created_at=None)],
+        [SimpleNamespace(id=1, name="newbie", display_name="Newbie", description=None, icon="🌱",
+                         color="#6c757d", requirements={"xp": 0}, level=1, is_active=True, created_at=None)],
+        version=1,
+    )
+
+
+def test_comment_payload_matches_typed_model_and_previous_encoding():
+    snapshot = make_snapshot()
+    comment = make_comment(1, replies=[make_comment(2, parent_id=1)])
+    payload = [build_comment_response(comment, SimpleNamespace(id=2, role_id=1), True, snapshot)]
+
+    parsed = CommentResponse.model_validate(payload[0])
+    assert parsed.author.rank.icon == "🌱"
+    assert parsed.replies[0].replies is None
+    assert payload[0]["user_like_status"] is True
+
+    # orjson musi dawać ten sam JSON co poprzednia ścieżka (jsonable_encoder + json)
+    assert json.loads(ORJSONResponse(payload).body) == jsonable_encoder(payload)
+
+
+def test_normalized_format_stores_each_author_once():
+    snapshot = make_snapshot()
+    comment = make_comment(1, replies=[make_comment(2, parent_id=1), make_comment(3, parent_id=1)])
+    authors = {}
+    comments = [build_comment_response(comment, None, True, snapshot, authors)]
+
+    assert list(authors) == [1]
+    assert "author" not in comments[0] and comments[0]["author_id"] == 1
+    assert all(reply["author_id"] == 1 for reply in comments[0]["replies"])
+
+    body = json.loads(ORJSONResponse({"comments": comments, "authors": authors}).body)
+    parsed = NormalizedCommentsResponse.model_validate(body)
+    assert parsed.authors[1].rank.name == "newbie"
@@ -0,0 +1,48 @@
+"""
+Batched comment counts (POST /api/comments/stats:batch)
+
+Requires a PostgreSQL database with migrations applied:
+    TEST_DATABASE_URL=postgresql://... pytest tests/test_comment_stats.py
+"""
+from sqlalchemy import event
+
+from app import comment_stats
+from app.models import Comment
+
+
+def test_counts_for_many_slugs_in_one_query(monkeypatch, pg_engine, pg_session, make_user):
+    db = pg_session
+    user = make_user("stats")
+    suffix = user.username.split("_")[-1]
+    a, b = f"stats-a-{suffix}", f"stats-b-{suffix}"
+    root = Comment(post_slug=a, user_id=user.id, content="root")
+    db.add(root)
+    db.flush()
+    db.add_all([
+        Comment(post_slug=a, user_id=user.id, parent_id=root.id, content="reply"),
+        Comment(post_slug=a, user_id=user.id, content="deleted", is_deleted=True),
+        Comment(post_slug=b, user_id=user.id, content="b"),
+    ])
+    db.commit()
+    comment_stats.clear()
+
+    queries = []
+    event.listen(pg_engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    try:
+        stats = comment_stats.get_comment_stats(db, [a, b, "missing-" + suffix, a])
+        assert list(stats) == [a, b, "missing-" + suffix]
+        assert (stats[a]["total_comments"], stats[a]["total_replies"]) == (2, 1)
+        assert stats[b]["total_comments"] == 1 and stats["missing-" + suffix]["total_comments"] == 0
+        assert len(queries) == 1
+
+        comment_stats.get_comment_stats(db, [a, b])
+        assert len(queries) == 1  # z cache
+        assert "missing-" + suffix not in comment_stats._cache  # slugi bez komentarzy nie są cache'owane
+
+        # Limit rozmiaru - najdawniej używany slug wypada
+        monkeypatch.setattr(comment_stats, "COMMENT_STATS_CACHE_SIZE", 1)
+        comment_stats.clear()
+        comment_stats.get_comment_stats(db, [a, b])
+        assert list(comment_stats._cache) == [b]
+    finally:
+        comment_stats.clear()
@@ -0,0 +1,79 @@
+import gzip
+
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.compression import (
+    PRECOMPRESS_CACHE_HEADER, CompressionMiddleware, PrecompressedCache, choose_encoding, brotli
+)
+
+
+def make_client(cache):
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100, cache=cache)
+
+    @app.get("/thread")
+    def thread():
+        return ORJSONResponse([{"id": i, "content": "x" * 20} for i in range(50)], headers=PRECOMPRESS_CACHE_HEADER)
+
+    @app.get("/small")
+    def small():
+        return ORJSONResponse({"ok": True})
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((f'{{"row": {i}}}\n' for i in range(200)), media_type="application/x-ndjson")
+
+    return TestClient(app)
+
+
+def test_choose_encoding_respects_q_values():
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding("") is None
+    if brotli is not None:
+        assert choose_encoding("gzip, br") == "br"
+        assert choose_encoding("br;q=0, gzip") == "gzip"
+
+
+def test_cached_payload_is_compressed_once():
+    cache = PrecompressedCache()
+    client = make_client(cache)
+    first = client.get("/thread", headers={"Accept-Encoding": "gzip"})
+    second = client.get("/thread", headers={"Accept-Encoding": "gzip"})
+
+    assert first.headers["content-encoding"] == "gzip"
+    assert "x-precompress-cache" not in first.headers
+    assert first.json() == second.json()
+    assert cache.stats()["misses"] == 1 and cache.stats()["hits"] == 1
+
+
+def test_small_and_identity_responses_are_not_compressed():
+    client = make_client(PrecompressedCache())
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    plain = client.get("/thread", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers and "x-precompress-cache" not in plain.headers
+
+
+def test_streaming_response_is_compressed_incrementally():
+    client = make_client(PrecompressedCache())
+    with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+        raw = b"".join(response.iter_raw())
+    assert response.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(raw).count(b"\n") == 200
+
+
+def test_known_length_body_split_by_base_http_middleware_uses_cache():
+    cache = PrecompressedCache()
+    client = make_client(cache)
+
+    @client.app.middleware("http")
+    async def passthrough(request, call_next):
+        return await call_next(request)
+
+    for _ in range(2):
+        response = client.get("/thread", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert int(response.headers["content-length"]) < 1000
+    assert cache.stats()["hits"] == 1
@@ -0,0 +1,70 @@
+"""
+Email outbox delivery and retry
+
+Requires a PostgreSQL database with migrations applied:
+    TEST_DATABASE_URL=postgresql://... pytest tests/test_email_outbox.py
+"""
+import asyncio
+from datetime import timedelta
+
+from app import email_outbox
+from app.models import EmailOutbox
+
+
+def test_failed_send_is_retried_and_payload_cleared_after_delivery(monkeypatch, pg_session, make_user):
+    db = pg_session
+    user = make_user("outbox")
+    message = email_outbox.enqueue_verification_email(db, user.id, user.email, "123456", user.username, "pl")
+    db.commit()
+
+    outcomes = [{"success": False, "message": "provider down"}, {"success": True}]
+
+    async def fake_deliver(kind, recipient, payload):
+        assert payload["code"] == "123456"
+        return outcomes.pop(0)
+
+    monkeypatch.setattr(email_outbox, "_deliver", fake_deliver)
+    assert asyncio.run(email_outbox.dispatch_pending(db))["failed"] >= 1
+    db.refresh(message)
+    assert message.sent_at is None and message.last_error == "provider down"
+
+    # Backoff minął - wiersz znów jest do wysłania
+    db.query(EmailOutbox).filter(EmailOutbox.id == message.id).update({"next_attempt_at": EmailOutbox.created_at})
+    db.commit()
+    assert asyncio.run(email_outbox.dispatch_pending(db))["sent"] >= 1
+    db.refresh(message)
+    assert message.sent_at is not None and message.payload == {} and message.attempts == 2
+
+
+def test_codes_do_not_outlive_dead_or_superseded_rows(monkeypatch, pg_session, make_user):
+    db = pg_session
+    user = make_user("outbox")
+    old = email_outbox.enqueue_verification_email(db, user.id, user.email, "111111", user.username, "pl")
+    db.commit()
+    # Ponowna rejestracja niezweryfikowanego konta - stary kod nie może już wyjść
+    new = email_outbox.enqueue_verification_email(db, user.id, user.email, "222222", user.username, "pl")
+    db.commit()
+
+    async def fake_deliver(kind, recipient, payload):
+        return {"success": False, "message": "provider down"}
+
+    monkeypatch.setattr(email_outbox, "_deliver", fake_deliver)
+    db.refresh(old)
+    assert old.payload == {} and old.last_error == "superseded"
+    assert old.attempts >= email_outbox.EMAIL_OUTBOX_MAX_ATTEMPTS
+
+    # Ostatnia próba nowej wiadomości się nie udaje - kod znika z tabeli
+    db.query(EmailOutbox).filter(EmailOutbox.id == new.id).update(
+        {"attempts": email_outbox.EMAIL_OUTBOX_MAX_ATTEMPTS - 1}
+    )
+    db.commit()
+    asyncio.run(email_outbox.dispatch_pending(db))
+    db.refresh(new)
+    assert new.sent_at is None and new.payload == {}
+
+    db.query(EmailOutbox).filter(EmailOutbox.user_id == user.id).update(
+        {"created_at": EmailOutbox.created_at - timedelta(days=2)}, synchronize_session=False
+    )
+    db.commit()
+    assert email_outbox.purge_finished(db) >= 2
+    assert db.query(EmailOutbox).filter(EmailOutbox.user_id == user.id).count() == 0
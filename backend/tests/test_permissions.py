@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+
+from app.permissions import API_KEY_SCOPES, ROLE_PERMISSIONS, PermissionRegistry, has_permission, registry
+from app.role_cache import build_snapshot
+from app.routers.roles import get_available_permissions
+
+
+def test_registry_compiles_lists_to_masks():
+    reg = PermissionRegistry(["a", "b"])
+    mask = reg.compile(["b", "custom"])
+    assert mask == reg.bit("b") | reg.bit("custom")
+    assert reg.names(mask) == ("b", "custom")
+    assert reg.bit("missing") == 0
+
+
+def test_role_snapshot_checks_compiled_mask():
+    snapshot = build_snapshot(
+        [SimpleNamespace(id=1, name="moderator", display_name="Moderator", description=None, color="#fff",
+                         permissions=["comment.moderate", "plugin.custom"], level=50, is_active=True,
+                         created_at=None)],
+        [],
+    )
+    role = snapshot.role(1)
+    assert role.has_permission("comment.moderate")
+    assert role.has_permission("plugin.custom")  # uprawnienia spoza listy znanych też działają
+    assert not role.has_permission("system.admin")
+    assert not has_permission(role.permission_mask, "never.registered")
+    assert "plugin.custom" in registry.all_names()
+
+
+def test_available_permissions_do_not_leak_interned_names():
+    registry.intern("plugin.from_db_row")
+    response = get_available_permissions(current_user=SimpleNamespace(id=1))
+    assert response["permissions"] == list(ROLE_PERMISSIONS)
+    assert response["permissions"][:2] == ["comment.create", "comment.like"]
+    assert "plugin.from_db_row" not in response["permissions"]
+    assert not set(API_KEY_SCOPES + ("post.moderate", "user.moderate")) & set(response["permissions"])
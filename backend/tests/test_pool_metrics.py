@@ -0,0 +1,19 @@
+from sqlalchemy.pool import QueuePool
+
+from app.pool_metrics import PoolMetrics
+
+
+def test_wait_histogram_buckets():
+    metrics = PoolMetrics()
+    for ms in (0.2, 1, 3, 40, 10_000):
+        metrics.observe_wait(ms)
+
+    pool = QueuePool(lambda: None, pool_size=2, max_overflow=1)
+    wait = metrics.snapshot(pool)["wait"]
+    assert wait["count"] == 5
+    assert wait["max_ms"] == 10_000
+    # Kubełki skumulowane: le_X liczy wszystkie oczekiwania <= X ms
+    histogram = wait["histogram_ms"]
+    assert (histogram["le_1"], histogram["le_5"], histogram["le_25"], histogram["le_50"]) == (2, 3, 3, 4)
+    assert histogram["le_5000"] == 4
+    assert histogram["le_inf"] == wait["count"] == 5
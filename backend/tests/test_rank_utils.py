@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+
+from app.models import XPEvent
+from app.rank_utils import aggregate_xp_events, apply_pending_stats, get_pending_stats, update_user_stats
+from app.role_cache import build_rank_table, get_snapshot
+
+
+def make_rank(id, level, xp, is_active=True):
+    return SimpleNamespace(
+        id=id, level=level, display_name=f"rank-{id}", icon="*",
+        requirements={"xp": xp}, is_active=is_active
+    )
+
+RANKS = [
+    make_rank(1, 1, 0),
+    make_rank(2, 2, 10),
+    make_rank(3, 3, 50),
+    make_rank(4, 4, 150, is_active=False),
+    make_rank(5, 5, 500),
+]
+
+def test_resolve_picks_highest_reachable_rank():
+    table = build_rank_table(RANKS)
+    assert table.resolve(0).id == 1
+    assert table.resolve(9).id == 1
+    assert table.resolve(10).id == 2
+    assert table.resolve(499).id == 3  # inactive rank 4 is skipped
+    assert table.resolve(10_000).id == 5
+
+def test_inactive_ranks_are_still_known_by_id():
+    table = build_rank_table(RANKS)
+    assert table.by_id[4].level == 4
+
+def test_lower_level_rank_with_higher_threshold_does_not_downgrade():
+    table = build_rank_table([make_rank(1, 1, 0), make_rank(2, 5, 20), make_rank(3, 2, 30)])
+    assert table.resolve(40).id == 2
+
+
+def test_ledger_events_are_aggregated_once_with_rank_upgrade(pg_session, make_user):
+    db = pg_session
+    table = get_snapshot(db).rank_table
+    lowest = table.resolve(0)
+    next_threshold = next(xp for xp in table.thresholds if xp > 0)
+
+    user = make_user("ledger", rank_id=lowest.id, reputation_score=0, total_comments=0, total_likes_received=0)
+    db.commit()
+    # Ścieżka żądania: zdarzenie w ledgerze, wiersz users bez zmian
+    result = update_user_stats(user.id, db, "comment")
+    assert result["success"] and result["new_reputation"] == 2
+    db.refresh(user)
+    assert (user.reputation_score, user.total_comments) == (0, 0)
+
+    # Profil widzi niezagregowane zdarzenia przez nakładkę
+    pending = get_pending_stats(db, [user.id])
+    assert pending[user.id] == (2, 1, 0)
+    profile = apply_pending_stats({"reputation_score": 0, "total_comments": 0, "total_likes_received": 0}, pending[user.id])
+    assert profile == {"reputation_score": 2, "total_comments": 1, "total_likes_received": 0}
+
+    # Zdarzenia dopisane z pominięciem sprawdzenia awansu - awans robi agregator
+    db.add_all([
+        XPEvent(user_id=user.id, action="like_received", xp=next_threshold, likes_delta=1),
+        XPEvent(user_id=user.id, action="like_received", xp=1, likes_delta=1),
+    ])
+    db.commit()
+
+    # Limit paczek na uruchomienie - reszta czeka na kolejny cykl
+    assert aggregate_xp_events(db, batch_size=1, max_batches=1)["events"] == 1
+
+    first = aggregate_xp_events(db, batch_size=2)
+    assert first["events"] >= 2 and first["rank_upgrades"] >= 1
+    db.refresh(user)
+    xp = 2 + next_threshold + 1
+    assert (user.reputation_score, user.total_comments, user.total_likes_received) == (xp, 1, 2)
+    assert user.rank_id == table.resolve(xp).id != lowest.id
+    assert get_pending_stats(db, [user.id]) == {}
+
+    # Drugi przebieg nie ma czego agregować
+    second = aggregate_xp_events(db)
+    assert second["events"] == 0
+    db.refresh(user)
+    assert (user.reputation_score, user.total_comments, user.total_likes_received) == (xp, 1, 2)
@@ -0,0 +1,69 @@
+"""
+Routing of get_read_db between the primary and the read replica
+
+End-to-end check with two local PostgreSQL instances:
+    DATABASE_URL=postgresql://...:5432/app DATABASE_READ_URL=postgresql://...:5433/app uvicorn app.main:app
+"""
+import asyncio
+import time
+
+from starlette.requests import Request
+
+from app import database
+
+
+class FakeSession:
+    def __init__(self, name):
+        self.name = name
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_request(cookie=None):
+    headers = [(b"cookie", cookie.encode())] if cookie else []
+    return Request({"type": "http", "method": "GET", "headers": headers})
+
+
+def route(monkeypatch, request):
+    monkeypatch.setattr(database, "SessionLocal", lambda: FakeSession("primary"))
+    monkeypatch.setattr(database, "ReadSessionLocal", lambda: FakeSession("replica"))
+    dependency = database.get_read_db(request)
+    db = next(dependency)
+    dependency.close()
+    assert db.closed
+    return db.name
+
+
+def test_reads_go_to_replica_by_default(monkeypatch):
+    assert route(monkeypatch, make_request()) == "replica"
+
+
+def test_recent_write_pins_reads_to_primary(monkeypatch):
+    until = time.time() + 5
+    assert route(monkeypatch, make_request(f"{database.READ_PRIMARY_COOKIE}={until}")) == "primary"
+
+
+def test_expired_or_invalid_marker_is_ignored(monkeypatch):
+    assert route(monkeypatch, make_request(f"{database.READ_PRIMARY_COOKIE}={time.time() - 1}")) == "replica"
+    assert route(monkeypatch, make_request(f"{database.READ_PRIMARY_COOKIE}=garbage")) == "replica"
+
+
+def test_read_only_post_does_not_pin_to_primary():
+    from starlette.responses import Response
+
+    from app.main import read_after_write_middleware
+
+    async def call_next(request):
+        return Response("{}")
+
+    def cookies_after(method, path):
+        request = Request({"type": "http", "method": method, "path": path, "headers": [],
+                           "query_string": b"", "server": ("test", 80), "scheme": "http"})
+        response = asyncio.run(read_after_write_middleware(request, call_next))
+        return response.headers.get("set-cookie", "")
+
+    assert cookies_after("POST", "/api/comments/stats:batch") == ""
+    assert database.READ_PRIMARY_COOKIE in cookies_after("POST", "/api/comments/some-post")
+    assert cookies_after("GET", "/api/comments/some-post") == ""
@@ -0,0 +1,59 @@
+"""
+Refresh-token rotation and reuse detection
+
+Requires a PostgreSQL database with migrations applied:
+    TEST_DATABASE_URL=postgresql://... pytest tests/test_refresh_tokens.py
+"""
+import pytest
+from sqlalchemy import event
+
+from app.models import RefreshToken
+from app.refresh_tokens import issue_refresh_token, revoke_refresh_token, rotate_refresh_token
+from app.security import create_refresh_token, revoked_jtis, verify_token
+
+@pytest.fixture
+def db_user(pg_engine, pg_session, seeded_user):
+    queries = []
+    event.listen(pg_engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    yield pg_session, seeded_user, queries
+
+    pg_session.rollback()
+    pg_session.query(RefreshToken).filter(RefreshToken.user_id == seeded_user.id).delete()
+    pg_session.commit()
+
+
+def test_rotation_and_reuse_revokes_family(db_user):
+    db, user, _ = db_user
+    first = verify_token(issue_refresh_token(db, user.id), "refresh")
+    second_token = rotate_refresh_token(db, first)
+    second = verify_token(second_token, "refresh")
+    assert second["fam"] == first["fam"] == first["jti"]
+
+    # Ponowne użycie pierwszego tokenu - odwołanie całej rodziny
+    assert rotate_refresh_token(db, first) is None
+    assert verify_token(second_token, "refresh") is None
+    assert rotate_refresh_token(db, second) is None
+    assert db.query(RefreshToken).filter(
+        RefreshToken.family_id == first["jti"], RefreshToken.revoked_at.is_(None)
+    ).count() == 0
+
+
+def test_valid_token_check_needs_no_query(db_user):
+    db, user, queries = db_user
+    token = issue_refresh_token(db, user.id)
+    queries.clear()
+    assert verify_token(token, "refresh") is not None
+    assert queries == []
+
+
+def test_logout_revokes_and_legacy_token_accepted_once(db_user):
+    db, user, _ = db_user
+    legacy = verify_token(create_refresh_token(user.id), "refresh")
+    rotated = verify_token(rotate_refresh_token(db, legacy), "refresh")
+    assert rotated["fam"] == legacy["jti"]
+    assert rotate_refresh_token(db, legacy) is None
+
+    payload = verify_token(issue_refresh_token(db, user.id), "refresh")
+    assert revoke_refresh_token(db, payload) == 1
+    assert payload["jti"] in revoked_jtis
+    assert rotate_refresh_token(db, payload) is None
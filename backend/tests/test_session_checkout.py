@@ -0,0 +1,42 @@
+"""
+Pool checkouts per request: get_db sessions take a connection only when queried
+
+Anonymous and rejected requests must not check out a pooled connection. The
+second test (PostgreSQL, migrations applied) checks that resend-verification
+holds no connection while it waits for the email provider:
+    TEST_DATABASE_URL=postgresql://... pytest tests/test_session_checkout.py
+"""
+from fastapi.testclient import TestClient
+
+from app.database import engine
+from app.email_service import EmailService
+from app.main import app
+from app.pool_metrics import pool_metrics
+
+client = TestClient(app)
+
+
+def test_anonymous_and_rejected_requests_do_not_check_out():
+    before = pool_metrics.checkouts
+    assert client.get("/api/auth/me").status_code == 401
+    assert client.get("/api/profile/").status_code == 401
+    assert client.get("/api/admin/stats").status_code == 401
+    assert client.post("/api/comments/some-post", json={"content": "x"}).status_code == 401
+    assert client.get("/api/auth/me", headers={"cookie": "access_token=not-a-jwt"}).status_code == 401
+    assert pool_metrics.checkouts == before
+
+
+def test_no_connection_held_while_sending_email(monkeypatch, pg_session, make_user):
+    email = make_user("resend", is_active=False).email
+    pg_session.commit()
+
+    checked_out = []
+
+    async def fake_send(email, code, username, language="pl"):
+        checked_out.append(engine.pool.checkedout())
+        return {"success": True}
+
+    monkeypatch.setattr(EmailService, "send_verification_email", staticmethod(fake_send))
+    response = client.post("/api/auth/resend-verification", json={"email": email})
+    assert response.status_code == 200, response.json()
+    assert checked_out == [0]
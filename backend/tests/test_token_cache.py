@@ -0,0 +1,46 @@
+import time
+from datetime import timedelta
+
+from app import security
+
+
+def count_decodes(monkeypatch):
+    calls = []
+    real_decode = security.jwt.decode
+
+    def decode(*args, **kwargs):
+        calls.append(1)
+        return real_decode(*args, **kwargs)
+
+    monkeypatch.setattr(security.jwt, "decode", decode)
+    return calls
+
+
+def test_verified_payload_is_reused(monkeypatch):
+    security.clear_token_cache()
+    calls = count_decodes(monkeypatch)
+    token = security.create_access_token({"sub": "cache@test.pl"})
+
+    assert security.verify_token(token)["sub"] == "cache@test.pl"
+    assert security.verify_token(token)["sub"] == "cache@test.pl"
+    assert security.verify_token(token, "refresh") is None  # typ sprawdzany także dla trafień
+    assert len(calls) == 1
+
+
+def test_tampered_token_is_not_served_from_cache():
+    security.clear_token_cache()
+    token = security.create_access_token({"sub": "cache@test.pl"})
+    assert security.verify_token(token) is not None
+    assert security.verify_token(token[:-2] + ("AA" if token[-2:] != "AA" else "BB")) is None
+
+
+def test_entry_is_evicted_at_exp(monkeypatch):
+    security.clear_token_cache()
+    calls = count_decodes(monkeypatch)
+    token = security.create_access_token({"sub": "cache@test.pl"}, expires_delta=timedelta(minutes=1))
+    security.verify_token(token)
+
+    real_time = time.time
+    monkeypatch.setattr(security.time, "time", lambda: real_time() + 120)
+    security.verify_token(token)
+    assert len(calls) == 2
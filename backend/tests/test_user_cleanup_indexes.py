@@ -0,0 +1,27 @@
+"""
+EXPLAIN checks: tasks.py cleanup jobs use the partial indexes from migration 008
+
+Each job runs inside a rolled back savepoint to capture its SELECT, which is
+then EXPLAINed with enable_seqscan off. The 1M-user version with row counts is
+tests/benchmarks/bench_user_cleanup.py. Requires a PostgreSQL database with
+migrations applied:
+    TEST_DATABASE_URL=postgresql://... pytest tests/test_user_cleanup_indexes.py
+"""
+import asyncio
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app import tasks
+from conftest import explain_captured
+
+
+@pytest.mark.parametrize("job, index_name", [
+    (tasks.cleanup_expired_accounts, "ix_users_unverified_expires"),
+    (tasks.cleanup_expired_verification_codes, "ix_users_verification_expires"),
+    (tasks.cleanup_expired_password_resets, "ix_users_password_reset_expires"),
+])
+def test_cleanup_job_uses_partial_index(monkeypatch, pg_connection, job, index_name):
+    monkeypatch.setattr(tasks, "SessionLocal", sessionmaker(bind=pg_connection, join_transaction_mode="create_savepoint"))
+    plans = explain_captured(pg_connection, lambda: asyncio.run(job()), match=lambda statement: "FROM users" in statement)
+    assert index_name in plans[0], plans[0]
@@ -58,3 +58,33 @@ resource "cloudflare_record" "www" {
 #     brotli = "on"
 #   }
 # }
+
+# Comment snapshots - static JSON written by the backend (COMMENT_SNAPSHOT_DIR).
+# Cloudflare does not cache JSON by default; this rule caches the snapshot path
+# and honours the backend's Cache-Control (max-age = COMMENT_SNAPSHOT_MAX_AGE).
+# NOTE: Requires API token with Zone > Cache Rules:Edit permission
+resource "cloudflare_ruleset" "comment_snapshots_cache" {
+  count       = var.cloudflare_cache_comment_snapshots ? 1 : 0
+  zone_id     = var.cloudflare_zone_id
+  name        = "Comment snapshots cache"
+  description = "Managed by Terraform - edge caching for static comment snapshots"
+  kind        = "zone"
+  phase       = "http_request_cache_settings"
+
+  rules {
+    action      = "set_cache_settings"
+    expression  = "(starts_with(http.request.uri.path, \"/api/comments/snapshots/\"))"
+    description = "Cache comment snapshots, TTL from origin Cache-Control"
+    enabled     = true
+
+    action_parameters {
+      cache = true
+      edge_ttl {
+        mode = "respect_origin"
+      }
+      browser_ttl {
+        mode = "respect_origin"
+      }
+    }
+  }
+}
@@ -91,6 +91,12 @@ variable "cloudflare_proxy_enabled" {
   default     = true
 }
 
+variable "cloudflare_cache_comment_snapshots" {
+  description = "Cache /api/comments/snapshots/* at the Cloudflare edge (requires proxy and a token with Cache Rules:Edit)"
+  type        = bool
+  default     = false
+}
+
 # -----------------------------------------------------------------------------
 # APPLICATION SECRETS (stored in AWS SSM Parameter Store)
 # -----------------------------------------------------------------------------